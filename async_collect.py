@@ -0,0 +1,162 @@
+# Asyncio collection of slides, for display apps that rescan on their event loop. The
+# blocking file system calls run on an executor with bounded concurrency, and the
+# assembly runs on the loop in small steps, so the loop is never blocked for long.
+# A scan is built into a new SlidesCollection that replaces the current one at once
+import asyncio
+import datetime
+from concurrent.futures import Executor
+from typing import Callable, Dict, List
+from config import FileSystemAccess, DelegatingFileSystemAccess, ScandirFileSystemAccess, DirEntryInfo, \
+    SlidesCollection, ShowConfig, CollectEvent, iter_slide_events
+
+# events applied between two returns to the event loop
+ASYNC_COLLECT_BATCH: int = 200
+
+
+# Async counterpart of FileSystemAccess over a blocking one. Listing and stat calls run
+# on the executor, at most max_concurrency at a time, path functions are not I/O
+class AsyncFileSystemAccess:
+    fs_access: FileSystemAccess
+    executor: Executor | None
+
+    def __init__(self, fs_access: FileSystemAccess = ScandirFileSystemAccess(), max_concurrency: int = 8,
+                 executor: Executor | None = None):
+        self.fs_access = fs_access
+        self.executor = executor
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run(self, function: Callable, *args):
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        return await self._run(self.fs_access.list_dir_entries, path)
+
+    async def is_dir(self, path: str) -> bool:
+        return await self._run(self.fs_access.is_dir, path)
+
+    async def get_file_modification_time(self, path: str) -> datetime.datetime:
+        return await self._run(self.fs_access.get_file_modification_time, path)
+
+    async def get_current_date(self) -> datetime.date:
+        return await self._run(self.fs_access.get_current_date)
+
+    def get_file_suffix(self, path: str) -> str:
+        return self.fs_access.get_file_suffix(path)
+
+    def get_file_main_name(self, path: str) -> str:
+        return self.fs_access.get_file_main_name(path)
+
+    def join(self, path1: str, path2: str) -> str:
+        return self.fs_access.join(path1, path2)
+
+
+# Serves the listings fetched ahead by the async walk to the synchronous assembly
+class _ListedFileSystemAccess(DelegatingFileSystemAccess):
+    def __init__(self, fs_access: FileSystemAccess, listings: Dict[str, List[DirEntryInfo]],
+                 current_date: datetime.date):
+        super().__init__(fs_access)
+        self.listings = listings
+        self.current_date = current_date
+
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        entries: List[DirEntryInfo] | None = self.listings.pop(path, None)
+        return entries if entries is not None else self.fs_access.list_dir_entries(path)
+
+    def list_dir(self, path: str) -> List[str]:
+        return [entry.name for entry in self.list_dir_entries(path)]
+
+    def get_current_date(self) -> datetime.date:
+        return self.current_date
+
+
+# List relative_path and all directories under it, sibling directories concurrently
+async def _list_tree(fs_access: AsyncFileSystemAccess, root_dir: str, relative_path: str,
+                     listings: Dict[str, List[DirEntryInfo]]) -> None:
+    dir_path: str = fs_access.join(root_dir, relative_path)
+    entries: List[DirEntryInfo] = await fs_access.list_dir_entries(dir_path)
+    listings[dir_path] = entries
+    await asyncio.gather(*(_list_tree(fs_access, root_dir, fs_access.join(relative_path, entry.name), listings)
+                           for entry in entries if entry.is_dir))
+
+
+# Same as collect_slides, without blocking the event loop. Cancelling the task stops the
+# scan at its next await, slide_collection is then partially filled
+async def collect_slides_async(slide_collection: SlidesCollection, root_dir: str,
+                               show_config: ShowConfig = ShowConfig(),
+                               fs_access: AsyncFileSystemAccess | None = None,
+                               current_date: datetime.date | None = None) -> int:
+    if fs_access is None:
+        fs_access = AsyncFileSystemAccess()
+    if current_date is None:
+        current_date = await fs_access.get_current_date()
+    listings: Dict[str, List[DirEntryInfo]] = {}
+    await _list_tree(fs_access, root_dir, '', listings)
+
+    events = iter_slide_events(root_dir, '', show_config,
+                               _ListedFileSystemAccess(fs_access.fs_access, listings, current_date), current_date)
+    slide_collections: List[SlidesCollection] = [slide_collection]
+    while True:
+        for _ in range(ASYNC_COLLECT_BATCH):
+            try:
+                event: CollectEvent = next(events)
+            except StopIteration as stop:
+                return stop.value
+            event.apply(slide_collections)
+        await asyncio.sleep(0)
+
+
+# Keeps the current collection of root_dir and rescans it in the background. A refresh
+# cancels the scan still running, the collection is replaced only by a finished scan
+class AsyncSlidesRefresher:
+    root_dir: str
+    slide_collection: SlidesCollection
+    fs_access: AsyncFileSystemAccess
+    on_swap: Callable[[SlidesCollection], None] | None
+
+    def __init__(self, root_dir: str, fs_access: AsyncFileSystemAccess | None = None,
+                 show_config: ShowConfig = ShowConfig(),
+                 create_collection: Callable[[], SlidesCollection] = SlidesCollection,
+                 on_swap: Callable[[SlidesCollection], None] | None = None):
+        self.root_dir = root_dir
+        self.fs_access = fs_access if fs_access is not None else AsyncFileSystemAccess()
+        self.show_config = show_config
+        self.create_collection = create_collection
+        self.on_swap = on_swap
+        self.slide_collection = create_collection()
+        self._task: asyncio.Task | None = None
+
+    async def _scan(self) -> SlidesCollection:
+        new_collection: SlidesCollection = self.create_collection()
+        await collect_slides_async(new_collection, self.root_dir, self.show_config, self.fs_access)
+        # a single assignment on the loop thread, readers see the old or the new collection
+        self.slide_collection = new_collection
+        if self.on_swap:
+            self.on_swap(new_collection)
+        return new_collection
+
+    # Start a scan, cancelling the one still running. Must be called on the event loop
+    def refresh(self) -> asyncio.Task:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = asyncio.get_running_loop().create_task(self._scan())
+        return self._task
+
+    # Wait for the latest scan, returns the current collection
+    async def wait(self) -> SlidesCollection:
+        while self._task is not None:
+            task: asyncio.Task = self._task
+            try:
+                await task
+            except asyncio.CancelledError:
+                # cancelled by a newer refresh, or the waiter itself is cancelled
+                if task is self._task:
+                    raise
+                continue
+            if task is self._task:
+                break
+        return self.slide_collection
+
+    def cancel(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
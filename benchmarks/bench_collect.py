@@ -0,0 +1,186 @@
+# Benchmark suite for the collection pipeline on synthetic trees, in memory and on a real
+# (tmpfs when available) directory. Reports wall time, peak memory, parse throughput and
+# call counts as JSON, optionally compared against a stored baseline.
+# Run from the repository root:
+#   python -m benchmarks.bench_collect --sizes 1000,10000 --output results.json
+#   python -m benchmarks.bench_collect --baseline results.json
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+import tracemalloc
+import collections
+from typing import Callable, Dict, List
+
+from config import collect_slides, SlidesCollection, FileSystemAccess, ScandirFileSystemAccess, \
+    parse_file_name_for_config, tokenize_file_name_for_config
+from scan_stats import ScanStats, collect_slides_with_stats
+from benchmarks.tree_generator import SimNode, generate_tree, materialize, count_nodes, all_names, \
+    InMemoryFileSystemAccess, generated_tree_date
+
+
+# Real directory access with the same current date as the generated tree, so that both
+# backends expire the same slides
+class FixedDateScandirFileSystemAccess(ScandirFileSystemAccess):
+    def get_current_date(self) -> datetime.date:
+        return generated_tree_date.date()
+
+
+# Counts the stat and scandir system calls made through the os module. The stat done
+# by os.DirEntry.stat (one per entry on Linux) does not go through it and is not counted
+class SyscallCounter:
+    def __init__(self):
+        self.counts: collections.Counter = collections.Counter()
+
+    def __enter__(self) -> 'SyscallCounter':
+        self._stat, self._scandir = os.stat, os.scandir
+
+        def counting_stat(*args, **kwargs):
+            self.counts['stat'] += 1
+            return self._stat(*args, **kwargs)
+
+        def counting_scandir(*args, **kwargs):
+            self.counts['scandir'] += 1
+            return self._scandir(*args, **kwargs)
+
+        os.stat, os.scandir = counting_stat, counting_scandir
+        return self
+
+    def __exit__(self, *args) -> None:
+        os.stat, os.scandir = self._stat, self._scandir
+
+
+def run_collect(root_dir: str, fs_access: FileSystemAccess) -> SlidesCollection:
+    slide_collection: SlidesCollection = SlidesCollection()
+    collect_slides(slide_collection, root_dir, fs_access=fs_access)
+    return slide_collection
+
+
+def measure_collect(root_dir: str, make_fs_access: Callable[[], FileSystemAccess]) -> Dict[str, object]:
+    tokenize_file_name_for_config.cache_clear()
+    start: float = time.perf_counter()
+    slide_collection: SlidesCollection = run_collect(root_dir, make_fs_access())
+    wall_seconds: float = time.perf_counter() - start
+
+    tokenize_file_name_for_config.cache_clear()
+    tracemalloc.start()
+    run_collect(root_dir, make_fs_access())
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    with SyscallCounter() as syscalls:
+        scan_stats: ScanStats = collect_slides_with_stats(SlidesCollection(), root_dir, make_fs_access())
+
+    return {
+        'wall_seconds': wall_seconds,
+        'peak_memory_bytes': peak_memory,
+        'slides': sum(len(slides) for slides in slide_collection.normal_slides.values()) +
+        sum(len(collection.files) for collection in slide_collection.overshadow_slide_collections),
+        'expired_slides': len(slide_collection.expired_slides),
+        'messages': len(slide_collection.messages),
+        'fs_access_calls': dict(scan_stats.fs_calls),
+        'parse_errors': scan_stats.parse_errors,
+        'syscalls': dict(syscalls.counts),
+    }
+
+
+def measure_parse(tree: SimNode) -> Dict[str, float]:
+    names: List[tuple] = all_names(tree)
+    token_count: int = sum(name.count('@') for name, _ in names)
+    tokenize_file_name_for_config.cache_clear()
+    start: float = time.perf_counter()
+    for name, file_date in names:
+        try:
+            parse_file_name_for_config(name, file_date)
+        except ValueError:
+            pass
+    elapsed: float = time.perf_counter() - start
+    return {'parse_tokens_per_second': token_count / elapsed if elapsed else 0.0,
+            'parse_names_per_second': len(names) / elapsed if elapsed else 0.0}
+
+
+def real_dir_base() -> str:
+    return '/dev/shm' if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK) else tempfile.gettempdir()
+
+
+def run_suite(sizes: List[int], backends: List[str], seed: int) -> Dict[str, Dict[str, object]]:
+    results: Dict[str, Dict[str, object]] = {}
+    for size in sizes:
+        tree: SimNode = generate_tree(size, seed)
+        parse_result: Dict[str, float] = measure_parse(tree)
+        for backend in backends:
+            if backend == 'memory':
+                memory_access: InMemoryFileSystemAccess = InMemoryFileSystemAccess(tree, current_date=generated_tree_date.date())
+                result: Dict[str, object] = measure_collect('/mem', lambda: memory_access)
+            else:
+                root_dir: str = tempfile.mkdtemp(prefix='bench_collect_', dir=real_dir_base())
+                try:
+                    materialize(tree, root_dir)
+                    result = measure_collect(root_dir, FixedDateScandirFileSystemAccess)
+                finally:
+                    shutil.rmtree(root_dir, ignore_errors=True)
+            result['entries'] = count_nodes(tree) - 1
+            result.update(parse_result)
+            results[f'{backend}/{size}'] = result
+            print(f'{backend}/{size}: {result["wall_seconds"]:.3f}s, '
+                  f'{result["peak_memory_bytes"] / 1e6:.1f} MB peak', file=sys.stderr)
+    return results
+
+
+# Metrics where a higher value is better, all other compared metrics are lower-is-better
+higher_is_better: set = {'parse_tokens_per_second', 'parse_names_per_second'}
+compared_metrics: List[str] = ['wall_seconds', 'peak_memory_bytes', 'parse_tokens_per_second']
+
+
+# The regressions of results against baseline by more than tolerance (a fraction)
+def compare_with_baseline(results: Dict[str, Dict[str, object]], baseline: Dict[str, Dict[str, object]],
+                          tolerance: float) -> List[str]:
+    regressions: List[str] = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric in compared_metrics:
+            value, baseline_value = result.get(metric), baseline[key].get(metric)
+            if not value or not baseline_value:
+                continue
+            ratio: float = baseline_value / value if metric in higher_is_better else value / baseline_value
+            if ratio > 1 + tolerance:
+                regressions.append(f'{key} {metric}: {baseline_value:.4g} -> {value:.4g} ({ratio:.2f}x worse)')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark collect_slides on synthetic trees')
+    parser.add_argument('--sizes', default='1000,10000', help='comma separated file counts')
+    parser.add_argument('--backends', default='memory,real', help='memory and/or real')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='compare against results stored by an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, object]] = run_suite(
+        [int(size) for size in args.sizes.split(',')], args.backends.split(','), args.seed)
+    report: Dict[str, object] = {'python': sys.version.split()[0], 'results': results}
+    exit_code: int = 0
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions: List[str] = compare_with_baseline(results, json.load(baseline_file)['results'],
+                                                           args.tolerance)
+        report['regressions'] = regressions
+        exit_code = 1 if regressions else 0
+    output: str = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+# Headless harness for the decode worker: synthetic frames go through the shared memory
+# ring as a display would take them, every frame is checked against the expected pixels
+# and the frames per second and megabytes per second are reported.
+# Run from the repository root:
+#   python -m benchmarks.bench_decode_worker --sizes 1920x1080,3840x2160 --frames 200
+import sys
+import json
+import time
+import zlib
+import struct
+import argparse
+from typing import Dict, List
+
+from prefetch import DecodedImage
+from decode_worker import DecoderClient
+
+FRAME_HEADER = struct.Struct('<III')
+
+
+def synthetic_file(index: int, width: int, height: int) -> str:
+    return f'frame{index}_{width}x{height}'
+
+
+# Pixels that tell the frames apart: the index and size in front, filled with a byte of
+# the index. Top-level so that the worker process can import it
+def synthetic_decode(file: str) -> DecodedImage:
+    name, size = file.rsplit('_', 1)
+    index: int = int(name[len('frame'):])
+    width, height = (int(value) for value in size.split('x'))
+    pixels: bytearray = bytearray([index % 251]) * (width * height * 4)
+    FRAME_HEADER.pack_into(pixels, 0, index, width, height)
+    return DecodedImage(file, width, height, 'rgba', bytes(pixels))
+
+
+def run_harness(frame_count: int, width: int, height: int, slot_count: int = 4,
+                read_ahead: int = 3) -> Dict[str, object]:
+    files: List[str] = [synthetic_file(index, width, height) for index in range(frame_count)]
+    # checksums of the pixels after the header by fill byte, the frames are checked in place
+    fill_checksums: Dict[int, int] = {}
+    corrupted: List[str] = []
+    wait_seconds: float = 0.0
+    with DecoderClient(slot_count, width * height * 4, synthetic_decode) as decoder:
+        # the first frame includes starting the worker, it is not timed
+        decoder.release(decoder.get(synthetic_file(frame_count, width, height)))
+        start: float = time.perf_counter()
+        for index, file in enumerate(files):
+            decoder.prefetch(files[index:index + read_ahead + 1])
+            wait_start: float = time.perf_counter()
+            frame = decoder.get(file, timeout=30)
+            wait_seconds += time.perf_counter() - wait_start
+            index_, frame_width, frame_height = FRAME_HEADER.unpack_from(frame.pixels, 0)
+            fill: int = index % 251
+            if fill not in fill_checksums:
+                fill_checksums[fill] = zlib.crc32(bytes([fill]) * (len(frame.pixels) - FRAME_HEADER.size))
+            if (index_, frame_width, frame_height) != (index, width, height) or \
+                    zlib.crc32(frame.pixels[FRAME_HEADER.size:]) != fill_checksums[fill]:
+                corrupted.append(file)
+            decoder.release(frame)
+        seconds: float = time.perf_counter() - start
+    return {
+        'frames': frame_count,
+        'corrupted_frames': corrupted,
+        'seconds': seconds,
+        'frames_per_second': frame_count / seconds,
+        'megabytes_per_second': frame_count * width * height * 4 / seconds / 1e6,
+        'mean_wait_seconds': wait_seconds / frame_count,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Frames through the decode worker by resolution')
+    parser.add_argument('--sizes', default='1280x720,1920x1080', help='comma separated WIDTHxHEIGHT')
+    parser.add_argument('--frames', type=int, default=100)
+    parser.add_argument('--slots', type=int, default=4)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, object]] = {}
+    for size in args.sizes.split(','):
+        width, height = (int(value) for value in size.split('x'))
+        result: Dict[str, object] = run_harness(args.frames, width, height, args.slots)
+        results[size] = result
+        print(f'{size}: {result["frames_per_second"]:.1f} frames/s, {result["megabytes_per_second"]:.0f} MB/s, '
+              f'{len(result["corrupted_frames"])} corrupted', file=sys.stderr)
+    output: str = json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+    if any(result['corrupted_frames'] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
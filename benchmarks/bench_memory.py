@@ -0,0 +1,82 @@
+# Memory benchmark of SlidesCollection against CompactSlidesCollection on synthetic trees.
+# Reports the memory retained by the collected slides and the peak during the scan.
+# Run from the repository root:
+#   python -m benchmarks.bench_memory --sizes 10000,100000
+import gc
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+from typing import Callable, Dict, List
+
+from config import collect_slides, SlidesCollection, DelegatingFileSystemAccess, DirEntryInfo, \
+    tokenize_file_name_for_config
+from compact_collection import CompactSlidesCollection
+from benchmarks.tree_generator import SimNode, generate_tree, InMemoryFileSystemAccess
+
+
+# Gives every listing new name strings, like os.scandir does, so that the collections
+# do not get the names of the generated tree for free
+class FreshNameFileSystemAccess(DelegatingFileSystemAccess):
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        return [DirEntryInfo(entry.name[:1] + entry.name[1:], entry.is_dir, entry.modification_time)
+                for entry in self.fs_access.list_dir_entries(path)]
+
+
+def measure_memory(tree: SimNode, make_collection: Callable[[], SlidesCollection]) -> Dict[str, object]:
+    fs_access: FreshNameFileSystemAccess = FreshNameFileSystemAccess(InMemoryFileSystemAccess(tree))
+    tokenize_file_name_for_config.cache_clear()
+    gc.collect()
+    tracemalloc.start()
+    start: float = time.perf_counter()
+    slide_collection: SlidesCollection = make_collection()
+    collect_slides(slide_collection, '/mem', fs_access=fs_access)
+    wall_seconds: float = time.perf_counter() - start
+    # the parse cache holds the names too, only the collection is measured
+    tokenize_file_name_for_config.cache_clear()
+    gc.collect()
+    retained_memory, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    slide_count: int = sum(len(slides) for slides in slide_collection.normal_slides.values()) + \
+        sum(len(collection.files) for collection in slide_collection.overshadow_slide_collections)
+    return {
+        'wall_seconds': wall_seconds,
+        'retained_memory_bytes': retained_memory,
+        'peak_memory_bytes': peak_memory,
+        'slides': slide_count,
+        'bytes_per_slide': retained_memory / slide_count if slide_count else 0.0,
+    }
+
+
+def run_suite(sizes: List[int], seed: int) -> Dict[str, Dict[str, object]]:
+    results: Dict[str, Dict[str, object]] = {}
+    for size in sizes:
+        tree: SimNode = generate_tree(size, seed)
+        for name, make_collection in (('plain', SlidesCollection), ('compact', CompactSlidesCollection)):
+            result: Dict[str, object] = measure_memory(tree, make_collection)
+            results[f'{name}/{size}'] = result
+            print(f'{name}/{size}: {result["retained_memory_bytes"] / 1e6:.1f} MB retained, '
+                  f'{result["bytes_per_slide"]:.0f} bytes per slide, {result["wall_seconds"]:.3f}s',
+                  file=sys.stderr)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Memory of plain and compact slide collections')
+    parser.add_argument('--sizes', default='10000,100000', help='comma separated file counts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, object]] = run_suite([int(size) for size in args.sizes.split(',')], args.seed)
+    output: str = json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
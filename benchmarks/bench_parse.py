@@ -0,0 +1,54 @@
+# Microbenchmark of the filename config parser, in config tokens per second, for the
+# legacy prefix-slicing parser and the compiled, memoized grammar.
+# Run from the repository root: python -m benchmarks.bench_parse [name_count]
+import sys
+import time
+import datetime
+from typing import Callable, List, Tuple
+
+from config import parse_file_name_for_config, tokenize_file_name_for_config, \
+    _parse_full_expire_date, _expire_date_candidates
+from benchmarks.legacy_parser import legacy_parse_file_name_for_config
+
+
+# Names as they appear in per-week folders: few distinct directory names, many files
+def make_names(name_count: int) -> List[Tuple[str, datetime.datetime]]:
+    names: List[Tuple[str, datetime.datetime]] = []
+    start_date: datetime.datetime = datetime.datetime(2023, 1, 2)
+    for i in range(name_count):
+        week: int = (i // 200) % 52
+        file_date: datetime.datetime = start_date + datetime.timedelta(weeks=week)
+        expire_date: datetime.datetime = file_date + datetime.timedelta(days=7)
+        if i % 4 == 0:
+            names.append((f'week{week}@wg{1 + week % 3}@dur{5 + week % 4}@till{expire_date:%d%m}', file_date))
+        elif i % 4 == 1:
+            names.append((f'promo{week}@all8_10_12@till{expire_date:%d%m%Y}', file_date))
+        else:
+            names.append((f'slide{i % 200}@dur{5 + i % 7}', file_date))
+    return names
+
+
+def measure(parse: Callable, names: List[Tuple[str, datetime.datetime]]) -> float:
+    start: float = time.perf_counter()
+    for name, file_date in names:
+        parse(name, file_date)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    name_count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    names: List[Tuple[str, datetime.datetime]] = make_names(name_count)
+    token_count: int = sum(name.count('@') for name, _ in names)
+    print(f'{name_count} names, {token_count} tokens')
+
+    results: List[Tuple[str, float]] = [('legacy', measure(legacy_parse_file_name_for_config, names))]
+    for cache in (tokenize_file_name_for_config, _parse_full_expire_date, _expire_date_candidates):
+        cache.cache_clear()
+    results.append(('compiled (cold cache)', measure(parse_file_name_for_config, names)))
+    results.append(('compiled (warm cache)', measure(parse_file_name_for_config, names)))
+    for label, elapsed in results:
+        print(f'{label:22} {token_count / elapsed:12,.0f} tokens/s  {elapsed:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
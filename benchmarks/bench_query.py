@@ -0,0 +1,86 @@
+# Query benchmark of IndexedSlidesCollection against linear scans of a SlidesCollection
+# on synthetic trees, for the questions of the admin dashboard.
+# Run from the repository root:
+#   python -m benchmarks.bench_query --sizes 100000,1000000
+import sys
+import json
+import time
+import argparse
+import datetime
+from typing import Callable, Dict, List
+
+from config import collect_slides, Severity
+from indexed_collection import IndexedSlidesCollection
+from benchmarks.tree_generator import SimNode, generate_tree, InMemoryFileSystemAccess, generated_tree_date
+
+
+def best_seconds(function: Callable[[], object], repeat: int) -> float:
+    best: float = float('inf')
+    for _ in range(repeat):
+        start: float = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure_queries(tree: SimNode, repeat: int) -> Dict[str, object]:
+    start: float = time.perf_counter()
+    slide_collection: IndexedSlidesCollection = IndexedSlidesCollection()
+    collect_slides(slide_collection, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+    collect_seconds: float = time.perf_counter() - start
+
+    directory: str = tree.children[len(tree.children) // 2].name
+    week_end: datetime.datetime = generated_tree_date + datetime.timedelta(days=7)
+    queries: Dict[str, Callable[[], object]] = {
+        'under_directory': lambda: slide_collection.slides_under(directory),
+        'expiring_this_week': lambda: slide_collection.slides_expiring(generated_tree_date, week_end),
+        'weight_at_least_4_under_directory': lambda: slide_collection.find_slides(under=directory, min_weight=4.0),
+        'errors_under_directory': lambda: slide_collection.messages_under(directory, Severity.ERROR),
+    }
+    # the same questions answered by scanning the collection
+    scans: Dict[str, Callable[[], object]] = {
+        'under_directory': lambda: [slide for slides in slide_collection.normal_slides.values() for slide in slides
+                                    if slide.file.startswith(directory + '/')],
+        'expiring_this_week': lambda: [file for file, expire_date in slide_collection.expire_dates.items()
+                                       if generated_tree_date <= expire_date <= week_end],
+    }
+    result: Dict[str, object] = {'slides': len(slide_collection.slides), 'collect_seconds': collect_seconds}
+    for name, query in queries.items():
+        result[f'{name}_seconds'] = best_seconds(query, repeat)
+        result[f'{name}_results'] = len(query())
+    for name, scan in scans.items():
+        result[f'{name}_scan_seconds'] = best_seconds(scan, repeat)
+    return result
+
+
+def run_suite(sizes: List[int], seed: int, repeat: int) -> Dict[str, Dict[str, object]]:
+    results: Dict[str, Dict[str, object]] = {}
+    for size in sizes:
+        result: Dict[str, object] = measure_queries(generate_tree(size, seed), repeat)
+        results[str(size)] = result
+        print(f'{size}: ' + ', '.join(f'{name} {value * 1000:.2f} ms' for name, value in result.items()
+                                      if name.endswith('_seconds') and name != 'collect_seconds'),
+              file=sys.stderr)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Indexed queries against linear scans')
+    parser.add_argument('--sizes', default='10000,100000', help='comma separated file counts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, object]] = run_suite([int(size) for size in args.sizes.split(',')], args.seed,
+                                                      args.repeat)
+    output: str = json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# Benchmark of the stat calls made per directory entry by collect_slides, comparing
+# NormalFileSystemAccess (listdir + isdir + getmtime) with ScandirFileSystemAccess.
+# Run from the repository root: python -m benchmarks.bench_stat_calls [file_count]
+import os
+import sys
+import time
+import tempfile
+from typing import Tuple
+
+from config import collect_slides, SlidesCollection, FileSystemAccess, \
+    NormalFileSystemAccess, ScandirFileSystemAccess
+
+
+# Proxy for os.DirEntry that counts the calls to stat
+class CountingDirEntry:
+    def __init__(self, entry: os.DirEntry, counter: list):
+        self._entry = entry
+        self._counter = counter
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        self._counter[0] += 1
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+
+class CountingScandir:
+    def __init__(self, path: str, counter: list):
+        self._iterator = real_scandir(path)
+        self._counter = counter
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._iterator.close()
+
+    def __iter__(self):
+        for entry in self._iterator:
+            yield CountingDirEntry(entry, self._counter)
+
+
+real_stat = os.stat
+real_scandir = os.scandir
+
+
+def make_tree(root: str, file_count: int, files_per_dir: int = 100) -> None:
+    for i in range(file_count):
+        dir_path: str = os.path.join(root, f'dir{i // files_per_dir}@wg{1 + i % 3}')
+        os.makedirs(dir_path, exist_ok=True)
+        with open(os.path.join(dir_path, f'slide{i}.jpg'), 'wb'):
+            pass
+
+
+def run(root: str, fs_access: FileSystemAccess) -> Tuple[int, int, float]:
+    counter: list = [0]
+
+    def counting_stat(*args, **kwargs):
+        counter[0] += 1
+        return real_stat(*args, **kwargs)
+
+    os.stat = counting_stat
+    os.scandir = lambda path: CountingScandir(path, counter)
+    try:
+        start: float = time.perf_counter()
+        slide_collection: SlidesCollection = SlidesCollection()
+        collect_slides(slide_collection, root, fs_access=fs_access)
+        elapsed: float = time.perf_counter() - start
+    finally:
+        os.stat = real_stat
+        os.scandir = real_scandir
+    slide_count: int = sum(len(slides) for slides in slide_collection.normal_slides.values())
+    return slide_count, counter[0], elapsed
+
+
+def main() -> None:
+    file_count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root, file_count)
+        entry_count: int = file_count + (file_count + 99) // 100
+        print(f'{file_count} files, {entry_count} directory entries')
+        for fs_access in (NormalFileSystemAccess(), ScandirFileSystemAccess()):
+            slide_count, stat_calls, elapsed = run(root, fs_access)
+            print(f'{type(fs_access).__name__:26} slides={slide_count} stat calls={stat_calls} '
+                  f'per entry={stat_calls / entry_count:.2f} time={elapsed:.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Frames per second of the transition compositor by display resolution, for the crossfade
+# and the slide transitions, and the frame count it settles on for a frame budget.
+# Needs NumPy. Run from the repository root:
+#   python -m benchmarks.bench_transitions --sizes 1280x720,1920x1080,3840x2160
+import sys
+import json
+import argparse
+from typing import Dict
+
+from prefetch import DecodedImage
+from compositor import CROSSFADE, SLIDE, TransitionCompositor
+
+
+def random_image(file: str, width: int, height: int, seed: int) -> DecodedImage:
+    import numpy as np
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 4), dtype=np.uint8)
+    return DecodedImage(file, width, height, 'rgba', pixels.tobytes())
+
+
+def measure_transitions(width: int, height: int, transitions: int, frame_budget: float) -> Dict[str, object]:
+    first: DecodedImage = random_image('first', width, height, 1)
+    second: DecodedImage = random_image('second', width, height, 2)
+    result: Dict[str, object] = {}
+    for kind in (CROSSFADE, SLIDE):
+        # a budget nothing misses, so that every transition has the same frame count
+        compositor: TransitionCompositor = TransitionCompositor(width, height, frame_budget=float('inf'))
+        seconds_per_frame: float = min(compositor.composite(first, second, kind).seconds_per_frame
+                                       for _ in range(transitions))
+        result[f'{kind}_frames_per_second'] = 1 / seconds_per_frame
+        budgeted: TransitionCompositor = TransitionCompositor(width, height, frame_budget=frame_budget)
+        for _ in range(transitions):
+            budgeted.composite(first, second, kind)
+        result[f'{kind}_budgeted_frame_count'] = budgeted.frame_count
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Transition frames per second by resolution')
+    parser.add_argument('--sizes', default='1280x720,1920x1080', help='comma separated WIDTHxHEIGHT')
+    parser.add_argument('--transitions', type=int, default=5)
+    parser.add_argument('--frame-budget', type=float, default=1 / 60, help='seconds of computing per frame')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, object]] = {}
+    for size in args.sizes.split(','):
+        width, height = (int(value) for value in size.split('x'))
+        result: Dict[str, object] = measure_transitions(width, height, args.transitions, args.frame_budget)
+        results[size] = result
+        print(f'{size}: crossfade {result["crossfade_frames_per_second"]:.1f} frames/s '
+              f'({result["crossfade_budgeted_frame_count"]} frames in budget), '
+              f'slide {result["slide_frames_per_second"]:.1f} frames/s '
+              f'({result["slide_budgeted_frame_count"]} frames in budget)', file=sys.stderr)
+    output: str = json.dumps({'python': sys.version.split()[0], 'results': results}, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
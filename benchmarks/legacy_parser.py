@@ -0,0 +1,76 @@
+# The filename config parser as it was before the compiled grammar, kept as the
+# reference for the parser benchmark and the equivalence test
+import datetime
+from typing import List
+from config import ShowConfig, cement_specialized_config
+
+
+def legacy_expire_date_from_file_date_and_string(file_date: datetime.datetime, expire_date_string: str) -> \
+                                            datetime.datetime:
+    if len(expire_date_string) == 8:
+        return datetime.datetime.strptime(expire_date_string, "%d%m%Y")
+    elif len(expire_date_string) == 6:
+        return datetime.datetime.strptime(expire_date_string, "%d%m%y")
+    elif len(expire_date_string) == 4:
+        # try the year before, same, and year after
+        for year in range(file_date.year-1, file_date.year+2):
+            try:
+                expire_after_date_attemp_string: str = f'{expire_date_string}{year}'
+                expire_after_date: datetime.datetime = datetime.datetime.strptime(
+                    expire_after_date_attemp_string, "%d%m%Y")
+                if file_date - datetime.timedelta(days=90) < expire_after_date < file_date + datetime.timedelta(days=274):
+                    return expire_after_date
+            except ValueError:
+                pass
+        raise ValueError("Could not find a valid date for " +
+                         expire_date_string + " and file date " + str(file_date))
+        #raise ValueError("Invalid expire date string " + expire_date_string)
+
+
+def legacy_parse_file_name_for_config(filename: str, file_date: datetime.datetime) -> ShowConfig:
+    # split on @
+    config_strings: List[str] = filename.split("@")
+    show_config: ShowConfig = ShowConfig()
+
+    # ignore first string
+    for config_string in config_strings[1:]:
+        config_string: str = config_string.lower()
+        # check for expiration date
+        if config_string[0:4] == "till":
+            show_config.expire_after_date: datetime.datetime = \
+                legacy_expire_date_from_file_date_and_string(
+                    file_date, config_string[4:])
+        if config_string[0:3] == "dur":
+            show_config.duration: datetime.timedelta = datetime.timedelta(
+                seconds=int(config_string[3:]))
+        if config_string[0:8] == "maxfiles":
+            show_config.max_slides: int = int(config_string[8:])
+
+        if config_string[0:2] == "wg":
+            cement_specialized_config(show_config, False)
+            # replace _ with . to get weight
+            show_config.specialized_config.weight: float = float(
+                config_string[2:].replace("_", "."))
+
+        # if configString[0:4] == "freq":
+        #  cement_specialized_config(show_config, True)
+
+        if config_string[0:3] == "all":
+            cement_specialized_config(show_config, True)
+            show_config.specialized_config.one_at_a_time: bool = False
+            freq_str: str = config_string[3:]
+            # split on "_" to get frequencies
+            freq_strs: List[str] = freq_str.split("_")
+            show_config.specialized_config.frequencies = [
+                int(freq) for freq in freq_strs]
+            # check if there is at least one frequency
+            if len(show_config.specialized_config.frequencies) == 0:
+                raise ValueError("At least one frequency must be provided")
+
+        if config_string[0:6] == "single":
+            freq_str: str = config_string[6:]
+            cement_specialized_config(show_config, True)
+            show_config.specialized_config.frequencies = [int(freq_str)]
+            show_config.specialized_config.one_at_a_time: bool = True
+    return show_config
+
@@ -0,0 +1,153 @@
+# Synthetic slide trees for the benchmarks: deep nesting, a mix of @wg/@all/@single/@till
+# directories and file configs, served from memory or written out to a real directory
+import os
+import random
+import datetime
+from dataclasses import dataclass
+from typing import Dict, List
+from config import FileSystemAccess, DirEntryInfo
+
+
+generated_tree_date: datetime.datetime = datetime.datetime(2024, 1, 15)
+
+
+@dataclass
+class SimNode:
+    name: str
+    is_dir: bool
+    modification_time: datetime.datetime
+    children: List['SimNode'] | None = None
+
+
+def _dir_config(rng: random.Random, file_date: datetime.datetime, in_overshadow: bool) -> str:
+    expire_date: datetime.datetime = file_date + datetime.timedelta(days=rng.randint(-20, 60))
+    if in_overshadow:
+        choices: List[str] = ['', '', f'@dur{rng.randint(3, 12)}', f'@till{expire_date:%d%m}']
+    else:
+        choices = ['', '', f'@wg{rng.randint(1, 4)}', f'@wg{rng.randint(1, 3)}_5',
+                   f'@all{rng.randint(4, 8)}_{rng.randint(9, 14)}', f'@single{rng.randint(4, 10)}',
+                   f'@till{expire_date:%d%m%Y}', f'@dur{rng.randint(3, 12)}@maxfiles{rng.randint(50, 500)}']
+    return rng.choice(choices)
+
+
+def _file_name(rng: random.Random, index: int, file_date: datetime.datetime) -> str:
+    roll: float = rng.random()
+    if roll < 0.05:
+        return f'slide{index}@till{file_date + datetime.timedelta(days=rng.randint(-10, 40)):%d%m}.jpg'
+    if roll < 0.10:
+        return f'slide{index}@dur{rng.randint(3, 15)}.png'
+    if roll < 0.11:
+        return f'notes{index}.txt'
+    return f'slide{index}.jpg'
+
+
+# Build a tree with file_count files spread over nested directories
+def generate_tree(file_count: int, seed: int = 0, files_per_dir: int = 50, max_depth: int = 5,
+                  current_date: datetime.datetime = generated_tree_date) -> SimNode:
+    rng: random.Random = random.Random(seed)
+    root: SimNode = SimNode('', True, current_date, [])
+    # directories that can get subdirectories: (node, depth, inside an overshadow directory)
+    parents: List[tuple] = [(root, 0, False)]
+    files_left: int = file_count
+    dir_index: int = 0
+    while files_left > 0:
+        parent, depth, in_overshadow = parents[rng.randrange(len(parents))]
+        file_date: datetime.datetime = current_date - datetime.timedelta(days=rng.randint(0, 30))
+        config: str = _dir_config(rng, file_date, in_overshadow)
+        directory: SimNode = SimNode(f'dir{dir_index}{config}', True, file_date, [])
+        dir_index += 1
+        parent.children.append(directory)
+        if depth + 1 < max_depth:
+            parents.append((directory, depth + 1, in_overshadow or '@all' in config or '@single' in config))
+        count: int = min(files_left, rng.randint(files_per_dir // 2, files_per_dir * 3 // 2))
+        for index in range(count):
+            directory.children.append(SimNode(_file_name(rng, index, file_date), False, file_date))
+        files_left -= count
+    return root
+
+
+def count_nodes(node: SimNode) -> int:
+    return 1 + sum(count_nodes(child) for child in node.children or [])
+
+
+def all_names(node: SimNode) -> List[tuple]:
+    names: List[tuple] = []
+    pending: List[SimNode] = [node]
+    while pending:
+        current: SimNode = pending.pop()
+        for child in current.children or []:
+            names.append((os.path.splitext(child.name)[0] if not child.is_dir else child.name,
+                          child.modification_time))
+            if child.is_dir:
+                pending.append(child)
+    return names
+
+
+# Write the tree under root_dir, with the modification times of the nodes
+def materialize(node: SimNode, root_dir: str) -> None:
+    os.makedirs(root_dir, exist_ok=True)
+    for child in node.children or []:
+        path: str = os.path.join(root_dir, child.name)
+        if child.is_dir:
+            materialize(child, path)
+        else:
+            with open(path, 'wb'):
+                pass
+        timestamp: float = child.modification_time.timestamp()
+        os.utime(path, (timestamp, timestamp))
+
+
+# FileSystemAccess over a SimNode tree, with constant time path lookups
+class InMemoryFileSystemAccess(FileSystemAccess):
+    root_dir: str
+    current_date: datetime.date
+    _nodes: Dict[str, SimNode]
+
+    def __init__(self, root: SimNode, root_dir: str = '/mem',
+                 current_date: datetime.date = generated_tree_date.date()):
+        self.root_dir = root_dir
+        self.current_date = current_date
+        self._nodes = {}
+        self._index(root, root_dir)
+
+    def _index(self, node: SimNode, path: str) -> None:
+        self._nodes[path] = node
+        for child in node.children or []:
+            self._index(child, path + '/' + child.name)
+
+    def _node(self, path: str) -> SimNode | None:
+        return self._nodes.get(path.rstrip('/'))
+
+    def list_dir(self, path: str) -> List[str]:
+        node: SimNode | None = self._node(path)
+        return [child.name for child in node.children] if node and node.is_dir else []
+
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        node: SimNode | None = self._node(path)
+        if not node or not node.is_dir:
+            return []
+        return [DirEntryInfo(child.name, child.is_dir, child.modification_time) for child in node.children]
+
+    def is_dir(self, path: str) -> bool:
+        node: SimNode | None = self._node(path)
+        return node.is_dir if node else False
+
+    def get_file_suffix(self, path: str) -> str:
+        return os.path.splitext(path)[1]
+
+    def get_file_main_name(self, path: str) -> str:
+        return os.path.splitext(path)[0]
+
+    def get_file_modification_time(self, path: str) -> datetime.datetime:
+        node: SimNode | None = self._node(path)
+        return node.modification_time if node else None
+
+    def get_current_date(self) -> datetime.date:
+        return self.current_date
+
+    def join(self, path1: str, path2: str) -> str:
+        if path1 == '':
+            return path2
+        if path2 == '':
+            return path1
+        return path1.rstrip('/') + '/' + path2.lstrip('/')
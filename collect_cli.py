@@ -0,0 +1,93 @@
+# Headless scan of slide trees, for validating the content of many venues without the
+# display stack. Imports only config.py and the standard library, the process pool is
+# only imported when several roots are scanned in parallel.
+#   python collect_cli.py /srv/slides/venue1 /srv/slides/venue2 --workers 4 --output report.json
+import os
+import sys
+import json
+import time
+import argparse
+from typing import Dict, Iterator, List
+from config import SlidesCollection, Severity, collect_slides
+
+
+# Scan one root, the result is plain data so that it can come back from a worker process
+def scan_root(root_dir: str) -> Dict[str, object]:
+    start: float = time.perf_counter()
+    slide_collection: SlidesCollection = SlidesCollection()
+    result: Dict[str, object] = {'root_dir': root_dir}
+    try:
+        if not os.path.isdir(root_dir):
+            raise NotADirectoryError(f"{root_dir} is not a directory")
+        slide_count: int = collect_slides(slide_collection, root_dir)
+    except (OSError, ValueError) as error:
+        # a file name that cannot be parsed aborts the scan of its root
+        result['error'] = str(error)
+        result['scan_seconds'] = time.perf_counter() - start
+        return result
+    result['scan_seconds'] = time.perf_counter() - start
+    result['counts'] = {
+        'slides': slide_count,
+        'normal_slides': sum(len(slides) for slides in slide_collection.normal_slides.values()),
+        'normal_slides_by_weight': {str(weight): len(slides)
+                                    for weight, slides in slide_collection.normal_slides.items()},
+        'overshadow_groups': len(slide_collection.overshadow_slide_collections),
+        'overshadow_slides': sum(len(collection.files)
+                                 for collection in slide_collection.overshadow_slide_collections),
+        'expired_slides': len(slide_collection.expired_slides),
+        'errors': sum(message.severity == Severity.ERROR for message in slide_collection.messages),
+        'messages': len(slide_collection.messages),
+    }
+    result['messages'] = [{'severity': message.severity.name, 'file': message.file, 'message': message.error}
+                          for message in slide_collection.messages]
+    result['expired_slides'] = list(slide_collection.expired_slides)
+    return result
+
+
+# The results in the order of root_dirs, scanned by up to workers processes
+def scan_roots(root_dirs: List[str], workers: int = 1) -> Iterator[Dict[str, object]]:
+    if workers <= 1 or len(root_dirs) <= 1:
+        for root_dir in root_dirs:
+            yield scan_root(root_dir)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(workers, len(root_dirs))) as executor:
+        yield from executor.map(scan_root, root_dirs)
+
+
+def has_errors(result: Dict[str, object]) -> bool:
+    return 'error' in result or result['counts']['errors'] > 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Scan slide trees and report their messages as JSON')
+    parser.add_argument('root_dirs', nargs='+', help='root directories of the slide trees')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='number of processes scanning roots in parallel')
+    parser.add_argument('--output', help='write the report to this file instead of stdout')
+    parser.add_argument('--jsonl', action='store_true', help='one JSON line per root, written as scanned')
+    parser.add_argument('--fail-on-error', action='store_true',
+                        help='exit with status 1 when a root has errors')
+    args = parser.parse_args(argv)
+
+    output = open(args.output, 'w') if args.output else sys.stdout
+    failed: bool = False
+    try:
+        results: List[Dict[str, object]] = []
+        for result in scan_roots(args.root_dirs, args.workers):
+            failed = failed or has_errors(result)
+            if args.jsonl:
+                output.write(json.dumps(result, sort_keys=True) + '\n')
+                output.flush()
+            else:
+                results.append(result)
+        if not args.jsonl:
+            output.write(json.dumps({'roots': results}, indent=2, sort_keys=True) + '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 1 if failed and args.fail_on_error else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,255 @@
+# Compact storage of very large slide collections. Slide paths are split into an interned
+# directory prefix, kept as an index in an array, and an interned file name. Durations
+# are indices into a table of the distinct durations and expire dates are kept per
+# directory. The containers are sequences of NormalSlide and str, so normal_slides and
+# overshadow_slide_collections keep their public view, records are only built when read
+import sys
+import array
+import datetime
+import dataclasses
+from collections.abc import MutableMapping, MutableSequence
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Tuple
+from config import SlidesCollection, NormalSlide
+
+
+# Directory prefixes and file names shared by all containers of a collection
+class PathTable:
+    __slots__ = ('_dirs', '_dir_ids', '_durations', '_duration_ids')
+
+    def __init__(self):
+        self._dirs: List[str] = []
+        self._dir_ids: Dict[str, int] = {}
+        self._durations: List[datetime.timedelta] = []
+        self._duration_ids: Dict[datetime.timedelta, int] = {}
+
+    def encode(self, path: str) -> Tuple[int, str]:
+        directory, _, name = path.rpartition('/')
+        dir_id: int | None = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = len(self._dirs)
+            self._dirs.append(sys.intern(directory))
+            self._dir_ids[self._dirs[-1]] = dir_id
+        return dir_id, sys.intern(name)
+
+    # The (dir id, name) of path, or None when its directory is not known, never adds it
+    def find(self, path: str) -> Tuple[int, str] | None:
+        directory, _, name = path.rpartition('/')
+        dir_id: int | None = self._dir_ids.get(directory)
+        return None if dir_id is None else (dir_id, name)
+
+    def decode(self, dir_id: int, name: str) -> str:
+        directory: str = self._dirs[dir_id]
+        return directory + '/' + name if directory else name
+
+    def encode_duration(self, duration: datetime.timedelta) -> int:
+        duration_id: int | None = self._duration_ids.get(duration)
+        if duration_id is None:
+            duration_id = len(self._durations)
+            self._durations.append(duration)
+            self._duration_ids[duration] = duration_id
+        return duration_id
+
+    def decode_duration(self, duration_id: int) -> datetime.timedelta:
+        return self._durations[duration_id]
+
+    @property
+    def dir_count(self) -> int:
+        return len(self._dirs)
+
+
+# Base of the compact sequences: equality and repr as the plain list they stand for
+class _CompactSequence(MutableSequence):
+    __slots__ = ()
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, _CompactSequence)):
+            return len(self) == len(other) and all(item == other_item for item, other_item in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+# A list of file paths
+class CompactFileList(_CompactSequence):
+    __slots__ = ('_table', '_dir_ids', '_names')
+
+    def __init__(self, table: PathTable, files: Iterable[str] = ()):
+        self._table = table
+        self._dir_ids: array.array = array.array('I')
+        self._names: List[str] = []
+        self.extend(files)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._table.decode(dir_id, name)
+                    for dir_id, name in zip(self._dir_ids[index], self._names[index])]
+        return self._table.decode(self._dir_ids[index], self._names[index])
+
+    def __setitem__(self, index: int, file: str) -> None:
+        self._dir_ids[index], self._names[index] = self._table.encode(file)
+
+    def __delitem__(self, index) -> None:
+        del self._dir_ids[index]
+        del self._names[index]
+
+    def insert(self, index: int, file: str) -> None:
+        dir_id, name = self._table.encode(file)
+        self._dir_ids.insert(index, dir_id)
+        self._names.insert(index, name)
+
+    def append(self, file: str) -> None:
+        dir_id, name = self._table.encode(file)
+        self._dir_ids.append(dir_id)
+        self._names.append(name)
+
+    def __iter__(self) -> Iterator[str]:
+        decode = self._table.decode
+        for dir_id, name in zip(self._dir_ids, self._names):
+            yield decode(dir_id, name)
+
+    def __contains__(self, file: object) -> bool:
+        key: Tuple[int, str] | None = self._table.find(file) if isinstance(file, str) else None
+        if key is None:
+            return False
+        dir_id, name = key
+        return any(other_dir_id == dir_id and other_name == name
+                   for other_dir_id, other_name in zip(self._dir_ids, self._names))
+
+
+# A list of NormalSlide, the records are built when they are read
+class CompactSlideList(_CompactSequence):
+    __slots__ = ('_table', '_dir_ids', '_names', '_durations')
+
+    def __init__(self, table: PathTable, slides: Iterable[NormalSlide] = ()):
+        self._table = table
+        self._dir_ids: array.array = array.array('I')
+        self._names: List[str] = []
+        self._durations: array.array = array.array('H')
+        self.extend(slides)
+
+    def _slide(self, dir_id: int, name: str, duration_id: int) -> NormalSlide:
+        return NormalSlide(self._table.decode(dir_id, name), self._table.decode_duration(duration_id))
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._slide(*item) for item in
+                    zip(self._dir_ids[index], self._names[index], self._durations[index])]
+        return self._slide(self._dir_ids[index], self._names[index], self._durations[index])
+
+    def __setitem__(self, index: int, slide: NormalSlide) -> None:
+        self._dir_ids[index], self._names[index] = self._table.encode(slide.file)
+        self._durations[index] = self._table.encode_duration(slide.duration)
+
+    def __delitem__(self, index) -> None:
+        del self._dir_ids[index]
+        del self._names[index]
+        del self._durations[index]
+
+    def insert(self, index: int, slide: NormalSlide) -> None:
+        dir_id, name = self._table.encode(slide.file)
+        self._dir_ids.insert(index, dir_id)
+        self._names.insert(index, name)
+        self._durations.insert(index, self._table.encode_duration(slide.duration))
+
+    def append(self, slide: NormalSlide) -> None:
+        dir_id, name = self._table.encode(slide.file)
+        self._dir_ids.append(dir_id)
+        self._names.append(name)
+        self._durations.append(self._table.encode_duration(slide.duration))
+
+    def __iter__(self) -> Iterator[NormalSlide]:
+        for item in zip(self._dir_ids, self._names, self._durations):
+            yield self._slide(*item)
+
+    # The slide files without building NormalSlide records
+    def files(self) -> Iterator[str]:
+        decode = self._table.decode
+        for dir_id, name in zip(self._dir_ids, self._names):
+            yield decode(dir_id, name)
+
+
+# Expire dates by slide file, stored by directory id and interned file name
+class CompactExpireDates(MutableMapping):
+    __slots__ = ('_table', '_dates', '_count')
+
+    def __init__(self, table: PathTable, expire_dates: Iterable[Tuple[str, datetime.datetime]] = ()):
+        self._table = table
+        self._dates: Dict[int, Dict[str, datetime.datetime]] = {}
+        self._count: int = 0
+        for file, expire_after_date in expire_dates:
+            self[file] = expire_after_date
+
+    def __getitem__(self, file: str) -> datetime.datetime:
+        key: Tuple[int, str] | None = self._table.find(file)
+        if key is None or key[0] not in self._dates:
+            raise KeyError(file)
+        return self._dates[key[0]][key[1]]
+
+    def __setitem__(self, file: str, expire_after_date: datetime.datetime) -> None:
+        dir_id, name = self._table.encode(file)
+        dir_dates: Dict[str, datetime.datetime] = self._dates.setdefault(dir_id, {})
+        if name not in dir_dates:
+            self._count += 1
+        dir_dates[name] = expire_after_date
+
+    def __delitem__(self, file: str) -> None:
+        key: Tuple[int, str] | None = self._table.find(file)
+        if key is None or key[0] not in self._dates or key[1] not in self._dates[key[0]]:
+            raise KeyError(file)
+        dir_dates: Dict[str, datetime.datetime] = self._dates[key[0]]
+        del dir_dates[key[1]]
+        if not dir_dates:
+            del self._dates[key[0]]
+        self._count -= 1
+
+    def __iter__(self) -> Iterator[str]:
+        for dir_id, dir_dates in list(self._dates.items()):
+            for name in list(dir_dates):
+                yield self._table.decode(dir_id, name)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+# A SlidesCollection with compact containers, collected like any other:
+#   slide_collection = CompactSlidesCollection()
+#   collect_slides(slide_collection, root_dir)
+@dataclass(eq=False)
+class CompactSlidesCollection(SlidesCollection):
+    path_table: PathTable = dataclasses.field(default_factory=PathTable, repr=False)
+
+    def __post_init__(self):
+        self.expired_slides = self.create_file_list(self.expired_slides)
+        self.expire_dates = self.create_expire_date_map(self.expire_dates.items())
+
+    def create_slide_list(self, slides: Iterable[NormalSlide]) -> CompactSlideList:
+        return CompactSlideList(self.path_table, slides)
+
+    def create_file_list(self, files: Iterable[str]) -> CompactFileList:
+        return CompactFileList(self.path_table, files)
+
+    def create_expire_date_map(self, expire_dates: Iterable[Tuple[str, datetime.datetime]]) -> CompactExpireDates:
+        return CompactExpireDates(self.path_table, expire_dates)
+
+    # sub collections share the path table, so that their containers can be moved over
+    def create_sub_collection(self) -> 'CompactSlidesCollection':
+        return CompactSlidesCollection(path_table=self.path_table)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SlidesCollection):
+            return NotImplemented
+        return self.normal_slides == other.normal_slides and \
+            self.overshadow_slide_collections == other.overshadow_slide_collections and \
+            self.messages == other.messages and self.expired_slides == other.expired_slides and \
+            dict(self.expire_dates) == dict(other.expire_dates)
@@ -0,0 +1,143 @@
+# Transitions between slides composited on the CPU, for players without a GPU. The frames
+# of a transition are computed ahead with NumPy at display resolution, into buffers that
+# are allocated once and reused by every transition. When computing a frame takes longer
+# than the frame budget, the next transitions get fewer intermediate frames, each shown
+# longer, so the player keeps up. NumPy is only imported when a compositor is created.
+#   compositor = TransitionCompositor(1920, 1080)
+#   for slide, transition in slide_transitions(SlideScheduler(slide_collection), pipeline.get, compositor):
+#       show the frames of transition, one every transition.frame_interval seconds, then slide
+import time
+from dataclasses import dataclass
+from typing import Callable, Iterable, Iterator, List, Tuple
+from prefetch import DecodedImage
+from scheduler import ScheduledSlide
+
+CROSSFADE: str = 'crossfade'
+SLIDE: str = 'slide'
+# the crossfade weight is a fixed point number with this many bits, so that the blend fits in int16
+BLEND_BITS: int = 7
+
+
+# The frames of one transition, views of the compositor buffers that stay valid until
+# the next transition is composited
+@dataclass
+class Transition:
+    kind: str
+    frames: List
+    frame_interval: float
+    seconds_per_frame: float
+
+    # The frames as DecodedImage for texture_from_decoded, without copying the pixels
+    def decoded_frames(self, file: str) -> Iterator[DecodedImage]:
+        for frame in self.frames:
+            yield DecodedImage(file, frame.shape[1], frame.shape[0], 'rgba', memoryview(frame).cast('B'))
+
+
+class TransitionCompositor:
+    width: int
+    height: int
+    duration: float
+    frame_budget: float
+    max_frames: int
+    min_frames: int
+    frame_count: int
+
+    # duration is the length of a transition in seconds, frame_budget the time computing one
+    # of max_frames frames may take, frame_count adapts between min_frames and max_frames
+    def __init__(self, width: int, height: int, duration: float = 1.0, frame_budget: float = 1 / 60,
+                 max_frames: int = 30, min_frames: int = 2, clock: Callable[[], float] = time.perf_counter):
+        if not 1 <= min_frames <= max_frames:
+            raise ValueError(f"Frame counts must satisfy 1 <= min_frames <= max_frames, "
+                             f"got min_frames={min_frames}, max_frames={max_frames}")
+        import numpy as np
+
+        self._np = np
+        self.width = width
+        self.height = height
+        self.duration = duration
+        self.frame_budget = frame_budget
+        self.max_frames = max_frames
+        self.min_frames = min_frames
+        self.frame_count = max_frames
+        self.clock = clock
+        shape: Tuple[int, int, int] = (height, width, 4)
+        self._from = np.empty(shape, dtype=np.uint8)
+        self._to = np.empty(shape, dtype=np.uint8)
+        self._from16 = np.empty(shape, dtype=np.int16)
+        self._difference = np.empty(shape, dtype=np.int16)
+        self._blend = np.empty(shape, dtype=np.int16)
+        self._frames = [np.empty(shape, dtype=np.uint8) for _ in range(max_frames)]
+
+    # Copy decoded into target centered, cropped when it is larger than the display and
+    # on black when it is smaller
+    def fit(self, decoded: DecodedImage, target) -> None:
+        np = self._np
+        pixels = np.frombuffer(decoded.pixels, dtype=np.uint8).reshape(decoded.height, decoded.width, 4)
+        copy_height: int = min(decoded.height, self.height)
+        copy_width: int = min(decoded.width, self.width)
+        source_y: int = (decoded.height - copy_height) // 2
+        source_x: int = (decoded.width - copy_width) // 2
+        target_y: int = (self.height - copy_height) // 2
+        target_x: int = (self.width - copy_width) // 2
+        if copy_height < self.height or copy_width < self.width:
+            target[...] = 0
+            target[..., 3] = 255
+        target[target_y:target_y + copy_height, target_x:target_x + copy_width] = \
+            pixels[source_y:source_y + copy_height, source_x:source_x + copy_width]
+
+    def _crossfade(self, alpha: int, frame) -> None:
+        np = self._np
+        # from + (to - from) * alpha, in fixed point with BLEND_BITS bits
+        np.multiply(self._difference, alpha, out=self._blend)
+        np.right_shift(self._blend, BLEND_BITS, out=self._blend)
+        np.add(self._blend, self._from16, out=self._blend)
+        np.copyto(frame, self._blend, casting='unsafe')
+
+    def _slide(self, offset: int, frame) -> None:
+        # the new slide pushes the old one out to the left
+        frame[:, :self.width - offset] = self._from[:, offset:]
+        frame[:, self.width - offset:] = self._to[:, :offset]
+
+    # The intermediate frames from one image to the next, the images themselves are not included
+    def composite(self, from_image: DecodedImage, to_image: DecodedImage, kind: str = CROSSFADE) -> Transition:
+        np = self._np
+        self.fit(from_image, self._from)
+        self.fit(to_image, self._to)
+        frame_count: int = self.frame_count
+        start: float = self.clock()
+        if kind == CROSSFADE:
+            np.copyto(self._from16, self._from)
+            np.subtract(self._to, self._from16, out=self._difference)
+            for idx in range(frame_count):
+                self._crossfade(((idx + 1) << BLEND_BITS) // (frame_count + 1), self._frames[idx])
+        elif kind == SLIDE:
+            for idx in range(frame_count):
+                self._slide((idx + 1) * self.width // (frame_count + 1), self._frames[idx])
+        else:
+            raise ValueError(f"Unknown transition {kind}")
+        seconds_per_frame: float = (self.clock() - start) / frame_count
+        self._adapt(seconds_per_frame)
+        return Transition(kind, self._frames[:frame_count], self.duration / (frame_count + 1), seconds_per_frame)
+
+    # As many frames as fit in the time max_frames frames of frame_budget would take, at the
+    # cost of the last transition. All frames while they stay within the budget
+    def _adapt(self, seconds_per_frame: float) -> None:
+        if seconds_per_frame <= self.frame_budget:
+            self.frame_count = self.max_frames
+        else:
+            self.frame_count = max(self.min_frames,
+                                   int(self.max_frames * self.frame_budget / seconds_per_frame))
+
+
+# Follows the slide order, such as a SlideScheduler over a SlidesCollection, and yields every
+# slide after the first with the transition into it. load gives the decoded image of a file,
+# such as PrefetchPipeline.get
+def slide_transitions(slides: Iterable[ScheduledSlide], load: Callable[[str], DecodedImage],
+                      compositor: TransitionCompositor,
+                      kind: str = CROSSFADE) -> Iterator[Tuple[ScheduledSlide, Transition]]:
+    previous: DecodedImage | None = None
+    for slide in slides:
+        image: DecodedImage = load(slide.file)
+        if previous is not None:
+            yield slide, compositor.composite(previous, image, kind)
+        previous = image
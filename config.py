@@ -1,18 +1,36 @@
 # Importing necessary libraries
 import os
+import re
 import copy
 import datetime
+import functools
+import time
 import enum
 import dataclasses
 # Importing dataclass for creating data classes
 from dataclasses import dataclass
 # Importing typing for type hinting
-from typing import Self, List, Set
+from typing import Self, List, Set, Callable, Tuple, Dict, Iterable, Generator, TYPE_CHECKING
 # Importing ABC and abstractmethod for creating abstract base classes and abstract methods
 from abc import ABC, abstractmethod
 # Importing OrderedDict for creating ordered dictionary
 from collections import OrderedDict
 
+if TYPE_CHECKING:
+    from scan_stats import ScanStats
+
+# One directory listing entry, with its type and modification time fetched together.
+# show_config holds the configuration parsed from the name once it has been parsed
+
+
+@dataclass
+class DirEntryInfo:
+    name: str
+    is_dir: bool
+    modification_time: datetime.datetime
+    show_config: 'ShowConfig | None' = dataclasses.field(default=None, compare=False)
+
+
 # Abstract base class for file system access
 
 
@@ -46,6 +64,17 @@ class FileSystemAccess(ABC):
     def join(self, path1: str, path2: str) -> str:
         pass
 
+    # List a directory together with the type and modification time of every entry.
+    # The default implementation queries each entry separately, implementations that
+    # can get this information from the listing itself should override it
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        entries: List[DirEntryInfo] = []
+        for name in self.list_dir(path):
+            full_file_name: str = self.join(path, name)
+            entries.append(DirEntryInfo(name, self.is_dir(full_file_name),
+                                        self.get_file_modification_time(full_file_name)))
+        return entries
+
 
 # Class for normal file system access, inherits from FileSystemAccess
 class NormalFileSystemAccess(FileSystemAccess):
@@ -72,6 +101,52 @@ class NormalFileSystemAccess(FileSystemAccess):
         return os.path.join(path1, path2)
 
 
+# File system access that takes entry types and modification times from os.scandir,
+# the type comes from the listing itself and the modification time costs at most one
+# stat per entry (none on Windows), instead of separate isdir and getmtime calls
+class ScandirFileSystemAccess(NormalFileSystemAccess):
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        entries: List[DirEntryInfo] = []
+        with os.scandir(path) as dir_iterator:
+            for entry in dir_iterator:
+                entries.append(DirEntryInfo(entry.name, entry.is_dir(),
+                                            datetime.datetime.fromtimestamp(entry.stat().st_mtime)))
+        return entries
+
+
+# File system access that forwards every call to another one, base class for
+# wrappers that only change a few of the calls
+class DelegatingFileSystemAccess(FileSystemAccess):
+    fs_access: FileSystemAccess
+
+    def __init__(self, fs_access: FileSystemAccess):
+        self.fs_access = fs_access
+
+    def list_dir(self, path: str) -> List[str]:
+        return self.fs_access.list_dir(path)
+
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        return self.fs_access.list_dir_entries(path)
+
+    def is_dir(self, path: str) -> bool:
+        return self.fs_access.is_dir(path)
+
+    def get_file_suffix(self, path: str) -> str:
+        return self.fs_access.get_file_suffix(path)
+
+    def get_file_main_name(self, path: str) -> str:
+        return self.fs_access.get_file_main_name(path)
+
+    def get_file_modification_time(self, path: str) -> datetime.datetime:
+        return self.fs_access.get_file_modification_time(path)
+
+    def get_current_date(self) -> datetime.date:
+        return self.fs_access.get_current_date()
+
+    def join(self, path1: str, path2: str) -> str:
+        return self.fs_access.join(path1, path2)
+
+
 image_suffixes: Set[str] = {".jpg", ".jpeg",
                             ".png", ".gif", ".bmp", ".tiff", ".tif"}
 
@@ -135,26 +210,121 @@ def fill_unspecified_show_config_with_defaults(show_config: ShowConfig) -> None:
             show_config.specialized_config.weight = default_choose_slide_config.weight
 
 
+# Copy of a specialized config with its unspecified fields filled with the defaults
+def _filled_specialized_config(specialized_config: OvershadowConfig | ChooseSlideConfig) -> \
+        OvershadowConfig | ChooseSlideConfig:
+    filled_config: OvershadowConfig | ChooseSlideConfig = copy.copy(specialized_config)
+    if isinstance(filled_config, OvershadowConfig):
+        if not filled_config.frequencies:
+            filled_config.frequencies = default_overshadow_config.frequencies
+        if not filled_config.one_at_a_time:
+            filled_config.one_at_a_time = default_overshadow_config.one_at_a_time
+    elif isinstance(filled_config, ChooseSlideConfig):
+        if not filled_config.weight:
+            filled_config.weight = default_choose_slide_config.weight
+    return filled_config
+
+
+# Immutable show config used while collecting. Overriding it with the config parsed from a
+# directory or file name gives a new layer (or the same object when nothing is overridden),
+# layers are never modified so entries of the same directory share one object, and the
+# defaults are filled once per layer
+class LayeredShowConfig:
+    __slots__ = ('expire_after_date', 'duration', 'max_slides', 'specialized_config', '_with_defaults')
+    expire_after_date: datetime.datetime | None
+    duration: datetime.timedelta | None
+    max_slides: int | None
+    specialized_config: OvershadowConfig | ChooseSlideConfig | None
+
+    def __init__(self, expire_after_date: datetime.datetime | None = None,
+                 duration: datetime.timedelta | None = None, max_slides: int | None = None,
+                 specialized_config: OvershadowConfig | ChooseSlideConfig | None = None):
+        object.__setattr__(self, 'expire_after_date', expire_after_date)
+        object.__setattr__(self, 'duration', duration)
+        object.__setattr__(self, 'max_slides', max_slides)
+        object.__setattr__(self, 'specialized_config', specialized_config)
+        object.__setattr__(self, '_with_defaults', None)
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError("LayeredShowConfig is immutable, use override")
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, (LayeredShowConfig, ShowConfig)):
+            return NotImplemented
+        return (self.expire_after_date, self.duration, self.max_slides, self.specialized_config) == \
+            (other.expire_after_date, other.duration, other.max_slides, other.specialized_config)
+
+    def __repr__(self) -> str:
+        return f'LayeredShowConfig(expire_after_date={self.expire_after_date!r}, ' \
+            f'duration={self.duration!r}, max_slides={self.max_slides!r}, ' \
+            f'specialized_config={self.specialized_config!r})'
+
+    @classmethod
+    def of(cls, show_config: 'ShowConfig | LayeredShowConfig') -> 'LayeredShowConfig':
+        if isinstance(show_config, LayeredShowConfig):
+            return show_config
+        return cls(show_config.expire_after_date, show_config.duration, show_config.max_slides,
+                   show_config.specialized_config)
+
+    # Same rules as ShowConfig.override, without modifying this layer
+    def override(self, other: ShowConfig) -> 'LayeredShowConfig':
+        if not (other.expire_after_date or other.duration or other.max_slides or other.specialized_config):
+            return self
+        return LayeredShowConfig(other.expire_after_date or self.expire_after_date,
+                                 other.duration or self.duration,
+                                 other.max_slides or self.max_slides,
+                                 other.specialized_config or self.specialized_config)
+
+    # This layer with unspecified fields filled like fill_unspecified_show_config_with_defaults
+    def with_defaults(self) -> 'LayeredShowConfig':
+        if self._with_defaults is None:
+            specialized_config: OvershadowConfig | ChooseSlideConfig = \
+                self.specialized_config or default_show_config.specialized_config
+            object.__setattr__(self, '_with_defaults', LayeredShowConfig(
+                self.expire_after_date or default_show_config.expire_after_date,
+                self.duration or default_show_config.duration,
+                self.max_slides or default_show_config.max_slides,
+                _filled_specialized_config(specialized_config)))
+        return self._with_defaults
+
+
+# Parse an 8 or 6 digit expire date, the result (or the error message) is cached per string
+@functools.lru_cache(maxsize=4096)
+def _parse_full_expire_date(expire_date_string: str) -> Tuple[datetime.datetime | None, str | None]:
+    date_format: str = "%d%m%Y" if len(expire_date_string) == 8 else "%d%m%y"
+    try:
+        return datetime.datetime.strptime(expire_date_string, date_format), None
+    except ValueError as error:
+        return None, str(error)
+
+
+# The valid dates for a 4 digit (day and month) expire date in the year before, the same
+# year and the year after the file year, cached per string and file year
+@functools.lru_cache(maxsize=4096)
+def _expire_date_candidates(expire_date_string: str, file_year: int) -> Tuple[datetime.datetime, ...]:
+    candidates: List[datetime.datetime] = []
+    for year in range(file_year-1, file_year+2):
+        try:
+            candidates.append(datetime.datetime.strptime(f'{expire_date_string}{year}', "%d%m%Y"))
+        except ValueError:
+            pass
+    return tuple(candidates)
+
+
 def expire_date_from_file_date_and_string(file_date: datetime.datetime, expire_date_string: str) -> \
                                             datetime.datetime:
-    if len(expire_date_string) == 8:
-        return datetime.datetime.strptime(expire_date_string, "%d%m%Y")
-    elif len(expire_date_string) == 6:
-        return datetime.datetime.strptime(expire_date_string, "%d%m%y")
+    if len(expire_date_string) == 8 or len(expire_date_string) == 6:
+        expire_after_date, error = _parse_full_expire_date(expire_date_string)
+        if error:
+            raise ValueError(error)
+        return expire_after_date
     elif len(expire_date_string) == 4:
-        # try the year before, same, and year after
-        for year in range(file_date.year-1, file_date.year+2):
-            try:
-                expire_after_date_attemp_string: str = f'{expire_date_string}{year}'
-                expire_after_date: datetime.datetime = datetime.datetime.strptime(
-                    expire_after_date_attemp_string, "%d%m%Y")
-                if file_date - datetime.timedelta(days=90) < expire_after_date < file_date + datetime.timedelta(days=274):
-                    return expire_after_date
-            except ValueError:
-                pass
+        # take the first candidate close enough to the file date
+        for expire_after_date in _expire_date_candidates(expire_date_string, file_date.year):
+            if file_date - datetime.timedelta(days=90) < expire_after_date < file_date + datetime.timedelta(days=274):
+                return expire_after_date
         raise ValueError("Could not find a valid date for " +
                          expire_date_string + " and file date " + str(file_date))
-        #raise ValueError("Invalid expire date string " + expire_date_string)
 
 
 def cement_specialized_config(show_config: ShowConfig, is_overshadow_config: bool):
@@ -177,61 +347,90 @@ def cement_specialized_config(show_config: ShowConfig, is_overshadow_config: boo
             show_config.specialized_config = ChooseSlideConfig()
 
 
+# Grammar of a single config token (the text after an @), keyword followed by its value
+config_token_pattern: re.Pattern = re.compile(r'(till|dur|maxfiles|wg|all|single)(.*)', re.DOTALL)
+
+
+# A config token with its value already converted, or the conversion error message
+@dataclass(frozen=True)
+class ConfigToken:
+    keyword: str
+    value: object
+    error: str | None = None
+
+
+def _convert_config_value(keyword: str, value_string: str) -> object:
+    if keyword == "dur":
+        return datetime.timedelta(seconds=int(value_string))
+    if keyword == "maxfiles":
+        return int(value_string)
+    if keyword == "wg":
+        # replace _ with . to get weight
+        return float(value_string.replace("_", "."))
+    if keyword == "all":
+        # split on "_" to get frequencies
+        return tuple(int(freq) for freq in value_string.split("_"))
+    if keyword == "single":
+        return int(value_string)
+    # till depends on the file date, it is resolved when the tokens are applied
+    return value_string
+
+
+# Tokenize a file name, the tokens are cached since the same directory and file names
+# repeat a lot across the tree
+@functools.lru_cache(maxsize=65536)
+def tokenize_file_name_for_config(filename: str) -> Tuple[ConfigToken, ...]:
+    tokens: List[ConfigToken] = []
+    # split on @ and ignore first string
+    for config_string in filename.split("@")[1:]:
+        match: re.Match | None = config_token_pattern.match(config_string.lower())
+        if not match:
+            continue
+        keyword, value_string = match.groups()
+        try:
+            tokens.append(ConfigToken(keyword, _convert_config_value(keyword, value_string)))
+        except ValueError as error:
+            tokens.append(ConfigToken(keyword, None, str(error)))
+    return tuple(tokens)
+
+
 def parse_file_name_for_config(filename: str, file_date: datetime.datetime) -> ShowConfig:
-    # split on @
-    config_strings: List[str] = filename.split("@")
     show_config: ShowConfig = ShowConfig()
-
-    # ignore first string
-    for config_string in config_strings[1:]:
-        config_string: str = config_string.lower()
-        # check for expiration date
-        if config_string[0:4] == "till":
-            show_config.expire_after_date: datetime.datetime = \
-                expire_date_from_file_date_and_string(
-                    file_date, config_string[4:])
-        if config_string[0:3] == "dur":
-            show_config.duration: datetime.timedelta = datetime.timedelta(
-                seconds=int(config_string[3:]))
-        if config_string[0:8] == "maxfiles":
-            show_config.max_slides: int = int(config_string[8:])
-
-        if config_string[0:2] == "wg":
+    for token in tokenize_file_name_for_config(filename):
+        keyword: str = token.keyword
+        # the specialized config is checked before the value, as it always was
+        if keyword == "wg":
             cement_specialized_config(show_config, False)
-            # replace _ with . to get weight
-            show_config.specialized_config.weight: float = float(
-                config_string[2:].replace("_", "."))
-
-        # if configString[0:4] == "freq":
-        #  cement_specialized_config(show_config, True)
-
-        if config_string[0:3] == "all":
-            cement_specialized_config(show_config, True)
-            show_config.specialized_config.one_at_a_time: bool = False
-            freq_str: str = config_string[3:]
-            # split on "_" to get frequencies
-            freq_strs: List[str] = freq_str.split("_")
-            show_config.specialized_config.frequencies = [
-                int(freq) for freq in freq_strs]
-            # check if there is at least one frequency
-            if len(show_config.specialized_config.frequencies) == 0:
-                raise ValueError("At least one frequency must be provided")
-
-        if config_string[0:6] == "single":
-            freq_str: str = config_string[6:]
+        elif keyword == "all" or keyword == "single":
             cement_specialized_config(show_config, True)
-            show_config.specialized_config.frequencies = [int(freq_str)]
-            show_config.specialized_config.one_at_a_time: bool = True
+        if token.error:
+            raise ValueError(token.error)
+
+        if keyword == "till":
+            show_config.expire_after_date = expire_date_from_file_date_and_string(file_date, token.value)
+        elif keyword == "dur":
+            show_config.duration = token.value
+        elif keyword == "maxfiles":
+            show_config.max_slides = token.value
+        elif keyword == "wg":
+            show_config.specialized_config.weight = token.value
+        elif keyword == "all":
+            show_config.specialized_config.one_at_a_time = False
+            show_config.specialized_config.frequencies = list(token.value)
+        else: # single
+            show_config.specialized_config.frequencies = [token.value]
+            show_config.specialized_config.one_at_a_time = True
     return show_config
 
 
-@dataclass
+# slots keep the per slide records small, collections can hold a million of them
+@dataclass(slots=True)
 class NormalSlide:
     file: str
     duration: datetime.timedelta
 
 
-@dataclass
+@dataclass(slots=True)
 class OvershadowSlideCollection:
     files: List[str]
     frequency: int
@@ -244,7 +443,7 @@ class Severity(enum.Enum):
     ERROR = 2
 
 
-@dataclass
+@dataclass(slots=True)
 class SlideMessage:
     severity: Severity
     file: str
@@ -266,28 +465,72 @@ class SlidesCollection:
         dataclasses.field(default_factory=list)
     messages: List[SlideMessage] = dataclasses.field(default_factory=list)
     expired_slides: List[str] = dataclasses.field(default_factory=list)
+    # expire date of every collected slide that has one, by slide file
+    expire_dates: Dict[str, datetime.datetime] = dataclasses.field(default_factory=dict)
+
+    # The containers of slides and files, a compact collection stores them differently
+    def create_slide_list(self, slides: Iterable[NormalSlide]) -> List[NormalSlide]:
+        return list(slides)
+
+    def create_file_list(self, files: Iterable[str]) -> List[str]:
+        return list(files)
+
+    def create_expire_date_map(self, expire_dates: Iterable[Tuple[str, datetime.datetime]]) \
+            -> Dict[str, datetime.datetime]:
+        return dict(expire_dates)
+
+    # An empty collection of the same kind, for the slides of an overshadow directory
+    def create_sub_collection(self) -> 'SlidesCollection':
+        return SlidesCollection()
 
-    def add_slide(self, file: str, show_config: ShowConfig) -> None:
-        new_config: ShowConfig = copy.deepcopy(show_config)
-        fill_unspecified_show_config_with_defaults(new_config)
+    def add_slide(self, file: str, show_config: ShowConfig | LayeredShowConfig) -> None:
+        new_config: LayeredShowConfig = LayeredShowConfig.of(show_config).with_defaults()
         if isinstance(new_config.specialized_config, ChooseSlideConfig):
-            if new_config.specialized_config.weight not in self.normal_slides:
-                self.normal_slides[new_config.specialized_config.weight] = []
-            self.normal_slides[new_config.specialized_config.weight]\
-                .append(NormalSlide(remove_leading_slash(file), new_config.duration))
+            self.add_normal_slide(file, new_config.specialized_config.weight, new_config.duration)
         else:
-            overshadow_slide_collection: OvershadowSlideCollection = OvershadowSlideCollection(
-                [remove_leading_slash(file)], 0, new_config.duration)
+            self.add_overshadow_slide(file, new_config.duration)
+
+    def add_normal_slide(self, file: str, weight: float, duration: datetime.timedelta) -> None:
+        if weight not in self.normal_slides:
+            self.normal_slides[weight] = self.create_slide_list(())
+        self.normal_slides[weight].append(NormalSlide(remove_leading_slash(file), duration))
+
+    def add_overshadow_slide(self, file: str, duration: datetime.timedelta) -> None:
+        overshadow_slide_collection: OvershadowSlideCollection = OvershadowSlideCollection(
+            self.create_file_list([remove_leading_slash(file)]), 0, duration)
 #      overshadow_slide_collection.frequency = min(len(self.overshadowSlides), len(new_config.specialized_config.frequencies) - 1)
 #      overshadow_slide_collection.files.append(OvershadowSlideCollection(remove_leading_slash(file),
 #                    new_config.specialized_config.frequencies[frequency], new_config.duration))
-            self.overshadow_slide_collections.append(
-                overshadow_slide_collection)
+        self.append_overshadow_slide_collection(
+            overshadow_slide_collection)
+
+    # Every overshadow collection is added through here, also the ones merged from a sub collection
+    def append_overshadow_slide_collection(self, overshadow_slide_collection: OvershadowSlideCollection) -> None:
+        self.overshadow_slide_collections.append(overshadow_slide_collection)
+
+    # Apply the events of a streaming collection, see iter_slide_events. Returns the value
+    # returned by the stream, the number of slides collected
+    def consume(self, events: Generator['CollectEvent', None, int], scan_stats: 'ScanStats | None' = None) -> int:
+        slide_collections: List[SlidesCollection] = [self]
+        try:
+            if scan_stats is None:
+                while True:
+                    next(events).apply(slide_collections)
+            while True:
+                event: CollectEvent = next(events)
+                if isinstance(event, OvershadowDirectoryFinished):
+                    merge_start: float = time.perf_counter()
+                    event.apply(slide_collections)
+                    scan_stats.merge_seconds += time.perf_counter() - merge_start
+                else:
+                    event.apply(slide_collections)
+        except StopIteration as stop:
+            return stop.value
 
     def add_one_at_a_time_slides(self, files: List[str], frequency: int, duration: datetime.timedelta) -> None:
         overshadow_slide_collection: OvershadowSlideCollection = OvershadowSlideCollection(
-            files, frequency, duration)
-        self.overshadow_slide_collections.append(overshadow_slide_collection)
+            self.create_file_list(files), frequency, duration)
+        self.append_overshadow_slide_collection(overshadow_slide_collection)
 
     def add_error(self, file: str, error: str) -> None:
         self.messages.append(SlideMessage(
@@ -300,10 +543,49 @@ class SlidesCollection:
     def add_expired_slide(self, file: str) -> None:
         self.expired_slides.append(remove_leading_slash(file))
 
+    def set_expire_date(self, file: str, expire_after_date: datetime.datetime) -> None:
+        self.expire_dates[remove_leading_slash(file)] = expire_after_date
+
+    # Take over the expire dates of a merged sub collection
+    def update_expire_dates(self, expire_dates: Dict[str, datetime.datetime]) -> None:
+        self.expire_dates.update(expire_dates)
+
+    # Remove every slide, expired slide and message whose file matches
+    # the predicate, empty weight buckets and overshadow collections are dropped
+    def remove_files_matching(self, predicate: Callable[[str], bool]) -> None:
+        for weight in list(self.normal_slides):
+            slides: List[NormalSlide] = self.create_slide_list(
+                slide for slide in self.normal_slides[weight] if not predicate(slide.file))
+            if slides:
+                self.normal_slides[weight] = slides
+            else:
+                del self.normal_slides[weight]
+        overshadow_slide_collections: List[OvershadowSlideCollection] = []
+        for overshadow_slide_collection in self.overshadow_slide_collections:
+            overshadow_slide_collection.files = self.create_file_list(
+                file for file in overshadow_slide_collection.files if not predicate(file))
+            if overshadow_slide_collection.files:
+                overshadow_slide_collections.append(overshadow_slide_collection)
+        self.overshadow_slide_collections = overshadow_slide_collections
+        self.expired_slides = self.create_file_list(file for file in self.expired_slides if not predicate(file))
+        self.expire_dates = self.create_expire_date_map((file, expire_after_date) for file, expire_after_date
+                                                  in self.expire_dates.items() if not predicate(file))
+        self.messages = [message for message in self.messages if not predicate(message.file)]
+
+    def remove_slide(self, file: str) -> None:
+        file = remove_leading_slash(file)
+        self.remove_files_matching(lambda other: other == file)
+
+    # Remove everything collected from the directory relative_dir and its subdirectories
+    def remove_slides_under(self, relative_dir: str) -> None:
+        relative_dir = remove_leading_slash(relative_dir).rstrip('/')
+        prefix: str = relative_dir + '/'
+        self.remove_files_matching(lambda file: file == relative_dir or file.startswith(prefix))
+
 # this function is called when the overshadow slide collection is in one at a time mode
 def merge_overshadow_slide_collections(slide_collection: SlidesCollection,
                                        sub_slide_collection: SlidesCollection,
-                                       config: ShowConfig) -> None:
+                                       config: ShowConfig | LayeredShowConfig) -> None:
     overshadow_slide_collections: List[OvershadowSlideCollection] = \
         sub_slide_collection.overshadow_slide_collections
 
@@ -314,67 +596,213 @@ def merge_overshadow_slide_collections(slide_collection: SlidesCollection,
     # add all files as a single overshadow slide collection
     slide_collection.add_one_at_a_time_slides(files, config.specialized_config.frequencies[0],
                                               config.duration)
+    slide_collection.update_expire_dates(sub_slide_collection.expire_dates)
 
-def collect_slides(slide_collection: SlidesCollection, root_dir: str, relative_path: str = '',
-                   show_config: ShowConfig = ShowConfig(),
-                   fs_access: FileSystemAccess = NormalFileSystemAccess()) -> int:
+# Events of a streaming collection, produced by iter_slide_events. apply() replays an event
+# on a stack of collections, the last one being the collection of the innermost
+# overshadow directory that is still being collected
+class CollectEvent(ABC):
+    __slots__ = ()
+
+    @abstractmethod
+    def apply(self, slide_collections: List[SlidesCollection]) -> None:
+        pass
+
+
+# A slide to show, weight is None for a slide of an overshadow directory
+@dataclass(slots=True)
+class SlideFound(CollectEvent):
+    file: str
+    weight: float | None
+    duration: datetime.timedelta
+
+    def apply(self, slide_collections: List[SlidesCollection]) -> None:
+        if self.weight is None:
+            slide_collections[-1].add_overshadow_slide(self.file, self.duration)
+        else:
+            slide_collections[-1].add_normal_slide(self.file, self.weight, self.duration)
+
+
+@dataclass(slots=True)
+class SlideExpired(CollectEvent):
+    file: str
+
+    def apply(self, slide_collections: List[SlidesCollection]) -> None:
+        slide_collections[-1].add_expired_slide(self.file)
+
+
+# Follows the SlideFound of a slide that has an expire date
+@dataclass(slots=True)
+class ExpireDateFound(CollectEvent):
+    file: str
+    expire_after_date: datetime.datetime
+
+    def apply(self, slide_collections: List[SlidesCollection]) -> None:
+        slide_collections[-1].set_expire_date(self.file, self.expire_after_date)
+
+
+@dataclass(slots=True)
+class MessageFound(CollectEvent):
+    severity: Severity
+    file: str
+    text: str
+
+    def apply(self, slide_collections: List[SlidesCollection]) -> None:
+        if self.severity == Severity.WARNING:
+            slide_collections[-1].add_warning(self.file, self.text)
+        else:
+            slide_collections[-1].add_error(self.file, self.text)
+
+
+# The events up to the matching OvershadowDirectoryFinished belong to an overshadow directory
+@dataclass(slots=True)
+class OvershadowDirectoryStarted(CollectEvent):
+    relative_path: str
+
+    def apply(self, slide_collections: List[SlidesCollection]) -> None:
+        slide_collections.append(slide_collections[-1].create_sub_collection())
+
+
+# Correction at the end of an overshadow directory: its overshadow slides get the frequency,
+# which for @all depends on the slide count, and are merged into one group for
+# one_at_a_time. Only the overshadow slides and expire dates of the directory are kept
+@dataclass(slots=True)
+class OvershadowDirectoryFinished(CollectEvent):
+    relative_path: str
+    config: LayeredShowConfig
+    slide_count: int
+
+    @property
+    def one_at_a_time(self) -> bool:
+        return self.config.specialized_config.one_at_a_time
+
+    @property
+    def frequency(self) -> int:
+        frequencies: List[int] = self.config.specialized_config.frequencies
+        if self.one_at_a_time:
+            return frequencies[0]
+        return frequencies[min(self.slide_count, len(frequencies)) - 1]
+
+    def apply(self, slide_collections: List[SlidesCollection]) -> None:
+        sub_slide_collection: SlidesCollection = slide_collections.pop()
+        slide_collection: SlidesCollection = slide_collections[-1]
+        if self.one_at_a_time:
+            merge_overshadow_slide_collections(slide_collection, sub_slide_collection, self.config)
+        else:
+            frequency: int = self.frequency
+            # put in all slides in sub_slide_collection
+            for overshadow_slide_collection in sub_slide_collection.overshadow_slide_collections:
+                overshadow_slide_collection.frequency = frequency
+                slide_collection.append_overshadow_slide_collection(overshadow_slide_collection)
+            slide_collection.update_expire_dates(sub_slide_collection.expire_dates)
+
+
+# The events of a single directory entry found in relative_path, recursing into directories.
+# Returns the number of slides found
+def iter_dir_entry_events(root_dir: str, relative_path: str, entry: DirEntryInfo,
+                          show_config: ShowConfig | LayeredShowConfig, fs_access: FileSystemAccess,
+                          current_date: datetime.date | None = None,
+                          scan_stats: 'ScanStats | None' = None) -> Generator[CollectEvent, None, int]:
     slide_count = 0
-    dir_path: str = fs_access.join(root_dir, relative_path)
-    for name in fs_access.list_dir(dir_path):
-        full_file_name: str = fs_access.join(dir_path, name)
-        relative_file_name: str = fs_access.join(relative_path, name)
-
-        new_config: ShowConfig = copy.deepcopy(show_config)
-        new_config.override(parse_file_name_for_config(fs_access.get_file_main_name(name),
-                                    fs_access.get_file_modification_time(full_file_name)))
-        if fs_access.is_dir(full_file_name):
-            # If file is a directory, recurse into it, but if in all overshadow mode, put it in a
-            # new slide collection
-            if new_config.specialized_config and isinstance(
-                    new_config.specialized_config, OvershadowConfig):
-                if new_config.specialized_config.one_at_a_time:
-                    sub_slide_collection: SlidesCollection = SlidesCollection()
-                    slide_count += collect_slides(sub_slide_collection,
-                                              root_dir, relative_file_name, new_config, fs_access)
-                    merge_overshadow_slide_collections(
-                        slide_collection, sub_slide_collection, new_config)
-                else: #all
-                    # calculate frequency based on sub_slide_count
-                    sub_slide_collection: SlidesCollection = SlidesCollection()
-                    sub_slide_count: int = collect_slides(sub_slide_collection,
-                                                root_dir, relative_file_name, new_config, fs_access)
-                    frequency_idx: int = min(sub_slide_count, len(
-                        new_config.specialized_config.frequencies)) - 1
-                    frequency = new_config.specialized_config.frequencies[frequency_idx]
-                    # put in all slides in sub_slide_collection
-                    for overshadow_slide_collection in sub_slide_collection.overshadow_slide_collections:
-                        overshadow_slide_collection.frequency = frequency
-                        slide_collection.overshadow_slide_collections.append(
-                            overshadow_slide_collection)
-            else:
-                slide_count += collect_slides(slide_collection,
-                                              root_dir, relative_file_name, new_config, fs_access)
+    if current_date is None:
+        current_date = fs_access.get_current_date()
+    name: str = entry.name
+    relative_file_name: str = fs_access.join(relative_path, name)
+
+    show_config = LayeredShowConfig.of(show_config)
+    if entry.show_config is None:
+        if scan_stats is None:
+            entry.show_config = parse_file_name_for_config(fs_access.get_file_main_name(name),
+                                                           entry.modification_time)
         else:
-            try:
-                # extract file suffix
-                suffix: str = fs_access.get_file_suffix(relative_file_name)
-                if suffix not in image_suffixes:
-                    slide_collection.add_warning(
-                        relative_file_name, "File suffix " + suffix + " is not an image suffix")
-                # Check if the expire_after_date of the show_config
-                # is greater than or equal to the current date
-                if new_config.expire_after_date and new_config.expire_after_date.date() < \
-                        fs_access.get_current_date():
-                    slide_collection.add_expired_slide(relative_file_name)
-                else:
-                    slide_collection.add_slide(relative_file_name, show_config)
-                    slide_count += 1
-            except ValueError as error:
-                slide_collection.add_error(relative_file_name, str(error))
+            entry.show_config = scan_stats.timed_parse(fs_access.get_file_main_name(name),
+                                                       entry.modification_time)
+    new_config: LayeredShowConfig = show_config.override(entry.show_config)
+    if entry.is_dir:
+        # If file is a directory, recurse into it, but if in overshadow mode, its slides are
+        # collected separately and corrected when the directory is done
+        if new_config.specialized_config and isinstance(
+                new_config.specialized_config, OvershadowConfig):
+            yield OvershadowDirectoryStarted(relative_file_name)
+            sub_slide_count: int = yield from iter_slide_events(root_dir, relative_file_name, new_config,
+                                                                fs_access, current_date, scan_stats)
+            slide_count += sub_slide_count
+            yield OvershadowDirectoryFinished(relative_file_name, new_config, sub_slide_count)
+        else:
+            slide_count += yield from iter_slide_events(root_dir, relative_file_name, new_config,
+                                                        fs_access, current_date, scan_stats)
+    else:
+        try:
+            # extract file suffix
+            suffix: str = fs_access.get_file_suffix(relative_file_name)
+            if suffix not in image_suffixes:
+                yield MessageFound(Severity.WARNING, relative_file_name,
+                                   "File suffix " + suffix + " is not an image suffix")
+            # Check if the expire_after_date of the show_config
+            # is greater than or equal to the current date
+            if new_config.expire_after_date and new_config.expire_after_date.date() < current_date:
+                yield SlideExpired(relative_file_name)
+            else:
+                slide_config: LayeredShowConfig = show_config.with_defaults()
+                weight: float | None = slide_config.specialized_config.weight \
+                    if isinstance(slide_config.specialized_config, ChooseSlideConfig) else None
+                yield SlideFound(relative_file_name, weight, slide_config.duration)
+                if new_config.expire_after_date:
+                    yield ExpireDateFound(relative_file_name, new_config.expire_after_date)
+                slide_count += 1
+        except ValueError as error:
+            yield MessageFound(Severity.ERROR, relative_file_name, str(error))
+            if scan_stats is not None:
+                scan_stats.entry_errors += 1
+    return slide_count
+
+
+# The events of the slides under relative_path, as the directories are listed, so that a
+# player can show the first slides before the scan is done. Returns the number of slides
+def iter_slide_events(root_dir: str, relative_path: str = '',
+                      show_config: ShowConfig | LayeredShowConfig = ShowConfig(),
+                      fs_access: FileSystemAccess = ScandirFileSystemAccess(),
+                      current_date: datetime.date | None = None,
+                      scan_stats: 'ScanStats | None' = None) -> Generator[CollectEvent, None, int]:
+    start: float = time.perf_counter() if scan_stats is not None else 0.0
+    slide_count = 0
+    show_config = LayeredShowConfig.of(show_config)
+    # the current date is fetched once per scan
+    if current_date is None:
+        current_date = fs_access.get_current_date()
+    dir_path: str = fs_access.join(root_dir, relative_path)
+    entries: List[DirEntryInfo] = fs_access.list_dir_entries(dir_path)
+    for entry in entries:
+        slide_count += yield from iter_dir_entry_events(root_dir, relative_path, entry, show_config,
+                                                        fs_access, current_date, scan_stats)
 
     # check that slide count is not greater than max_slides
     if show_config.max_slides and slide_count > show_config.max_slides:
-        slide_collection.add_error(relative_path,
-                                   f"Slide count {slide_count} is greater than the maximum set")
-
+        yield MessageFound(Severity.ERROR, relative_path,
+                           f"Slide count {slide_count} is greater than the maximum set")
+        if scan_stats is not None:
+            scan_stats.max_slides_errors += 1
+
+    if scan_stats is not None:
+        scan_stats.directory_scanned(remove_leading_slash(relative_path), time.perf_counter() - start,
+                                     len(entries), slide_count)
     return slide_count
+
+
+# Collect a single directory entry found in relative_path, recursing into directories.
+# Returns the number of slides added
+def collect_dir_entry(slide_collection: SlidesCollection, root_dir: str, relative_path: str,
+                      entry: DirEntryInfo, show_config: ShowConfig | LayeredShowConfig,
+                      fs_access: FileSystemAccess, current_date: datetime.date | None = None,
+                      scan_stats: 'ScanStats | None' = None) -> int:
+    return slide_collection.consume(iter_dir_entry_events(root_dir, relative_path, entry, show_config,
+                                                          fs_access, current_date, scan_stats), scan_stats)
+
+
+def collect_slides(slide_collection: SlidesCollection, root_dir: str, relative_path: str = '',
+                   show_config: ShowConfig | LayeredShowConfig = ShowConfig(),
+                   fs_access: FileSystemAccess = ScandirFileSystemAccess(),
+                   current_date: datetime.date | None = None,
+                   scan_stats: 'ScanStats | None' = None) -> int:
+    return slide_collection.consume(iter_slide_events(root_dir, relative_path, show_config, fs_access,
+                                                      current_date, scan_stats), scan_stats)
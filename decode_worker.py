@@ -0,0 +1,215 @@
+# Decoding in a separate process, so that big images do not hold the GIL of the display.
+# The worker decodes into the slots of a shared memory ring and only sends the slot and the
+# size of a frame over a pipe; the display reads the pixels straight from shared memory,
+# no pixels are pickled or copied on its side. A slot belongs to the worker until a frame
+# is written into it, then to the display until it is released, so a worker that is ahead
+# of the display waits for a free slot. Frames that were prefetched but are no longer
+# wanted are discarded, or evicted oldest first when the display waits and the ring is full.
+#   with DecoderClient(slot_count=4, slot_size=3840 * 2160 * 4) as decoder:
+#       decoder.prefetch(slide.file for slide in upcoming)
+#       frame = decoder.get(slide.file)
+#       texture = texture_from_decoded(frame)
+#       decoder.release(frame)
+#       decoder.discard(file)  # of a slide dropped from the upcoming slides
+import os
+import collections
+import multiprocessing
+from multiprocessing.connection import Connection
+from multiprocessing.shared_memory import SharedMemory
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, List, Set, Tuple
+from prefetch import DecodedImage, decode_with_pillow
+
+# messages from the display: (DECODE, file), (CANCEL, file), (RELEASE, slot), (STOP,)
+# messages from the worker: (FRAME, slot, file, width, height, colorfmt, nbytes), (ERROR, file, text)
+DECODE: str = 'decode'
+CANCEL: str = 'cancel'
+RELEASE: str = 'release'
+STOP: str = 'stop'
+FRAME: str = 'frame'
+ERROR: str = 'error'
+# seconds get waits for a message from the worker by default
+GET_TIMEOUT: float = 10.0
+
+
+class DecodeWorkerError(Exception):
+    pass
+
+
+# A decoded frame in a slot of the ring, pixels is a view of the shared memory that is
+# valid until the frame is released. Has the fields of DecodedImage for texture_from_decoded
+@dataclass
+class SharedFrame:
+    file: str
+    width: int
+    height: int
+    colorfmt: str
+    pixels: memoryview
+    slot: int
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.pixels)
+
+
+def _worker_main(shm_name: str, slot_count: int, slot_size: int, connection: Connection,
+                 decode: Callable[[str], DecodedImage], root_dir: str) -> None:
+    shm: SharedMemory = SharedMemory(name=shm_name)
+    free_slots: Deque[int] = collections.deque(range(slot_count))
+    pending: Deque[str] = collections.deque()
+    try:
+        while True:
+            # wait for a message when there is nothing to decode or nowhere to put it
+            while not pending or not free_slots or connection.poll():
+                try:
+                    message: Tuple = connection.recv()
+                except EOFError:
+                    # the display is gone
+                    return
+                if message[0] == DECODE:
+                    pending.append(message[1])
+                elif message[0] == CANCEL:
+                    if message[1] in pending:
+                        pending.remove(message[1])
+                elif message[0] == RELEASE:
+                    free_slots.append(message[1])
+                else:
+                    return
+            file: str = pending.popleft()
+            try:
+                decoded: DecodedImage = decode(os.path.join(root_dir, file))
+            except Exception as error:
+                connection.send((ERROR, file, f'{type(error).__name__}: {error}'))
+                continue
+            if decoded.nbytes > slot_size:
+                connection.send((ERROR, file, f'{decoded.nbytes} bytes do not fit in a slot of {slot_size}'))
+                continue
+            slot: int = free_slots.popleft()
+            start: int = slot * slot_size
+            shm.buf[start:start + decoded.nbytes] = decoded.pixels
+            connection.send((FRAME, slot, file, decoded.width, decoded.height, decoded.colorfmt, decoded.nbytes))
+    finally:
+        shm.close()
+
+
+# The display side: starts the worker, requests decodes and hands out the frames. Not
+# thread safe, meant to be used from the display thread only. Files are relative to
+# root_dir and frames are requested and handed out by their relative path
+class DecoderClient:
+    slot_count: int
+    slot_size: int
+    root_dir: str
+    _ready: Dict[str, Tuple]
+    _requested: Set[str]
+    _frames: Dict[int, SharedFrame]
+
+    def __init__(self, slot_count: int = 4, slot_size: int = 3840 * 2160 * 4,
+                 decode: Callable[[str], DecodedImage] = decode_with_pillow, root_dir: str = ''):
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.root_dir = root_dir
+        self._shm: SharedMemory = SharedMemory(create=True, size=slot_count * slot_size)
+        self._ready = {}
+        self._requested = set()
+        self._frames = {}
+        # spawn instead of fork, the worker must not inherit the state of the display
+        context = multiprocessing.get_context('spawn')
+        self._connection, worker_connection = context.Pipe()
+        self._process = context.Process(target=_worker_main, name='decode_worker', daemon=True,
+                                        args=(self._shm.name, slot_count, slot_size, worker_connection, decode,
+                                              root_dir))
+        self._process.start()
+        worker_connection.close()
+
+    def __enter__(self) -> 'DecoderClient':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    # Request the decoding of files that are neither requested nor ready
+    def prefetch(self, files: Iterable[str]) -> None:
+        for file in files:
+            if file not in self._requested:
+                self._requested.add(file)
+                self._connection.send((DECODE, file))
+
+    # Drop a file that is no longer wanted: the slot of its ready frame goes back to the
+    # worker and a decode that has not started yet is cancelled. A frame taken by get stays
+    # valid until it is released
+    def discard(self, file: str) -> None:
+        if file not in self._requested:
+            return
+        self._requested.discard(file)
+        message: Tuple | None = self._ready.pop(file, None)
+        if message is None:
+            self._connection.send((CANCEL, file))
+        elif message[0] == FRAME:
+            self._connection.send((RELEASE, message[1]))
+
+    # Discard every requested file, such as when the upcoming slides change altogether
+    def cancel(self) -> None:
+        for file in list(self._requested):
+            self.discard(file)
+
+    def _receive(self, timeout: float | None) -> None:
+        if not self._connection.poll(timeout):
+            raise TimeoutError('no frame from the decode worker')
+        message: Tuple = self._connection.recv()
+        file: str = message[2] if message[0] == FRAME else message[1]
+        if file not in self._requested or file in self._ready:
+            # discarded while it was being decoded, or decoded twice after being requested again
+            if message[0] == FRAME:
+                self._connection.send((RELEASE, message[1]))
+            return
+        self._ready[file] = message
+
+    # Discard the oldest ready frames other than file while they hold every slot the
+    # display does not, so that the worker can go on
+    def _evict_unclaimed(self, file: str) -> None:
+        ready_frames: List[str] = [ready_file for ready_file, message in self._ready.items()
+                              if message[0] == FRAME and ready_file != file]
+        while ready_frames and len(ready_frames) + len(self._frames) >= self.slot_count:
+            self.discard(ready_frames.pop(0))
+
+    # The frame of file, decoding it if it was not requested yet. Waits for the worker,
+    # up to timeout seconds for every message. The frame must be released when done with
+    def get(self, file: str, timeout: float | None = GET_TIMEOUT) -> SharedFrame:
+        self.prefetch([file])
+        while file not in self._ready:
+            self._evict_unclaimed(file)
+            self._receive(timeout)
+        message: Tuple = self._ready.pop(file)
+        self._requested.discard(file)
+        if message[0] == ERROR:
+            raise DecodeWorkerError(f'{file}: {message[2]}')
+        _, slot, _, width, height, colorfmt, nbytes = message
+        start: int = slot * self.slot_size
+        frame: SharedFrame = SharedFrame(file, width, height, colorfmt, self._shm.buf[start:start + nbytes], slot)
+        self._frames[slot] = frame
+        return frame
+
+    # Give the slot of frame back to the worker, the pixels must not be used any more
+    def release(self, frame: SharedFrame) -> None:
+        if self._frames.pop(frame.slot, None) is not None:
+            frame.pixels.release()
+            self._connection.send((RELEASE, frame.slot))
+
+    def close(self) -> None:
+        if self._shm is None:
+            return
+        for frame in list(self._frames.values()):
+            frame.pixels.release()
+        self._frames.clear()
+        try:
+            self._connection.send((STOP,))
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+            self._process.join()
+        self._connection.close()
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
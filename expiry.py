@@ -0,0 +1,147 @@
+# Expiry index kept next to a SlidesCollection: a min-heap of the upcoming @till dates,
+# so that slides can be moved to expired_slides when their date passes, without a rescan.
+# The other slides keep their order, the collection keeps the order of a fresh scan. The
+# index only knows the expire dates the collection had when it was built and those given
+# to add: after slides were added some other way, such as by the watcher, build it again
+import heapq
+import datetime
+import itertools
+from typing import Dict, List, Set, Tuple
+from config import SlidesCollection, NormalSlide, OvershadowSlideCollection, remove_leading_slash
+
+
+class ExpiryIndex:
+    slide_collection: SlidesCollection
+    _heap: List[Tuple[datetime.date, int, str]]
+    _normal_positions: Dict[str, Tuple[float, int]]
+    _overshadow_positions: Dict[str, int]
+    _collection_positions: Dict[int, int]
+
+    def __init__(self, slide_collection: SlidesCollection):
+        self.slide_collection = slide_collection
+        self._sequence = itertools.count()
+        self._heap = [(expire_after_date.date(), next(self._sequence), file)
+                      for file, expire_after_date in slide_collection.expire_dates.items()]
+        heapq.heapify(self._heap)
+        self._index_positions()
+
+    # Positions of all slides, so that a slide is removed without searching for it
+    def _index_positions(self) -> None:
+        self._normal_positions = {}
+        for weight, slides in self.slide_collection.normal_slides.items():
+            for position, slide in enumerate(slides):
+                self._normal_positions[slide.file] = (weight, position)
+        self._overshadow_positions = {}
+        self._collection_positions = {}
+        for position, collection in enumerate(self.slide_collection.overshadow_slide_collections):
+            self._collection_positions[id(collection)] = position
+            for file in collection.files:
+                self._overshadow_positions[file] = position
+
+    # Register the expire date of a slide just added to the collection, after the index was built
+    def add(self, file: str, expire_after_date: datetime.datetime) -> None:
+        file = remove_leading_slash(file)
+        self.slide_collection.set_expire_date(file, expire_after_date)
+        heapq.heappush(self._heap, (expire_after_date.date(), next(self._sequence), file))
+        # a new slide is the last one of its bucket or the last overshadow collection
+        for weight, slides in self.slide_collection.normal_slides.items():
+            if slides and slides[-1].file == file:
+                self._normal_positions[file] = (weight, len(slides) - 1)
+                return
+        collections: List[OvershadowSlideCollection] = self.slide_collection.overshadow_slide_collections
+        if collections and file in collections[-1].files:
+            self._collection_positions[id(collections[-1])] = len(collections) - 1
+            self._overshadow_positions[file] = len(collections) - 1
+            return
+        self._index_positions()
+
+    # The first date on which a slide will be expired, or None when no slide expires
+    def next_boundary(self) -> datetime.date | None:
+        while self._heap:
+            expire_date, _, file = self._heap[0]
+            current_expire_date: datetime.datetime | None = self.slide_collection.expire_dates.get(file)
+            if current_expire_date is not None and current_expire_date.date() == expire_date:
+                return expire_date + datetime.timedelta(days=1)
+            heapq.heappop(self._heap)
+        return None
+
+    # Move every slide whose expire date is before current_date to expired_slides,
+    # returns the expired files. Entries whose slide was removed or got another expire
+    # date in the meantime are skipped. The slides expiring together are removed with a
+    # single pass over each bucket and overshadow collection they are in
+    def expire(self, current_date: datetime.date) -> List[str]:
+        expiring: List[str] = []
+        while self._heap and self._heap[0][0] < current_date:
+            expire_date, _, file = heapq.heappop(self._heap)
+            current_expire_date: datetime.datetime | None = self.slide_collection.expire_dates.get(file)
+            if current_expire_date is None or current_expire_date.date() != expire_date:
+                continue
+            del self.slide_collection.expire_dates[file]
+            expiring.append(file)
+        removed: Set[str] = self._remove_slides(expiring)
+        missing: List[str] = [file for file in expiring if file not in removed]
+        if missing:
+            # the collection was changed without the index, find the slides again
+            self._index_positions()
+            removed |= self._remove_slides(missing)
+        expired_files: List[str] = [file for file in expiring if file in removed]
+        for file in expired_files:
+            self.slide_collection.add_expired_slide(file)
+        return expired_files
+
+    def _remove_slides(self, files: List[str]) -> Set[str]:
+        return self._remove_normal_slides(files) | self._remove_overshadow_slides(files)
+
+    def _remove_normal_slides(self, files: List[str]) -> Set[str]:
+        files_by_weight: Dict[float, Set[str]] = {}
+        for file in files:
+            if file in self._normal_positions:
+                files_by_weight.setdefault(self._normal_positions.pop(file)[0], set()).add(file)
+        removed: Set[str] = set()
+        for weight, weight_files in files_by_weight.items():
+            slides: List[NormalSlide] | None = self.slide_collection.normal_slides.get(weight)
+            if not slides:
+                continue
+            kept: List[NormalSlide] = []
+            for slide in slides:
+                if slide.file in weight_files:
+                    removed.add(slide.file)
+                else:
+                    kept.append(slide)
+            if kept:
+                self.slide_collection.normal_slides[weight] = self.slide_collection.create_slide_list(kept)
+                for position, slide in enumerate(kept):
+                    self._normal_positions[slide.file] = (weight, position)
+            else:
+                del self.slide_collection.normal_slides[weight]
+        return removed
+
+    def _remove_overshadow_slides(self, files: List[str]) -> Set[str]:
+        collections: List[OvershadowSlideCollection] = self.slide_collection.overshadow_slide_collections
+        files_by_position: Dict[int, Set[str]] = {}
+        for file in files:
+            if file in self._overshadow_positions:
+                files_by_position.setdefault(self._overshadow_positions.pop(file), set()).add(file)
+        removed: Set[str] = set()
+        emptied: bool = False
+        for position, collection_files in files_by_position.items():
+            if position >= len(collections):
+                continue
+            collection: OvershadowSlideCollection = collections[position]
+            kept_files: List[str] = []
+            for file in collection.files:
+                if file in collection_files:
+                    removed.add(file)
+                else:
+                    kept_files.append(file)
+            collection.files = self.slide_collection.create_file_list(kept_files)
+            emptied = emptied or not kept_files
+        if emptied:
+            # the collections keep their order, which is the order of the overshadow rotation
+            collections[:] = [collection for collection in collections if collection.files]
+            self._collection_positions = {}
+            for position, collection in enumerate(collections):
+                self._collection_positions[id(collection)] = position
+                for file in collection.files:
+                    self._overshadow_positions[file] = position
+        return removed
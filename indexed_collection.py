@@ -0,0 +1,361 @@
+# SlidesCollection with secondary indexes for admin queries: slides by directory, expire
+# date, weight and duration, expired slides by directory and messages by directory and
+# severity. The indexes are updated as the collection is built and as slides are removed,
+# a query only touches the index entries it returns, so it does not scan the whole collection.
+# The indexes hold the items themselves by their id, so an item is removed in constant time.
+#   slide_collection = IndexedSlidesCollection()
+#   collect_slides(slide_collection, root_dir)
+#   slide_collection.find_slides(under='venue1/lobby', min_weight=2.0)
+import bisect
+import datetime
+import posixpath
+import dataclasses
+from dataclasses import dataclass
+from typing import Callable, Dict, Generic, Hashable, Iterator, List, Tuple, TypeVar
+from config import SlidesCollection, OvershadowSlideCollection, SlideMessage, Severity, default_show_config, \
+    remove_leading_slash
+
+T = TypeVar('T')
+K = TypeVar('K', bound=Hashable)
+
+
+# A collected slide as the indexes see it, weight is None for an overshadow slide and
+# duration is the default duration for a slide that has none
+@dataclass(slots=True)
+class IndexedSlide:
+    file: str
+    weight: float | None
+    duration: datetime.timedelta
+    expire_date: datetime.datetime | None = None
+
+
+# Items by the directory they are in, with the directory tree and the number of items
+# under every directory, so that a subtree is found without looking at other directories
+class DirectoryIndex(Generic[T]):
+    _items: Dict[str, Dict[int, T]]
+    _children: Dict[str, List[str]]
+    _counts: Dict[str, int]
+
+    def __init__(self):
+        self._items = {'': {}}
+        self._children = {'': []}
+        self._counts = {'': 0}
+
+    @staticmethod
+    def _parent(directory: str) -> str:
+        return posixpath.dirname(directory)
+
+    def _add_directory(self, directory: str) -> None:
+        parent: str = self._parent(directory)
+        if parent not in self._items:
+            self._add_directory(parent)
+        self._items[directory] = {}
+        self._children[directory] = []
+        self._counts[directory] = 0
+        self._children[parent].append(directory)
+
+    def add(self, file: str, item: T) -> None:
+        directory: str = self._parent(file)
+        if directory not in self._items:
+            self._add_directory(directory)
+        self._items[directory][id(item)] = item
+        while True:
+            self._counts[directory] += 1
+            if not directory:
+                return
+            directory = self._parent(directory)
+
+    def remove(self, file: str, item: T) -> None:
+        directory: str = self._parent(file)
+        if self._items.get(directory, {}).pop(id(item), None) is None:
+            return
+        while True:
+            self._counts[directory] -= 1
+            if not directory:
+                return
+            directory = self._parent(directory)
+
+    # The items directly in directory, not in its subdirectories
+    def in_directory(self, directory: str) -> Iterator[T]:
+        yield from self._items.get(directory.strip('/'), {}).values()
+
+    def count_under(self, directory: str) -> int:
+        return self._counts.get(directory.strip('/'), 0)
+
+    def under(self, directory: str) -> Iterator[T]:
+        directory = directory.strip('/')
+        if directory not in self._items:
+            return
+        pending: List[str] = [directory]
+        while pending:
+            directory = pending.pop()
+            yield from self._items[directory].values()
+            pending.extend(self._children[directory])
+
+
+# Items by a sortable value, with the distinct values kept sorted for range queries.
+# There are few distinct weights, durations and expire dates, so a new value is cheap
+class ValueIndex(Generic[K, T]):
+    _items: Dict[K, Dict[int, T]]
+    _values: List[K]
+
+    def __init__(self):
+        self._items = {}
+        self._values = []
+
+    def add(self, value: K, item: T) -> None:
+        items: Dict[int, T] | None = self._items.get(value)
+        if items is None:
+            items = self._items[value] = {}
+            bisect.insort(self._values, value)
+        items[id(item)] = item
+
+    def remove(self, value: K, item: T) -> None:
+        items: Dict[int, T] | None = self._items.get(value)
+        if items is None or items.pop(id(item), None) is None or items:
+            return
+        del self._items[value]
+        del self._values[bisect.bisect_left(self._values, value)]
+
+    # The distinct values from low to high, both included, None is unbounded
+    def values_between(self, low: K | None = None, high: K | None = None) -> List[K]:
+        start: int = 0 if low is None else bisect.bisect_left(self._values, low)
+        end: int = len(self._values) if high is None else bisect.bisect_right(self._values, high)
+        return self._values[start:end]
+
+    def count_between(self, low: K | None = None, high: K | None = None) -> int:
+        return sum(len(self._items[value]) for value in self.values_between(low, high))
+
+    def between(self, low: K | None = None, high: K | None = None) -> Iterator[T]:
+        for value in self.values_between(low, high):
+            yield from self._items[value].values()
+
+
+@dataclass(eq=False)
+class IndexedSlidesCollection(SlidesCollection):
+    slides: Dict[str, IndexedSlide] = dataclasses.field(default_factory=dict, repr=False)
+    slides_by_directory: DirectoryIndex[IndexedSlide] = dataclasses.field(default_factory=DirectoryIndex,
+                                                                          repr=False)
+    slides_by_weight: ValueIndex[float, IndexedSlide] = dataclasses.field(default_factory=ValueIndex, repr=False)
+    slides_by_duration: ValueIndex[datetime.timedelta, IndexedSlide] = \
+        dataclasses.field(default_factory=ValueIndex, repr=False)
+    slides_by_expire_date: ValueIndex[datetime.datetime, IndexedSlide] = \
+        dataclasses.field(default_factory=ValueIndex, repr=False)
+    expired_by_directory: DirectoryIndex[str] = dataclasses.field(default_factory=DirectoryIndex, repr=False)
+    messages_by_directory: DirectoryIndex[SlideMessage] = dataclasses.field(default_factory=DirectoryIndex,
+                                                                            repr=False)
+    messages_by_severity: Dict[Severity, Dict[int, SlideMessage]] = dataclasses.field(default_factory=dict,
+                                                                                      repr=False)
+
+    def __post_init__(self):
+        self.rebuild_indexes()
+
+    # the slides of an overshadow directory are indexed once they are merged into this collection
+    def create_sub_collection(self) -> SlidesCollection:
+        return SlidesCollection()
+
+    def _index_slide(self, file: str, weight: float | None, duration: datetime.timedelta | None) -> None:
+        duration = duration or default_show_config.duration
+        slide: IndexedSlide = IndexedSlide(file, weight, duration, self.expire_dates.get(file))
+        self.slides[file] = slide
+        self.slides_by_directory.add(file, slide)
+        if weight is not None:
+            self.slides_by_weight.add(weight, slide)
+        self.slides_by_duration.add(duration, slide)
+        if slide.expire_date is not None:
+            self.slides_by_expire_date.add(slide.expire_date, slide)
+
+    def _index_expire_date(self, file: str, expire_after_date: datetime.datetime) -> None:
+        slide: IndexedSlide | None = self.slides.get(file)
+        if slide is None or slide.expire_date == expire_after_date:
+            return
+        if slide.expire_date is not None:
+            self.slides_by_expire_date.remove(slide.expire_date, slide)
+        slide.expire_date = expire_after_date
+        self.slides_by_expire_date.add(expire_after_date, slide)
+
+    def _index_message(self, message: SlideMessage) -> None:
+        self.messages_by_directory.add(message.file, message)
+        self.messages_by_severity.setdefault(message.severity, {})[id(message)] = message
+
+    def _unindex_slide(self, slide: IndexedSlide) -> None:
+        del self.slides[slide.file]
+        self.slides_by_directory.remove(slide.file, slide)
+        if slide.weight is not None:
+            self.slides_by_weight.remove(slide.weight, slide)
+        self.slides_by_duration.remove(slide.duration, slide)
+        if slide.expire_date is not None:
+            self.slides_by_expire_date.remove(slide.expire_date, slide)
+
+    def _unindex_message(self, message: SlideMessage) -> None:
+        self.messages_by_directory.remove(message.file, message)
+        self.messages_by_severity.get(message.severity, {}).pop(id(message), None)
+
+    def add_normal_slide(self, file: str, weight: float, duration: datetime.timedelta) -> None:
+        super().add_normal_slide(file, weight, duration)
+        self._index_slide(remove_leading_slash(file), weight, duration)
+
+    def append_overshadow_slide_collection(self, overshadow_slide_collection: OvershadowSlideCollection) -> None:
+        super().append_overshadow_slide_collection(overshadow_slide_collection)
+        for file in overshadow_slide_collection.files:
+            self._index_slide(file, None, overshadow_slide_collection.duration)
+
+    def add_error(self, file: str, error: str) -> None:
+        super().add_error(file, error)
+        self._index_message(self.messages[-1])
+
+    def add_warning(self, file: str, warning: str) -> None:
+        super().add_warning(file, warning)
+        self._index_message(self.messages[-1])
+
+    # An expired file is no longer a slide. The ExpiryIndex takes expired slides out of the
+    # lists of the collection itself, they leave the indexes when they are added here
+    def add_expired_slide(self, file: str) -> None:
+        super().add_expired_slide(file)
+        slide: IndexedSlide | None = self.slides.get(self.expired_slides[-1])
+        if slide is not None:
+            self._unindex_slide(slide)
+        self.expired_by_directory.add(self.expired_slides[-1], self.expired_slides[-1])
+
+    def set_expire_date(self, file: str, expire_after_date: datetime.datetime) -> None:
+        super().set_expire_date(file, expire_after_date)
+        self._index_expire_date(remove_leading_slash(file), expire_after_date)
+
+    def update_expire_dates(self, expire_dates: Dict[str, datetime.datetime]) -> None:
+        super().update_expire_dates(expire_dates)
+        for file, expire_after_date in expire_dates.items():
+            self._index_expire_date(file, expire_after_date)
+
+    # Remove from the collection, then only the removed entries from the indexes
+    def _remove_indexed(self, predicate: Callable[[str], bool], slides: List[IndexedSlide],
+                        expired_slides: List[str], messages: List[SlideMessage]) -> None:
+        super().remove_files_matching(predicate)
+        for slide in slides:
+            self._unindex_slide(slide)
+        for file in expired_slides:
+            self.expired_by_directory.remove(file, file)
+        for message in messages:
+            self._unindex_message(message)
+
+    def remove_files_matching(self, predicate: Callable[[str], bool]) -> None:
+        self._remove_indexed(predicate, [slide for file, slide in self.slides.items() if predicate(file)],
+                             [file for file in self.expired_slides if predicate(file)],
+                             [message for message in self.messages if predicate(message.file)])
+
+    # The entries of exactly file, from the entries of its directory
+    def _entries_of(self, file: str) -> Tuple[List[IndexedSlide], List[str], List[SlideMessage]]:
+        directory: str = posixpath.dirname(file)
+        slide: IndexedSlide | None = self.slides.get(file)
+        return ([slide] if slide is not None else [],
+                [expired for expired in self.expired_by_directory.in_directory(directory) if expired == file],
+                [message for message in self.messages_by_directory.in_directory(directory) if message.file == file])
+
+    # The indexes find what a single file or a directory holds, without looking at other entries
+    def remove_slide(self, file: str) -> None:
+        file = remove_leading_slash(file)
+        self._remove_indexed(lambda other: other == file, *self._entries_of(file))
+
+    def remove_slides_under(self, relative_dir: str) -> None:
+        relative_dir = remove_leading_slash(relative_dir).rstrip('/')
+        prefix: str = relative_dir + '/'
+        slides, expired_slides, messages = self._entries_of(relative_dir)
+        if relative_dir:
+            slides.extend(self.slides_by_directory.under(relative_dir))
+            expired_slides.extend(self.expired_by_directory.under(relative_dir))
+            messages.extend(self.messages_by_directory.under(relative_dir))
+        self._remove_indexed(lambda file: file == relative_dir or file.startswith(prefix),
+                             slides, expired_slides, messages)
+
+    def rebuild_indexes(self) -> None:
+        self.slides = {}
+        self.slides_by_directory = DirectoryIndex()
+        self.slides_by_weight = ValueIndex()
+        self.slides_by_duration = ValueIndex()
+        self.slides_by_expire_date = ValueIndex()
+        self.expired_by_directory = DirectoryIndex()
+        self.messages_by_directory = DirectoryIndex()
+        self.messages_by_severity = {}
+        for weight, normal_slides in self.normal_slides.items():
+            for normal_slide in normal_slides:
+                self._index_slide(normal_slide.file, weight, normal_slide.duration)
+        for overshadow_slide_collection in self.overshadow_slide_collections:
+            for file in overshadow_slide_collection.files:
+                self._index_slide(file, None, overshadow_slide_collection.duration)
+        for file in self.expired_slides:
+            self.expired_by_directory.add(file, file)
+        for message in self.messages:
+            self._index_message(message)
+
+    # Slides matching all the given conditions, ranges include both ends. The candidates
+    # come from the index with the fewest matches, the other conditions are checked on them
+    def find_slides(self, under: str | None = None,
+                    min_weight: float | None = None, max_weight: float | None = None,
+                    min_duration: datetime.timedelta | None = None, max_duration: datetime.timedelta | None = None,
+                    expire_from: datetime.datetime | None = None,
+                    expire_until: datetime.datetime | None = None) -> List[IndexedSlide]:
+        under_prefix: str = '' if under is None or not under.strip('/') else under.strip('/') + '/'
+        # (number of candidates, candidates, check of the condition on a slide)
+        conditions: List[Tuple[int, Callable[[], Iterator[IndexedSlide]], Callable[[IndexedSlide], bool]]] = []
+        if under is not None:
+            conditions.append((self.slides_by_directory.count_under(under),
+                               lambda: self.slides_by_directory.under(under),
+                               lambda slide: slide.file.startswith(under_prefix)))
+        if min_weight is not None or max_weight is not None:
+            conditions.append((self.slides_by_weight.count_between(min_weight, max_weight),
+                               lambda: self.slides_by_weight.between(min_weight, max_weight),
+                               lambda slide: slide.weight is not None and
+                               _in_range(slide.weight, min_weight, max_weight)))
+        if min_duration is not None or max_duration is not None:
+            conditions.append((self.slides_by_duration.count_between(min_duration, max_duration),
+                               lambda: self.slides_by_duration.between(min_duration, max_duration),
+                               lambda slide: _in_range(slide.duration, min_duration, max_duration)))
+        if expire_from is not None or expire_until is not None:
+            conditions.append((self.slides_by_expire_date.count_between(expire_from, expire_until),
+                               lambda: self.slides_by_expire_date.between(expire_from, expire_until),
+                               lambda slide: slide.expire_date is not None and
+                               _in_range(slide.expire_date, expire_from, expire_until)))
+        if not conditions:
+            return list(self.slides.values())
+
+        conditions.sort(key=lambda condition: condition[0])
+        candidates: Iterator[IndexedSlide] = conditions[0][1]()
+        checks: List[Callable[[IndexedSlide], bool]] = [condition[2] for condition in conditions[1:]]
+        if not checks:
+            return list(candidates)
+        return [slide for slide in candidates if all(check(slide) for check in checks)]
+
+    def slides_under(self, directory: str) -> List[IndexedSlide]:
+        return list(self.slides_by_directory.under(directory))
+
+    # Slides whose expire date falls in the given range, such as the coming week
+    def slides_expiring(self, expire_from: datetime.datetime | None,
+                        expire_until: datetime.datetime | None) -> List[IndexedSlide]:
+        return self.find_slides(expire_from=expire_from, expire_until=expire_until)
+
+    def expired_slides_under(self, directory: str) -> List[str]:
+        return list(self.expired_by_directory.under(directory))
+
+    def messages_under(self, directory: str, severity: Severity | None = None) -> List[SlideMessage]:
+        if severity is None:
+            return list(self.messages_by_directory.under(directory))
+        if self.messages_by_directory.count_under(directory) <= len(self.messages_by_severity.get(severity, {})):
+            return [message for message in self.messages_by_directory.under(directory)
+                    if message.severity == severity]
+        prefix: str = directory.strip('/') + '/' if directory.strip('/') else ''
+        return [message for message in self.messages_by_severity.get(severity, {}).values()
+                if message.file.startswith(prefix)]
+
+    def messages_with_severity(self, severity: Severity) -> List[SlideMessage]:
+        return list(self.messages_by_severity.get(severity, {}).values())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, SlidesCollection):
+            return NotImplemented
+        return self.normal_slides == other.normal_slides and \
+            self.overshadow_slide_collections == other.overshadow_slide_collections and \
+            self.messages == other.messages and self.expired_slides == other.expired_slides and \
+            dict(self.expire_dates) == dict(other.expire_dates)
+
+
+def _in_range(value, low, high) -> bool:
+    return (low is None or value >= low) and (high is None or value <= high)
@@ -0,0 +1,57 @@
+# Parallel traversal for high-latency slide shares (SMB/NFS): directory listings are
+# fetched ahead of time by a bounded thread pool, while the slides are still assembled
+# by the sequential collect_slides, so the result is identical to a sequential scan
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+from config import FileSystemAccess, DelegatingFileSystemAccess, ScandirFileSystemAccess, DirEntryInfo, \
+    SlidesCollection, collect_slides
+
+
+# File system access that lists directories on an executor: once a directory is listed,
+# listing all of its subdirectories is started, so sibling subdirectories are listed
+# concurrently and usually before collect_slides reaches them
+class PrefetchingFileSystemAccess(DelegatingFileSystemAccess):
+    executor: ThreadPoolExecutor
+    _listings: Dict[str, Future]
+    _lock: threading.Lock
+
+    def __init__(self, fs_access: FileSystemAccess, executor: ThreadPoolExecutor):
+        super().__init__(fs_access)
+        self.executor = executor
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def _prefetch(self, path: str) -> None:
+        with self._lock:
+            if path not in self._listings:
+                self._listings[path] = self.executor.submit(self._list_and_prefetch, path)
+
+    def _list_and_prefetch(self, path: str) -> List[DirEntryInfo]:
+        entries: List[DirEntryInfo] = self.fs_access.list_dir_entries(path)
+        for entry in entries:
+            if entry.is_dir:
+                self._prefetch(self.fs_access.join(path, entry.name))
+        return entries
+
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        with self._lock:
+            listing: Future | None = self._listings.pop(path, None)
+        if listing is None:
+            return self._list_and_prefetch(path)
+        return listing.result()
+
+    def list_dir(self, path: str) -> List[str]:
+        return [entry.name for entry in self.list_dir_entries(path)]
+
+
+# Same as collect_slides, with directory listings fetched by up to max_workers threads
+def collect_slides_parallel(slide_collection: SlidesCollection, root_dir: str,
+                            fs_access: FileSystemAccess = ScandirFileSystemAccess(),
+                            max_workers: int = 8) -> int:
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='collect_slides') as executor:
+        try:
+            return collect_slides(slide_collection, root_dir,
+                                  fs_access=PrefetchingFileSystemAccess(fs_access, executor))
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,359 @@
+# Compiled playlist: a SlidesCollection serialized into a versioned binary file, which the
+# player memory-maps at startup instead of walking and parsing the whole tree. The file
+# records the modification time of every collected directory, so checking that it is
+# still current costs one modification time lookup per directory. Entry names are the
+# configuration and adding, removing or renaming an entry changes its directory
+#
+# Layout, little endian: header, section table of (offset, count) pairs, then the sections
+#   strings           offsets 'I' * (count + 1), then the UTF-8 bytes
+#   directories       (path string, modification time us 'q')
+#   weights           (weight 'd', first slide, slide count)
+#   normal slides     (file string, duration us 'q')
+#   overshadow        (frequency, duration us 'q', first file, file count)
+#   overshadow files  (file string)
+#   expire dates      (file string, expire date us 'q')
+#   expired slides    (file string)
+#   messages          (severity, file string, text string)
+# Durations are in microseconds, -1 for an unset duration
+import os
+import mmap
+import struct
+import datetime
+from collections import OrderedDict
+from collections.abc import Sequence
+from typing import Dict, Iterator, List, Tuple
+from config import FileSystemAccess, DelegatingFileSystemAccess, ScandirFileSystemAccess, DirEntryInfo, \
+    SlidesCollection, NormalSlide, SlideMessage, Severity, ShowConfig, collect_slides
+
+PLAYLIST_MAGIC: bytes = b'SLDPLST\0'
+PLAYLIST_VERSION: int = 2
+
+# magic, version, scan date ordinal, first date on which a slide expires (0 for none),
+# size of the whole file
+PLAYLIST_HEADER = struct.Struct('<8sIqqQ')
+SECTION_ENTRY = struct.Struct('<QI')
+STRING_OFFSET = struct.Struct('<I')
+DIRECTORY_RECORD = struct.Struct('<Iq')
+WEIGHT_RECORD = struct.Struct('<dII')
+SLIDE_RECORD = struct.Struct('<Iq')
+OVERSHADOW_RECORD = struct.Struct('<IqII')
+FILE_RECORD = struct.Struct('<I')
+EXPIRE_DATE_RECORD = struct.Struct('<Iq')
+MESSAGE_RECORD = struct.Struct('<III')
+
+(STRINGS, DIRECTORIES, WEIGHTS, NORMAL_SLIDES, OVERSHADOW, OVERSHADOW_FILES, EXPIRE_DATES, EXPIRED_SLIDES,
+ MESSAGES) = range(9)
+SECTION_COUNT: int = 9
+# the record of each section after the strings, whose records are their offsets
+SECTION_RECORDS: Tuple[struct.Struct, ...] = (STRING_OFFSET, DIRECTORY_RECORD, WEIGHT_RECORD, SLIDE_RECORD,
+                                              OVERSHADOW_RECORD, FILE_RECORD, EXPIRE_DATE_RECORD, FILE_RECORD,
+                                              MESSAGE_RECORD)
+
+_epoch: datetime.datetime = datetime.datetime(1970, 1, 1)
+_microsecond: datetime.timedelta = datetime.timedelta(microseconds=1)
+
+
+def _to_microseconds(moment: datetime.datetime) -> int:
+    return (moment.replace(tzinfo=None) - _epoch) // _microsecond
+
+
+def _from_microseconds(microseconds: int) -> datetime.datetime:
+    return _epoch + datetime.timedelta(microseconds=microseconds)
+
+
+# the duration of a merged one at a time collection can be unset, stored as -1
+def _duration_to_microseconds(duration: datetime.timedelta | None) -> int:
+    return -1 if duration is None else duration // _microsecond
+
+
+class PlaylistError(Exception):
+    pass
+
+
+# Records the modification times of the directories listed by a scan. The time is taken
+# before the listing, so a directory that changes while it is scanned makes the playlist stale
+class DirectoryRecordingFileSystemAccess(DelegatingFileSystemAccess):
+    directory_times: Dict[str, datetime.datetime]
+
+    def __init__(self, fs_access: FileSystemAccess):
+        super().__init__(fs_access)
+        self.directory_times = {}
+
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        self.directory_times[path] = self.fs_access.get_file_modification_time(path)
+        return self.fs_access.list_dir_entries(path)
+
+
+class _StringTable:
+    def __init__(self):
+        self.strings: List[str] = []
+        self.indices: Dict[str, int] = {}
+
+    def index(self, string: str) -> int:
+        idx: int | None = self.indices.get(string)
+        if idx is None:
+            idx = len(self.strings)
+            self.strings.append(string)
+            self.indices[string] = idx
+        return idx
+
+    def pack(self) -> bytes:
+        encoded: List[bytes] = [string.encode('utf-8', 'surrogateescape') for string in self.strings]
+        offsets: List[int] = [0]
+        for data in encoded:
+            offsets.append(offsets[-1] + len(data))
+        return struct.pack(f'<{len(offsets)}I', *offsets) + b''.join(encoded)
+
+
+# Serialize slide_collection, collected on scan_date, into playlist_file.
+# directory_times are the modification times of the collected directories, by path
+def write_playlist(playlist_file: str, slide_collection: SlidesCollection, scan_date: datetime.date,
+                   directory_times: Dict[str, datetime.datetime]) -> None:
+    strings: _StringTable = _StringTable()
+    sections: List[Tuple[bytes, int]] = []
+
+    directories: bytearray = bytearray()
+    for path, modification_time in directory_times.items():
+        directories += DIRECTORY_RECORD.pack(strings.index(path), _to_microseconds(modification_time))
+
+    weights: bytearray = bytearray()
+    slides: bytearray = bytearray()
+    slide_count: int = 0
+    for weight, weight_slides in slide_collection.normal_slides.items():
+        weights += WEIGHT_RECORD.pack(weight, slide_count, len(weight_slides))
+        for slide in weight_slides:
+            slides += SLIDE_RECORD.pack(strings.index(slide.file), _duration_to_microseconds(slide.duration))
+        slide_count += len(weight_slides)
+
+    overshadow: bytearray = bytearray()
+    overshadow_files: bytearray = bytearray()
+    file_count: int = 0
+    for collection in slide_collection.overshadow_slide_collections:
+        overshadow += OVERSHADOW_RECORD.pack(collection.frequency, _duration_to_microseconds(collection.duration),
+                                             file_count, len(collection.files))
+        for file in collection.files:
+            overshadow_files += FILE_RECORD.pack(strings.index(file))
+        file_count += len(collection.files)
+
+    expire_dates: bytearray = bytearray()
+    for file, expire_after_date in slide_collection.expire_dates.items():
+        expire_dates += EXPIRE_DATE_RECORD.pack(strings.index(file), _to_microseconds(expire_after_date))
+    expired_slides: bytearray = bytearray()
+    for file in slide_collection.expired_slides:
+        expired_slides += FILE_RECORD.pack(strings.index(file))
+    messages: bytearray = bytearray()
+    for message in slide_collection.messages:
+        messages += MESSAGE_RECORD.pack(message.severity.value, strings.index(message.file),
+                                        strings.index(message.error))
+
+    sections.append((strings.pack(), len(strings.strings)))
+    sections.append((bytes(directories), len(directory_times)))
+    sections.append((bytes(weights), len(slide_collection.normal_slides)))
+    sections.append((bytes(slides), slide_count))
+    sections.append((bytes(overshadow), len(slide_collection.overshadow_slide_collections)))
+    sections.append((bytes(overshadow_files), file_count))
+    sections.append((bytes(expire_dates), len(slide_collection.expire_dates)))
+    sections.append((bytes(expired_slides), len(slide_collection.expired_slides)))
+    sections.append((bytes(messages), len(slide_collection.messages)))
+
+    # a slide with expire date d is shown up to and including d
+    first_expiry: int = min((expire_after_date.date().toordinal() + 1
+                             for expire_after_date in slide_collection.expire_dates.values()), default=0)
+    offset: int = PLAYLIST_HEADER.size + SECTION_ENTRY.size * SECTION_COUNT
+    table: bytearray = bytearray()
+    for data, count in sections:
+        # keep the sections 8 byte aligned
+        offset += -offset % 8
+        table += SECTION_ENTRY.pack(offset, count)
+        offset += len(data)
+
+    # the playlist replaces the previous one only once it is completely on disk
+    temp_file: str = playlist_file + '.tmp'
+    with open(temp_file, 'wb') as file:
+        file.write(PLAYLIST_HEADER.pack(PLAYLIST_MAGIC, PLAYLIST_VERSION, scan_date.toordinal(), first_expiry,
+                                        offset))
+        file.write(table)
+        for data, _ in sections:
+            file.write(b'\0' * (-file.tell() % 8))
+            file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, playlist_file)
+
+
+# Read-only sequence of the normal slides of one weight, decoded when read
+class MappedSlideList(Sequence):
+    def __init__(self, playlist: 'PlaylistFile', first: int, count: int):
+        self._playlist = playlist
+        self._first = first
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        return self._playlist.normal_slide(self._first + index)
+
+
+# A compiled playlist file, memory-mapped. Nothing is decoded until it is asked for
+class PlaylistFile:
+    scan_date: datetime.date
+    first_expiry: datetime.date | None
+
+    def __init__(self, playlist_file: str):
+        with open(playlist_file, 'rb') as file:
+            try:
+                self._map: mmap.mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise PlaylistError(f"Playlist {playlist_file} is empty")
+        try:
+            magic, version, scan_date, first_expiry, size = PLAYLIST_HEADER.unpack_from(self._map, 0)
+            if magic != PLAYLIST_MAGIC:
+                raise PlaylistError(f"{playlist_file} is not a playlist file")
+            if version != PLAYLIST_VERSION:
+                raise PlaylistError(f"Playlist {playlist_file} has version {version}, "
+                                    f"expected {PLAYLIST_VERSION}")
+            if size != len(self._map):
+                raise PlaylistError(f"Playlist {playlist_file} has {len(self._map)} bytes, expected {size}")
+            self._sections: List[Tuple[int, int]] = [
+                SECTION_ENTRY.unpack_from(self._map, PLAYLIST_HEADER.size + SECTION_ENTRY.size * idx)
+                for idx in range(SECTION_COUNT)]
+            self._check_sections(playlist_file)
+        except struct.error:
+            self.close()
+            raise PlaylistError(f"Playlist {playlist_file} is truncated")
+        except PlaylistError:
+            self.close()
+            raise
+        self.scan_date = datetime.date.fromordinal(scan_date)
+        self.first_expiry = datetime.date.fromordinal(first_expiry) if first_expiry else None
+
+    # Every record and string must lie within the file, so that reading one cannot fail later
+    def _check_sections(self, playlist_file: str) -> None:
+        for section, (offset, count) in enumerate(self._sections):
+            record_count: int = count + 1 if section == STRINGS else count
+            if offset + SECTION_RECORDS[section].size * record_count > len(self._map):
+                raise PlaylistError(f"Section {section} of playlist {playlist_file} runs past its end")
+        strings_offset, string_count = self._sections[STRINGS]
+        self._string_data: int = strings_offset + STRING_OFFSET.size * (string_count + 1)
+        string_end, = STRING_OFFSET.unpack_from(self._map, self._string_data - STRING_OFFSET.size)
+        if self._string_data + string_end > len(self._map):
+            raise PlaylistError(f"Strings of playlist {playlist_file} run past its end")
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> 'PlaylistFile':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def string(self, idx: int) -> str:
+        offset: int = self._sections[STRINGS][0] + STRING_OFFSET.size * idx
+        start, end = struct.unpack_from('<II', self._map, offset)
+        return self._map[self._string_data + start:self._string_data + end].decode('utf-8', 'surrogateescape')
+
+    def _records(self, section: int, record: struct.Struct) -> Iterator[tuple]:
+        offset, count = self._sections[section]
+        return record.iter_unpack(self._map[offset:offset + record.size * count])
+
+    def section_count(self, section: int) -> int:
+        return self._sections[section][1]
+
+    def normal_slide(self, idx: int) -> NormalSlide:
+        file_idx, duration = SLIDE_RECORD.unpack_from(self._map, self._sections[NORMAL_SLIDES][0] +
+                                                      SLIDE_RECORD.size * idx)
+        return NormalSlide(self.string(file_idx),
+                           datetime.timedelta(microseconds=duration) if duration >= 0 else None)
+
+    # The normal slides by weight, as sequences that decode a slide when it is read
+    def normal_slides(self) -> OrderedDict[float, MappedSlideList]:
+        return OrderedDict((weight, MappedSlideList(self, first, count))
+                           for weight, first, count in self._records(WEIGHTS, WEIGHT_RECORD))
+
+    def directory_times(self) -> Dict[str, datetime.datetime]:
+        return {self.string(path_idx): _from_microseconds(modification_time)
+                for path_idx, modification_time in self._records(DIRECTORIES, DIRECTORY_RECORD)}
+
+    # A playlist is stale when a collected directory changed or disappeared, or when the
+    # current date moved before the scan date or past the first expiry
+    def is_stale(self, fs_access: FileSystemAccess, current_date: datetime.date | None = None) -> bool:
+        if current_date is None:
+            current_date = fs_access.get_current_date()
+        if current_date < self.scan_date or (self.first_expiry and current_date >= self.first_expiry):
+            return True
+        for path_idx, modification_time in self._records(DIRECTORIES, DIRECTORY_RECORD):
+            try:
+                current_time: datetime.datetime | None = fs_access.get_file_modification_time(
+                    self.string(path_idx))
+            except OSError:
+                return True
+            if current_time is None or _to_microseconds(current_time) != modification_time:
+                return True
+        return False
+
+    # Decode the whole playlist into slide_collection
+    def fill_slides_collection(self, slide_collection: SlidesCollection) -> None:
+        strings: List[str] = [self.string(idx) for idx in range(self.section_count(STRINGS))]
+        durations: Dict[int, datetime.timedelta] = {}
+
+        def duration_of(microseconds: int) -> datetime.timedelta | None:
+            if microseconds < 0:
+                return None
+            duration: datetime.timedelta | None = durations.get(microseconds)
+            if duration is None:
+                duration = durations[microseconds] = datetime.timedelta(microseconds=microseconds)
+            return duration
+
+        slides: List[NormalSlide] = [NormalSlide(strings[file_idx], duration_of(duration))
+                                     for file_idx, duration in self._records(NORMAL_SLIDES, SLIDE_RECORD)]
+        for weight, first, count in self._records(WEIGHTS, WEIGHT_RECORD):
+            slide_collection.normal_slides[weight] = slide_collection.create_slide_list(
+                slides[first:first + count])
+        files: List[str] = [strings[file_idx] for file_idx, in self._records(OVERSHADOW_FILES, FILE_RECORD)]
+        for frequency, duration, first, count in self._records(OVERSHADOW, OVERSHADOW_RECORD):
+            slide_collection.add_one_at_a_time_slides(files[first:first + count], frequency,
+                                                      duration_of(duration))
+        for file_idx, expire_after_date in self._records(EXPIRE_DATES, EXPIRE_DATE_RECORD):
+            slide_collection.set_expire_date(strings[file_idx], _from_microseconds(expire_after_date))
+        for file_idx, in self._records(EXPIRED_SLIDES, FILE_RECORD):
+            slide_collection.add_expired_slide(strings[file_idx])
+        for severity, file_idx, text_idx in self._records(MESSAGES, MESSAGE_RECORD):
+            slide_collection.messages.append(SlideMessage(Severity(severity), strings[file_idx], strings[text_idx]))
+
+
+# Collect the slides of root_dir and compile them into playlist_file
+def compile_playlist(playlist_file: str, root_dir: str, show_config: ShowConfig = ShowConfig(),
+                     fs_access: FileSystemAccess = ScandirFileSystemAccess(),
+                     slide_collection: SlidesCollection | None = None) -> SlidesCollection:
+    if slide_collection is None:
+        slide_collection = SlidesCollection()
+    recording_access: DirectoryRecordingFileSystemAccess = DirectoryRecordingFileSystemAccess(fs_access)
+    scan_date: datetime.date = fs_access.get_current_date()
+    collect_slides(slide_collection, root_dir, show_config=show_config, fs_access=recording_access,
+                   current_date=scan_date)
+    write_playlist(playlist_file, slide_collection, scan_date, recording_access.directory_times)
+    return slide_collection
+
+
+# Fill slide_collection from playlist_file when it is current, otherwise collect the slides
+# and compile the playlist again. Returns True when the playlist was used
+def load_playlist(slide_collection: SlidesCollection, playlist_file: str, root_dir: str,
+                  show_config: ShowConfig = ShowConfig(),
+                  fs_access: FileSystemAccess = ScandirFileSystemAccess()) -> bool:
+    try:
+        with PlaylistFile(playlist_file) as playlist:
+            if not playlist.is_stale(fs_access):
+                playlist.fill_slides_collection(slide_collection)
+                return True
+    except (OSError, PlaylistError, struct.error, ValueError):
+        pass
+    compile_playlist(playlist_file, root_dir, show_config, fs_access, slide_collection)
+    return False
@@ -0,0 +1,205 @@
+# Read-ahead decoding for the display: the next slides are decoded on worker threads into
+# a memory-bounded LRU cache, so the display gets decoded pixels when a slide is due
+import os
+import time
+import logging
+import threading
+import collections
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterable, Iterator, Tuple, TYPE_CHECKING
+from scheduler import ScheduledSlide
+
+if TYPE_CHECKING:
+    from transition_stats import TransitionStats
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+# Decoded pixels of a slide, rows bottom-up as Kivy textures expect them
+@dataclass
+class DecodedImage:
+    file: str
+    width: int
+    height: int
+    colorfmt: str
+    pixels: bytes
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.pixels)
+
+
+def decode_with_pillow(file: str) -> DecodedImage:
+    from PIL import Image
+    with Image.open(file) as image:
+        rgba_image = image.convert('RGBA').transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+        return DecodedImage(file, rgba_image.width, rgba_image.height, 'rgba', rgba_image.tobytes())
+
+
+# Create a Kivy texture from decoded pixels, must be called on the Kivy main thread
+def texture_from_decoded(decoded: DecodedImage):
+    from kivy.graphics.texture import Texture
+    texture = Texture.create(size=(decoded.width, decoded.height), colorfmt=decoded.colorfmt)
+    texture.blit_buffer(decoded.pixels, colorfmt=decoded.colorfmt, bufferfmt='ubyte')
+    return texture
+
+
+@dataclass
+class PrefetchStats:
+    hits: int = 0
+    misses: int = 0
+    decodes: int = 0
+    failed_decodes: int = 0
+    evictions: int = 0
+    total_decode_seconds: float = 0.0
+    max_decode_seconds: float = 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        requests: int = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    @property
+    def mean_decode_seconds(self) -> float:
+        return self.total_decode_seconds / self.decodes if self.decodes else 0.0
+
+
+# LRU cache of decoded images bounded by the total size of their pixels
+class FrameCache:
+    byte_budget: int
+    used_bytes: int
+    _frames: OrderedDict[str, DecodedImage]
+
+    def __init__(self, byte_budget: int):
+        self.byte_budget = byte_budget
+        self.used_bytes = 0
+        self._frames = OrderedDict()
+
+    def __contains__(self, file: str) -> bool:
+        return file in self._frames
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def get(self, file: str) -> DecodedImage | None:
+        decoded: DecodedImage | None = self._frames.get(file)
+        if decoded is not None:
+            self._frames.move_to_end(file)
+        return decoded
+
+    # Add a frame, returns the number of frames evicted to make room for it.
+    # A frame larger than the whole budget is not cached
+    def put(self, decoded: DecodedImage) -> int:
+        if decoded.nbytes > self.byte_budget:
+            return 0
+        self.remove(decoded.file)
+        evictions: int = 0
+        while self.used_bytes + decoded.nbytes > self.byte_budget:
+            _, evicted = self._frames.popitem(last=False)
+            self.used_bytes -= evicted.nbytes
+            evictions += 1
+        self._frames[decoded.file] = decoded
+        self.used_bytes += decoded.nbytes
+        return evictions
+
+    def remove(self, file: str) -> None:
+        decoded: DecodedImage | None = self._frames.pop(file, None)
+        if decoded is not None:
+            self.used_bytes -= decoded.nbytes
+
+
+# Decodes files on worker threads ahead of their use. get() returns the cached frame,
+# waits for a decode in flight, or decodes on the calling thread as a last resort.
+# Files are relative to root_dir, as the slides of a collection are; the relative path
+# is the key of the cache and the file of the decoded image
+class PrefetchPipeline:
+    decode: Callable[[str], DecodedImage]
+    root_dir: str
+    cache: FrameCache
+    stats: PrefetchStats
+    _in_flight: Dict[str, Future]
+    _lock: threading.Lock
+
+    def __init__(self, decode: Callable[[str], DecodedImage] = decode_with_pillow,
+                 byte_budget: int = 256 * 1024 * 1024, max_workers: int = 2,
+                 transition_stats: 'TransitionStats | None' = None, root_dir: str = ''):
+        self.decode = decode
+        self.root_dir = root_dir
+        self.transition_stats = transition_stats
+        self.cache = FrameCache(byte_budget)
+        self.stats = PrefetchStats()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='decode')
+
+    # A failed decode is not kept in flight, so the next prefetch or get of the file tries again
+    def _timed_decode(self, file: str) -> DecodedImage:
+        start: float = time.perf_counter()
+        decoded: DecodedImage | None = None
+        try:
+            decoded = self.decode(os.path.join(self.root_dir, file))
+            decoded.file = file
+        finally:
+            elapsed: float = time.perf_counter() - start
+            with self._lock:
+                if decoded is None:
+                    self.stats.failed_decodes += 1
+                else:
+                    self.stats.decodes += 1
+                    self.stats.total_decode_seconds += elapsed
+                    self.stats.max_decode_seconds = max(self.stats.max_decode_seconds, elapsed)
+                    self.stats.evictions += self.cache.put(decoded)
+                self._in_flight.pop(file, None)
+        if self.transition_stats is not None:
+            self.transition_stats.record_decode(file, elapsed)
+        return decoded
+
+    # Start decoding the files that are neither cached nor already being decoded
+    def prefetch(self, files: Iterable[str]) -> None:
+        with self._lock:
+            for file in files:
+                if file not in self.cache and file not in self._in_flight:
+                    self._in_flight[file] = self._executor.submit(self._timed_decode, file)
+
+    # Raises the error of a failed decode
+    def get(self, file: str) -> DecodedImage:
+        with self._lock:
+            decoded: DecodedImage | None = self.cache.get(file)
+            in_flight: Future | None = self._in_flight.get(file)
+            if decoded is not None:
+                self.stats.hits += 1
+                return decoded
+            self.stats.misses += 1
+        if in_flight is not None:
+            return in_flight.result()
+        return self._timed_decode(file)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+# Wraps a slide sequence (such as a SlideScheduler) so that the next read_ahead slides
+# are always being decoded, and yields every slide together with its decoded image.
+# A slide that fails to decode is logged and skipped, it is decoded again when it comes up again
+def prefetched_slides(slides: Iterable[ScheduledSlide], pipeline: PrefetchPipeline,
+                      read_ahead: int = 3) -> Iterator[Tuple[ScheduledSlide, DecodedImage]]:
+    slide_iterator: Iterator[ScheduledSlide] = iter(slides)
+    upcoming: Deque[ScheduledSlide] = collections.deque()
+    while True:
+        while len(upcoming) <= read_ahead:
+            slide: ScheduledSlide | None = next(slide_iterator, None)
+            if slide is None:
+                break
+            upcoming.append(slide)
+        if not upcoming:
+            return
+        pipeline.prefetch(upcoming_slide.file for upcoming_slide in upcoming)
+        slide = upcoming.popleft()
+        try:
+            decoded: DecodedImage = pipeline.get(slide.file)
+        except Exception as error:
+            logger.warning("Skipping %s, decoding failed: %s", slide.file, error)
+            continue
+        yield slide, decoded
@@ -0,0 +1,204 @@
+# On-disk cache of slides pre-scaled to the display resolution. Entries are keyed by the
+# hash of the file content and the target size, so a renamed or moved slide (the usual
+# way of changing its configuration) still hits the cache. The frames on disk and their
+# sizes are listed once at startup and then tracked in memory in least recently used order
+import os
+import struct
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Set, Tuple
+from prefetch import DecodedImage
+
+RENDER_CACHE_INDEX_VERSION: int = 1
+FRAME_HEADER = struct.Struct('<II8s')
+FRAME_SUFFIX: str = '.frame'
+# bytes per pixel of the color formats a frame can have, its pixels must add up
+BYTES_PER_PIXEL: Dict[str, int] = {'rgba': 4, 'bgra': 4, 'rgb': 3, 'bgr': 3}
+
+# identity of the file content as far as the file system tells: device, inode, size, mtime
+StatKey = Tuple[int, int, int, int]
+
+
+def render_with_pillow(file: str, size: Tuple[int, int]) -> DecodedImage:
+    from PIL import Image, ImageOps
+    with Image.open(file) as image:
+        rgba_image = ImageOps.contain(image.convert('RGBA'), size)
+        rgba_image = rgba_image.transpose(Image.Transpose.FLIP_TOP_BOTTOM)
+        return DecodedImage(file, rgba_image.width, rgba_image.height, 'rgba', rgba_image.tobytes())
+
+
+@dataclass
+class RenderCacheStats:
+    hits: int = 0
+    misses: int = 0
+    hashes: int = 0
+    evictions: int = 0
+
+
+class RenderCache:
+    cache_dir: str
+    byte_budget: int
+    render: Callable[[str, Tuple[int, int]], DecodedImage]
+    stats: RenderCacheStats
+    used_bytes: int
+    _hashes: Dict[StatKey, str]
+    # frame file to its size, least recently used first
+    _frames: OrderedDict[str, int]
+
+    def __init__(self, cache_dir: str, byte_budget: int,
+                 render: Callable[[str, Tuple[int, int]], DecodedImage] = render_with_pillow):
+        self.cache_dir = cache_dir
+        self.byte_budget = byte_budget
+        self.render = render
+        self.stats = RenderCacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._frames = OrderedDict((frame_file, size) for frame_file, size, _
+                                   in sorted(self._cached_frames(), key=lambda frame: frame[2]))
+        self.used_bytes = sum(self._frames.values())
+        self._hashes = self._load_index()
+        self._prune_hashes()
+
+    def _index_file(self) -> str:
+        return os.path.join(self.cache_dir, 'index.pickle')
+
+    def _load_index(self) -> Dict[StatKey, str]:
+        try:
+            with open(self._index_file(), 'rb') as file:
+                version, hashes = pickle.load(file)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+            return {}
+        return hashes if version == RENDER_CACHE_INDEX_VERSION else {}
+
+    # Forget the hashes of content that has no frame in the cache any more, must hold the lock
+    def _prune_hashes(self) -> None:
+        cached_hashes: Set[str] = {os.path.basename(frame_file).split('_', 1)[0] for frame_file in self._frames}
+        self._hashes = {stat_key: content_hash for stat_key, content_hash in self._hashes.items()
+                        if content_hash in cached_hashes}
+
+    # Save the content hashes, so that a restarted player does not hash every slide again
+    def save_index(self) -> None:
+        with self._lock:
+            self._prune_hashes()
+            temp_file: str = self._index_file() + '.tmp'
+            with open(temp_file, 'wb') as file:
+                pickle.dump((RENDER_CACHE_INDEX_VERSION, dict(self._hashes)), file, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_file, self._index_file())
+
+    # Hash of the file content, only computed again when the device, inode, size or
+    # modification time of the file changes
+    def content_hash(self, file: str) -> str:
+        stat_result: os.stat_result = os.stat(file)
+        stat_key: StatKey = (stat_result.st_dev, stat_result.st_ino, stat_result.st_size,
+                             stat_result.st_mtime_ns)
+        with self._lock:
+            content_hash: str | None = self._hashes.get(stat_key)
+        if content_hash is None:
+            hasher = hashlib.sha256()
+            with open(file, 'rb') as content:
+                for chunk in iter(lambda: content.read(1024 * 1024), b''):
+                    hasher.update(chunk)
+            content_hash = hasher.hexdigest()
+            with self._lock:
+                self._hashes[stat_key] = content_hash
+                self.stats.hashes += 1
+        return content_hash
+
+    def _frame_file(self, content_hash: str, size: Tuple[int, int]) -> str:
+        return os.path.join(self.cache_dir, f'{content_hash}_{size[0]}x{size[1]}{FRAME_SUFFIX}')
+
+    def _cached_frames(self) -> List[Tuple[str, int, int]]:
+        frames: List[Tuple[str, int, int]] = []
+        with os.scandir(self.cache_dir) as dir_iterator:
+            for entry in dir_iterator:
+                if entry.name.endswith(FRAME_SUFFIX):
+                    stat_result: os.stat_result = entry.stat()
+                    frames.append((entry.path, stat_result.st_size, stat_result.st_mtime_ns))
+        return frames
+
+    # The cached frame, None when there is none or it is damaged, a damaged frame is deleted.
+    # Another player may evict the frame at any moment, that is a miss as well
+    def _read_frame(self, frame_file: str, file: str) -> DecodedImage | None:
+        try:
+            with open(frame_file, 'rb') as frame:
+                width, height, colorfmt = FRAME_HEADER.unpack(frame.read(FRAME_HEADER.size))
+                pixels: bytes = frame.read()
+        except FileNotFoundError:
+            return None
+        except struct.error:
+            self._remove_frame(frame_file)
+            return None
+        try:
+            colorfmt_name: str = colorfmt.rstrip(b'\0').decode()
+        except UnicodeDecodeError:
+            colorfmt_name = ''
+        if colorfmt_name not in BYTES_PER_PIXEL or len(pixels) != width * height * BYTES_PER_PIXEL[colorfmt_name]:
+            self._remove_frame(frame_file)
+            return None
+        # mark as recently used for the eviction, on disk for the next start
+        with self._lock:
+            if frame_file in self._frames:
+                self._frames.move_to_end(frame_file)
+        try:
+            os.utime(frame_file)
+        except OSError:
+            self._remove_frame(frame_file)
+            return None
+        return DecodedImage(file, width, height, colorfmt_name, pixels)
+
+    def _remove_frame(self, frame_file: str) -> None:
+        with self._lock:
+            self.used_bytes -= self._frames.pop(frame_file, 0)
+        try:
+            os.remove(frame_file)
+        except FileNotFoundError:
+            pass
+
+    def _write_frame(self, frame_file: str, decoded: DecodedImage) -> None:
+        temp_file: str = f'{frame_file}.{threading.get_ident()}.tmp'
+        with open(temp_file, 'wb') as frame:
+            frame.write(FRAME_HEADER.pack(decoded.width, decoded.height, decoded.colorfmt.encode()))
+            frame.write(decoded.pixels)
+        os.replace(temp_file, frame_file)
+        with self._lock:
+            self.used_bytes += FRAME_HEADER.size + decoded.nbytes - self._frames.pop(frame_file, 0)
+            self._frames[frame_file] = FRAME_HEADER.size + decoded.nbytes
+        if self.used_bytes > self.byte_budget:
+            self.evict()
+
+    # Delete the least recently used frames until the cache fits the disk budget
+    def evict(self) -> None:
+        with self._lock:
+            while self._frames and self.used_bytes > self.byte_budget:
+                frame_file, size = self._frames.popitem(last=False)
+                try:
+                    os.remove(frame_file)
+                except FileNotFoundError:
+                    pass
+                self.used_bytes -= size
+                self.stats.evictions += 1
+            # the hashes of evicted content are dropped once they outnumber the frames
+            if len(self._hashes) > 2 * len(self._frames) + 64:
+                self._prune_hashes()
+
+    # The slide scaled to fit size, from the cache or rendered and stored
+    def get(self, file: str, size: Tuple[int, int]) -> DecodedImage:
+        frame_file: str = self._frame_file(self.content_hash(file), size)
+        decoded: DecodedImage | None = self._read_frame(frame_file, file)
+        if decoded is not None:
+            with self._lock:
+                self.stats.hits += 1
+            return decoded
+        with self._lock:
+            self.stats.misses += 1
+        decoded = self.render(file, size)
+        decoded.file = file
+        self._write_frame(frame_file, decoded)
+        return decoded
+
+    # Decode function for PrefetchPipeline rendering at the given display size
+    def decoder(self, size: Tuple[int, int]) -> Callable[[str], DecodedImage]:
+        return lambda file: self.get(file, size)
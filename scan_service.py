@@ -0,0 +1,444 @@
+# Local scan service: one process owns the collection of each root directory and serves
+# it over a Unix socket to the player processes of all screens, instead of every player
+# scanning the same tree. A subscriber gets the full collection, then updates that carry
+# only what a rescan changed. Updates to a client that is slow to read are coalesced
+# into one, so a slow client never makes the service queue more than one update for it.
+# Clients can only subscribe to root directories at or under the allowed roots, and a
+# root is kept only once its first scan succeeded. Roots are tracked by their normalized
+# path, and clients subscribing to a new root at the same time share its first scan
+#
+# Messages are JSON objects, each preceded by its length as 4 bytes big endian:
+#   client:  {"type": "subscribe", "root_dir": ...}
+#   service: {"type": "collection", "seq": n, "collection": {...}}
+#            {"type": "update", "seq": n, "update": {...}}
+#            {"type": "error", "error": ...}
+import os
+import json
+import struct
+import asyncio
+import logging
+import datetime
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Set, Tuple
+from config import SlidesCollection, NormalSlide, OvershadowSlideCollection, SlideMessage, Severity, \
+    ShowConfig
+from async_collect import AsyncFileSystemAccess, collect_slides_async
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+MESSAGE_LENGTH = struct.Struct('>I')
+MAX_MESSAGE_SIZE: int = 1 << 30
+
+
+async def write_message(writer: asyncio.StreamWriter, message: Dict[str, object]) -> None:
+    data: bytes = json.dumps(message, separators=(',', ':')).encode()
+    writer.write(MESSAGE_LENGTH.pack(len(data)) + data)
+    await writer.drain()
+
+
+async def read_message(reader: asyncio.StreamReader) -> Dict[str, object]:
+    length, = MESSAGE_LENGTH.unpack(await reader.readexactly(MESSAGE_LENGTH.size))
+    if length > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Message of {length} bytes is too large")
+    return json.loads(await reader.readexactly(length))
+
+
+def _duration_to_json(duration: datetime.timedelta | None) -> int | None:
+    return None if duration is None else duration // datetime.timedelta(microseconds=1)
+
+
+def _duration_from_json(microseconds: int | None) -> datetime.timedelta | None:
+    return None if microseconds is None else datetime.timedelta(microseconds=microseconds)
+
+
+def _overshadow_to_json(collections: List[OvershadowSlideCollection]) -> List[list]:
+    return [[list(collection.files), collection.frequency, _duration_to_json(collection.duration)]
+            for collection in collections]
+
+
+def _messages_to_json(messages: List[SlideMessage]) -> List[list]:
+    return [[message.severity.name, message.file, message.error] for message in messages]
+
+
+def collection_to_json(slide_collection: SlidesCollection) -> Dict[str, object]:
+    return {
+        'normal_slides': [[weight, [[slide.file, _duration_to_json(slide.duration)] for slide in slides]]
+                          for weight, slides in slide_collection.normal_slides.items()],
+        'overshadow': _overshadow_to_json(slide_collection.overshadow_slide_collections),
+        'messages': _messages_to_json(slide_collection.messages),
+        'expired_slides': list(slide_collection.expired_slides),
+        'expire_dates': {file: expire_after_date.isoformat()
+                         for file, expire_after_date in slide_collection.expire_dates.items()},
+    }
+
+
+def collection_from_json(data: Dict[str, object], slide_collection: SlidesCollection | None = None) \
+        -> SlidesCollection:
+    if slide_collection is None:
+        slide_collection = SlidesCollection()
+    for weight, slides in data['normal_slides']:
+        for file, duration in slides:
+            slide_collection.add_normal_slide(file, weight, _duration_from_json(duration))
+    for files, frequency, duration in data['overshadow']:
+        slide_collection.add_one_at_a_time_slides(files, frequency, _duration_from_json(duration))
+    slide_collection.messages.extend(SlideMessage(Severity[severity], file, error)
+                                     for severity, file, error in data['messages'])
+    for file in data['expired_slides']:
+        slide_collection.add_expired_slide(file)
+    for file, expire_after_date in data['expire_dates'].items():
+        slide_collection.set_expire_date(file, datetime.datetime.fromisoformat(expire_after_date))
+    return slide_collection
+
+
+# What a rescan changed. Normal slides and expire dates are changed one by one, the other
+# parts are replaced when they changed at all. Applying a then b equals applying
+# a.then(b), which is how the updates to a slow client are coalesced
+@dataclass
+class CollectionUpdate:
+    # (weight, file) to its duration in microseconds, or None for a removed slide
+    normal_slides: Dict[Tuple[float, str], int | None] = field(default_factory=dict)
+    # file to its expire date in ISO format, or None for a removed date
+    expire_dates: Dict[str, str | None] = field(default_factory=dict)
+    overshadow: List[list] | None = None
+    messages: List[list] | None = None
+    expired_slides: List[str] | None = None
+
+    @classmethod
+    def between(cls, old: Dict[str, object], new: Dict[str, object]) -> 'CollectionUpdate':
+        old_slides: Dict[Tuple[float, str], int] = {(weight, file): duration for weight, slides
+                                                    in old['normal_slides'] for file, duration in slides}
+        new_slides: Dict[Tuple[float, str], int] = {(weight, file): duration for weight, slides
+                                                    in new['normal_slides'] for file, duration in slides}
+        update: CollectionUpdate = cls()
+        update.normal_slides = {key: None for key in old_slides if key not in new_slides}
+        update.normal_slides.update((key, duration) for key, duration in new_slides.items()
+                                    if old_slides.get(key, -1) != duration)
+        update.expire_dates = {file: None for file in old['expire_dates'] if file not in new['expire_dates']}
+        update.expire_dates.update((file, expire_after_date)
+                                   for file, expire_after_date in new['expire_dates'].items()
+                                   if old['expire_dates'].get(file) != expire_after_date)
+        for part in ('overshadow', 'messages', 'expired_slides'):
+            if old[part] != new[part]:
+                setattr(update, part, new[part])
+        return update
+
+    def is_empty(self) -> bool:
+        return not self.normal_slides and not self.expire_dates and self.overshadow is None and \
+            self.messages is None and self.expired_slides is None
+
+    def then(self, later: 'CollectionUpdate') -> 'CollectionUpdate':
+        return CollectionUpdate(
+            {**self.normal_slides, **later.normal_slides}, {**self.expire_dates, **later.expire_dates},
+            later.overshadow if later.overshadow is not None else self.overshadow,
+            later.messages if later.messages is not None else self.messages,
+            later.expired_slides if later.expired_slides is not None else self.expired_slides)
+
+    def to_json(self) -> Dict[str, object]:
+        return {
+            'normal_slides': [[weight, file, duration] for (weight, file), duration in self.normal_slides.items()],
+            'expire_dates': self.expire_dates,
+            'overshadow': self.overshadow,
+            'messages': self.messages,
+            'expired_slides': self.expired_slides,
+        }
+
+    @classmethod
+    def from_json(cls, data: Dict[str, object]) -> 'CollectionUpdate':
+        return cls({(weight, file): duration for weight, file, duration in data['normal_slides']},
+                   data['expire_dates'], data['overshadow'], data['messages'], data['expired_slides'])
+
+    # Apply to a collection received from the service. Added slides go to the end of their
+    # weight, the order inside a weight does not matter for playback
+    def apply_to(self, slide_collection: SlidesCollection) -> None:
+        removed: Dict[float, Set[str]] = {}
+        for (weight, file), duration in self.normal_slides.items():
+            removed.setdefault(weight, set()).add(file)
+        for weight, files in removed.items():
+            slides: List[NormalSlide] = slide_collection.create_slide_list(
+                slide for slide in slide_collection.normal_slides.get(weight, ()) if slide.file not in files)
+            if slides:
+                slide_collection.normal_slides[weight] = slides
+            else:
+                slide_collection.normal_slides.pop(weight, None)
+        for (weight, file), duration in self.normal_slides.items():
+            if duration is not None:
+                slide_collection.add_normal_slide(file, weight, _duration_from_json(duration))
+        for file, expire_after_date in self.expire_dates.items():
+            if expire_after_date is None:
+                slide_collection.expire_dates.pop(file, None)
+            else:
+                slide_collection.set_expire_date(file, datetime.datetime.fromisoformat(expire_after_date))
+        if self.overshadow is not None:
+            slide_collection.overshadow_slide_collections = []
+            for files, frequency, duration in self.overshadow:
+                slide_collection.add_one_at_a_time_slides(files, frequency, _duration_from_json(duration))
+        if self.messages is not None:
+            slide_collection.messages = [SlideMessage(Severity[severity], file, error)
+                                         for severity, file, error in self.messages]
+        if self.expired_slides is not None:
+            slide_collection.expired_slides = slide_collection.create_file_list(self.expired_slides)
+
+
+# One connected player. Its updates are sent by its own task, updates produced while it
+# is still sending, or within batch_interval of the last send, are coalesced
+class _Subscriber:
+    def __init__(self, writer: asyncio.StreamWriter, batch_interval: float):
+        self.writer = writer
+        self.batch_interval = batch_interval
+        self.pending: CollectionUpdate | None = None
+        self.pending_seq: int = 0
+        self.updates_sent: int = 0
+        self.updates_coalesced: int = 0
+        self._ready = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._send_updates())
+
+    def push(self, update: CollectionUpdate, seq: int) -> None:
+        if self.pending is None:
+            self.pending = update
+        else:
+            self.pending = self.pending.then(update)
+            self.updates_coalesced += 1
+        self.pending_seq = seq
+        self._ready.set()
+
+    async def _send_updates(self) -> None:
+        try:
+            while True:
+                await self._ready.wait()
+                self._ready.clear()
+                update, self.pending = self.pending, None
+                await write_message(self.writer, {'type': 'update', 'seq': self.pending_seq,
+                                                  'update': update.to_json()})
+                self.updates_sent += 1
+                if self.batch_interval:
+                    await asyncio.sleep(self.batch_interval)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        self.writer.close()
+
+
+# The collection of one root directory and its subscribers
+class _RootIndex:
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self.slide_collection: SlidesCollection | None = None
+        self.collection_json: Dict[str, object] | None = None
+        self.seq: int = 0
+        self.subscribers: Set[_Subscriber] = set()
+        self.lock = asyncio.Lock()
+
+
+class ScanService:
+    socket_path: str
+    allowed_roots: List[str]
+    fs_access: AsyncFileSystemAccess
+    show_config: ShowConfig
+    batch_interval: float
+    rescan_interval: float | None
+
+    # allowed_roots are the directories clients may subscribe to, together with the directories under them
+    def __init__(self, socket_path: str, allowed_roots: Iterable[str],
+                 fs_access: AsyncFileSystemAccess | None = None,
+                 show_config: ShowConfig = ShowConfig(), batch_interval: float = 0.1,
+                 rescan_interval: float | None = None):
+        self.socket_path = socket_path
+        self.allowed_roots = [os.path.realpath(root_dir) for root_dir in allowed_roots]
+        self.fs_access = fs_access if fs_access is not None else AsyncFileSystemAccess()
+        self.show_config = show_config
+        self.batch_interval = batch_interval
+        self.rescan_interval = rescan_interval
+        self._roots: Dict[str, _RootIndex] = {}
+        self._first_scans: Dict[str, asyncio.Task] = {}
+        self._server: asyncio.AbstractServer | None = None
+        self._rescan_task: asyncio.Task | None = None
+        self._handlers: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        self._server = await asyncio.start_unix_server(self._handle_client, self.socket_path)
+        if self.rescan_interval:
+            self._rescan_task = asyncio.get_running_loop().create_task(self._rescan_periodically())
+
+    async def close(self) -> None:
+        if self._rescan_task is not None:
+            self._rescan_task.cancel()
+        for first_scan in self._first_scans.values():
+            first_scan.cancel()
+        for root_index in self._roots.values():
+            for subscriber in root_index.subscribers:
+                subscriber.close()
+            root_index.subscribers.clear()
+        if self._server is not None:
+            self._server.close()
+            # the handlers end when their connection is closed
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self._server.wait_closed()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+    async def __aenter__(self) -> 'ScanService':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
+
+    async def _rescan_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.rescan_interval)
+            for root_dir in list(self._roots):
+                # a root that cannot be scanned keeps its last collection, the others go on
+                try:
+                    await self.rescan(root_dir)
+                except Exception:
+                    logger.exception("Rescan of %s failed", root_dir)
+
+    def is_allowed_root(self, root_dir: str) -> bool:
+        real_path: str = os.path.realpath(root_dir)
+        return any(real_path == allowed_root or real_path.startswith(allowed_root.rstrip(os.sep) + os.sep)
+                   for allowed_root in self.allowed_roots)
+
+    # "/a", "/a/" and "/a/./" are the same root
+    @staticmethod
+    def _root_key(root_dir: str) -> str:
+        return os.path.normpath(root_dir)
+
+    def collection(self, root_dir: str) -> SlidesCollection | None:
+        root_index: _RootIndex | None = self._roots.get(self._root_key(root_dir))
+        return root_index.slide_collection if root_index else None
+
+    # Scan root_dir again and send what changed to its subscribers. Returns the sequence
+    # number of the collection. Raises OSError when root_dir cannot be scanned and
+    # ValueError when a name in it cannot be parsed, a new root is only kept once it was
+    # scanned. A new root is scanned once, however many callers wait for it
+    async def rescan(self, root_dir: str) -> int:
+        root_dir = self._root_key(root_dir)
+        root_index: _RootIndex | None = self._roots.get(root_dir)
+        if root_index is not None:
+            return await self._scan(root_index)
+        first_scan: asyncio.Task | None = self._first_scans.get(root_dir)
+        if first_scan is None:
+            first_scan = asyncio.get_running_loop().create_task(self._first_scan(root_dir))
+            self._first_scans[root_dir] = first_scan
+            first_scan.add_done_callback(lambda task: self._first_scan_done(root_dir, task))
+        # a waiting client that goes away does not cancel the scan the others wait for
+        return await asyncio.shield(first_scan)
+
+    async def _first_scan(self, root_dir: str) -> int:
+        root_index: _RootIndex = _RootIndex(root_dir)
+        seq: int = await self._scan(root_index)
+        self._roots[root_dir] = root_index
+        return seq
+
+    def _first_scan_done(self, root_dir: str, first_scan: asyncio.Task) -> None:
+        self._first_scans.pop(root_dir, None)
+        # the error is raised to the waiting callers, there may be none left
+        if not first_scan.cancelled():
+            first_scan.exception()
+
+    async def _scan(self, root_index: _RootIndex) -> int:
+        root_dir: str = root_index.root_dir
+        async with root_index.lock:
+            slide_collection: SlidesCollection = SlidesCollection()
+            await collect_slides_async(slide_collection, root_dir, self.show_config, self.fs_access)
+            collection_json: Dict[str, object] = collection_to_json(slide_collection)
+            if root_index.collection_json is not None:
+                update: CollectionUpdate = CollectionUpdate.between(root_index.collection_json, collection_json)
+                if update.is_empty():
+                    return root_index.seq
+                root_index.seq += 1
+                for subscriber in root_index.subscribers:
+                    subscriber.push(update, root_index.seq)
+            root_index.slide_collection = slide_collection
+            root_index.collection_json = collection_json
+            return root_index.seq
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        subscriber: _Subscriber | None = None
+        root_index: _RootIndex | None = None
+        self._handlers.add(asyncio.current_task())
+        try:
+            request: Dict[str, object] = await read_message(reader)
+            if request.get('type') != 'subscribe' or not isinstance(request.get('root_dir'), str):
+                await write_message(writer, {'type': 'error', 'error': 'Expected a subscribe request'})
+                return
+            root_dir: str = request['root_dir']
+            if not self.is_allowed_root(root_dir):
+                await write_message(writer, {'type': 'error', 'error': f'{root_dir} is not an allowed root'})
+                return
+            root_dir = self._root_key(root_dir)
+            try:
+                if root_dir not in self._roots:
+                    await self.rescan(root_dir)
+            except (OSError, ValueError) as error:
+                # the root cannot be scanned, or a name in it cannot be parsed
+                await write_message(writer, {'type': 'error', 'error': f'{type(error).__name__}: {error}'})
+                return
+            root_index = self._roots[root_dir]
+            async with root_index.lock:
+                subscriber = _Subscriber(writer, self.batch_interval)
+                await write_message(writer, {'type': 'collection', 'seq': root_index.seq,
+                                             'collection': root_index.collection_json})
+                root_index.subscribers.add(subscriber)
+            subscriber.start()
+            # the connection stays open until the player closes it
+            await reader.read()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            # the connection broke or the request was not a valid message
+            pass
+        finally:
+            if subscriber is not None and root_index is not None:
+                root_index.subscribers.discard(subscriber)
+                subscriber.close()
+            else:
+                writer.close()
+            self._handlers.discard(asyncio.current_task())
+
+
+# A player's view of the collection of one root, kept up to date by the service
+class ScanServiceClient:
+    root_dir: str
+    slide_collection: SlidesCollection
+    seq: int
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, root_dir: str):
+        self._reader = reader
+        self._writer = writer
+        self.root_dir = root_dir
+        self.slide_collection = SlidesCollection()
+        self.seq = 0
+
+    @classmethod
+    async def subscribe(cls, socket_path: str, root_dir: str) -> 'ScanServiceClient':
+        reader, writer = await asyncio.open_unix_connection(socket_path, limit=MAX_MESSAGE_SIZE)
+        client: ScanServiceClient = cls(reader, writer, root_dir)
+        await write_message(writer, {'type': 'subscribe', 'root_dir': root_dir})
+        message: Dict[str, object] = await read_message(reader)
+        if message['type'] != 'collection':
+            writer.close()
+            raise ConnectionError(f"Scan service refused the subscription: {message.get('error')}")
+        collection_from_json(message['collection'], client.slide_collection)
+        client.seq = message['seq']
+        return client
+
+    # Wait for the next update and apply it, returns its sequence number
+    async def receive_update(self) -> int:
+        message: Dict[str, object] = await read_message(self._reader)
+        CollectionUpdate.from_json(message['update']).apply_to(self.slide_collection)
+        self.seq = message['seq']
+        return self.seq
+
+    async def close(self) -> None:
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
@@ -0,0 +1,169 @@
+# Instrumentation of a scan: per-directory timings and entry counts, FileSystemAccess calls
+# by method and parse errors, to find the directories that make a scan slow. Pass a
+# ScanStats to collect_slides, without one the scan does no bookkeeping at all
+import json
+import time
+import datetime
+import collections
+from dataclasses import dataclass, field
+from typing import Dict, List
+from config import FileSystemAccess, DelegatingFileSystemAccess, DirEntryInfo, ShowConfig, \
+    SlidesCollection, collect_slides, parse_file_name_for_config
+
+
+@dataclass
+class DirectoryStats:
+    path: str
+    # time spent on the directory including its subdirectories
+    elapsed_seconds: float = 0.0
+    # time spent on the directory without its subdirectories
+    self_seconds: float = 0.0
+    entry_count: int = 0
+    slide_count: int = 0
+
+
+@dataclass
+class ScanStats:
+    directories: Dict[str, DirectoryStats] = field(default_factory=dict)
+    fs_calls: collections.Counter = field(default_factory=collections.Counter)
+    fs_seconds: Dict[str, float] = field(default_factory=lambda: collections.defaultdict(float))
+    parse_count: int = 0
+    parse_errors: int = 0
+    parse_seconds: float = 0.0
+    merge_seconds: float = 0.0
+    entry_errors: int = 0
+    max_slides_errors: int = 0
+    messages: collections.Counter = field(default_factory=collections.Counter)
+    total_seconds: float = 0.0
+
+    def timed_parse(self, file_main_name: str, file_date: datetime.datetime) -> ShowConfig:
+        start: float = time.perf_counter()
+        self.parse_count += 1
+        try:
+            return parse_file_name_for_config(file_main_name, file_date)
+        except ValueError:
+            self.parse_errors += 1
+            raise
+        finally:
+            self.parse_seconds += time.perf_counter() - start
+
+    # Called by collect_slides when a directory is done, subdirectories are done before it
+    def directory_scanned(self, path: str, elapsed_seconds: float, entry_count: int, slide_count: int) -> None:
+        self.directories[path] = DirectoryStats(path, elapsed_seconds, elapsed_seconds, entry_count, slide_count)
+
+    # Compute the exclusive times, once the scan is done
+    def finish(self) -> None:
+        for directory_stats in self.directories.values():
+            directory_stats.self_seconds = directory_stats.elapsed_seconds
+        for path, directory_stats in self.directories.items():
+            if path == '':
+                continue
+            parent: str = path.rpartition('/')[0]
+            # directories collected in a sub collection are scanned separately, but they are
+            # still timed inside their parent
+            if parent in self.directories:
+                self.directories[parent].self_seconds -= directory_stats.elapsed_seconds
+
+    def record_collection(self, slide_collection: SlidesCollection) -> None:
+        for message in slide_collection.messages:
+            self.messages[message.severity.name] += 1
+
+    # The directories that took the most time themselves
+    def slowest_directories(self, count: int = 10) -> List[DirectoryStats]:
+        return sorted(self.directories.values(), key=lambda stats: stats.self_seconds, reverse=True)[:count]
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'total_seconds': self.total_seconds,
+            'directory_count': len(self.directories),
+            'entry_count': sum(stats.entry_count for stats in self.directories.values()),
+            'fs_calls': dict(self.fs_calls),
+            'fs_seconds': dict(self.fs_seconds),
+            'parse_count': self.parse_count,
+            'parse_errors': self.parse_errors,
+            'parse_seconds': self.parse_seconds,
+            'merge_seconds': self.merge_seconds,
+            'entry_errors': self.entry_errors,
+            'max_slides_errors': self.max_slides_errors,
+            'messages': dict(self.messages),
+            'directories': [
+                {'path': stats.path, 'elapsed_seconds': stats.elapsed_seconds,
+                 'self_seconds': stats.self_seconds, 'entry_count': stats.entry_count,
+                 'slide_count': stats.slide_count}
+                for stats in sorted(self.directories.values(), key=lambda stats: stats.path)],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def dump_json(self, path: str) -> None:
+        with open(path, 'w') as file:
+            file.write(self.to_json() + '\n')
+
+
+# Counts and times the FileSystemAccess calls of a scan, by method. When the wrapped access
+# lists a directory with the default list_dir_entries, that runs against the instrumented
+# methods, so its per entry is_dir and get_file_modification_time calls are counted too and
+# the time of list_dir_entries includes theirs
+class InstrumentedFileSystemAccess(DelegatingFileSystemAccess):
+    scan_stats: ScanStats
+
+    def __init__(self, fs_access: FileSystemAccess, scan_stats: ScanStats):
+        super().__init__(fs_access)
+        self.scan_stats = scan_stats
+
+    def _record(self, method: str, start: float) -> None:
+        self.scan_stats.fs_calls[method] += 1
+        self.scan_stats.fs_seconds[method] += time.perf_counter() - start
+
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        start: float = time.perf_counter()
+        try:
+            if type(self.fs_access).list_dir_entries is FileSystemAccess.list_dir_entries:
+                return FileSystemAccess.list_dir_entries(self, path)
+            return self.fs_access.list_dir_entries(path)
+        finally:
+            self._record('list_dir_entries', start)
+
+    def list_dir(self, path: str) -> List[str]:
+        start: float = time.perf_counter()
+        try:
+            return self.fs_access.list_dir(path)
+        finally:
+            self._record('list_dir', start)
+
+    def is_dir(self, path: str) -> bool:
+        start: float = time.perf_counter()
+        try:
+            return self.fs_access.is_dir(path)
+        finally:
+            self._record('is_dir', start)
+
+    def get_file_modification_time(self, path: str) -> datetime.datetime:
+        start: float = time.perf_counter()
+        try:
+            return self.fs_access.get_file_modification_time(path)
+        finally:
+            self._record('get_file_modification_time', start)
+
+    def get_current_date(self) -> datetime.date:
+        start: float = time.perf_counter()
+        try:
+            return self.fs_access.get_current_date()
+        finally:
+            self._record('get_current_date', start)
+
+
+# Collect the slides like collect_slides and return the stats of the scan
+def collect_slides_with_stats(slide_collection: SlidesCollection, root_dir: str, fs_access: FileSystemAccess,
+                              show_config: ShowConfig = ShowConfig(),
+                              current_date: datetime.date | None = None) -> ScanStats:
+    scan_stats: ScanStats = ScanStats()
+    start: float = time.perf_counter()
+    collect_slides(slide_collection, root_dir, show_config=show_config,
+                   fs_access=InstrumentedFileSystemAccess(fs_access, scan_stats),
+                   current_date=current_date, scan_stats=scan_stats)
+    scan_stats.total_seconds = time.perf_counter() - start
+    scan_stats.finish()
+    scan_stats.record_collection(slide_collection)
+    return scan_stats
@@ -0,0 +1,249 @@
+# Playback scheduler over a SlidesCollection: an endless sequence of slides where normal
+# slides are picked by weight and overshadow collections are interleaved at their frequency
+import math
+import heapq
+import random
+import datetime
+import itertools
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Tuple
+from config import SlidesCollection, NormalSlide, OvershadowSlideCollection, default_show_config, \
+    default_overshadow_config
+
+
+@dataclass
+class ScheduledSlide:
+    file: str
+    duration: datetime.timedelta
+    overshadow: bool = False
+
+
+# Walker/Vose alias table, samples an index with probability proportional to its weight in O(1).
+# Weights must be finite and not negative, and at least one of them positive
+class AliasTable:
+    probabilities: List[float]
+    aliases: List[int]
+
+    def __init__(self, weights: List[float]):
+        for weight in weights:
+            if not math.isfinite(weight) or weight < 0:
+                raise ValueError(f"Invalid weight {weight}, weights must be finite and not negative")
+        count: int = len(weights)
+        total: float = sum(weights)
+        if total <= 0:
+            raise ValueError("At least one weight must be positive")
+        self.probabilities = [0.0] * count
+        self.aliases = list(range(count))
+        scaled: List[float] = [weight * count / total for weight in weights]
+        small: List[int] = [idx for idx, weight in enumerate(scaled) if weight < 1.0]
+        large: List[int] = [idx for idx, weight in enumerate(scaled) if weight >= 1.0]
+        while small and large:
+            small_idx: int = small.pop()
+            large_idx: int = large[-1]
+            self.probabilities[small_idx] = scaled[small_idx]
+            self.aliases[small_idx] = large_idx
+            scaled[large_idx] -= 1.0 - scaled[small_idx]
+            if scaled[large_idx] < 1.0:
+                small.append(large.pop())
+        for idx in small + large:
+            self.probabilities[idx] = 1.0
+
+    def sample(self, rng: random.Random) -> int:
+        idx: int = rng.randrange(len(self.probabilities))
+        return idx if rng.random() < self.probabilities[idx] else self.aliases[idx]
+
+
+# The slides of one weight, with O(1) add, remove and uniform pick
+class _WeightBucket:
+    slides: List[NormalSlide]
+    positions: Dict[str, int]
+
+    def __init__(self):
+        self.slides = []
+        self.positions = {}
+
+    def add(self, slide: NormalSlide) -> None:
+        self.positions[slide.file] = len(self.slides)
+        self.slides.append(slide)
+
+    def remove(self, file: str) -> bool:
+        position: int | None = self.positions.pop(file, None)
+        if position is None:
+            return False
+        last_slide: NormalSlide = self.slides.pop()
+        if position < len(self.slides):
+            self.slides[position] = last_slide
+            self.positions[last_slide.file] = position
+        return True
+
+
+class _OvershadowEntry:
+    collection: OvershadowSlideCollection
+    position: int
+    removed: bool
+
+    def __init__(self, collection: OvershadowSlideCollection):
+        self.collection = collection
+        self.position = 0
+        self.removed = False
+
+    def frequency(self) -> int:
+        if self.collection.frequency > 0:
+            return self.collection.frequency
+        return default_overshadow_config.frequencies[0]
+
+    # The next file, collections of several files show one at a time in rotation
+    def next_slide(self) -> ScheduledSlide:
+        file: str = self.collection.files[self.position % len(self.collection.files)]
+        self.position += 1
+        return ScheduledSlide(file, self.collection.duration or default_show_config.duration, True)
+
+
+# Yields slides forever. Every slide takes one tick; an overshadow collection with
+# frequency n is due every n ticks and takes precedence over normal slides, collections
+# due at the same tick are shown on consecutive ticks. Normal slides are sampled with
+# probability proportional to their weight through an alias table over the weight
+# buckets, which only needs rebuilding (O(number of weights)) when bucket sizes change.
+# Slides with a weight that is not finite and positive are never scheduled, an error
+# message for their weight is added to errors instead
+class SlideScheduler:
+    rng: random.Random
+    tick: int
+    errors: List[str]
+    _buckets: Dict[float, _WeightBucket]
+    _bucket_weights: List[float]
+    _alias_table: AliasTable | None
+    _overshadow_queue: List[Tuple[int, int, _OvershadowEntry]]
+    _overshadow_entries: Dict[int, _OvershadowEntry]
+
+    def __init__(self, slide_collection: SlidesCollection | None = None, rng: random.Random | None = None):
+        self.rng = rng or random.Random()
+        self.tick = 0
+        self.errors = []
+        self._buckets = {}
+        self._bucket_weights = []
+        self._alias_table = None
+        self._overshadow_queue = []
+        self._overshadow_entries = {}
+        self._sequence = itertools.count()
+        if slide_collection:
+            self.sync(slide_collection)
+
+    # A bucket of a weight that could not be sampled would stop the playback
+    def _check_weight(self, weight: float) -> bool:
+        if math.isfinite(weight) and weight > 0:
+            return True
+        error: str = f"Slides with weight {weight} are not shown, weights must be finite and positive"
+        if error not in self.errors:
+            self.errors.append(error)
+        return False
+
+    def add_normal_slide(self, weight: float, slide: NormalSlide) -> None:
+        if weight not in self._buckets and not self._check_weight(weight):
+            return
+        if weight not in self._buckets:
+            self._buckets[weight] = _WeightBucket()
+        self._buckets[weight].add(slide)
+        self._alias_table = None
+
+    def remove_normal_slide(self, weight: float, file: str) -> None:
+        bucket: _WeightBucket | None = self._buckets.get(weight)
+        if bucket and bucket.remove(file):
+            if not bucket.slides:
+                del self._buckets[weight]
+            self._alias_table = None
+
+    def add_overshadow_collection(self, collection: OvershadowSlideCollection) -> None:
+        if id(collection) in self._overshadow_entries or not collection.files:
+            return
+        entry: _OvershadowEntry = _OvershadowEntry(collection)
+        self._overshadow_entries[id(collection)] = entry
+        heapq.heappush(self._overshadow_queue, (self.tick + entry.frequency(), next(self._sequence), entry))
+
+    # Removed collections are dropped lazily when they reach the top of the queue
+    def remove_overshadow_collection(self, collection: OvershadowSlideCollection) -> None:
+        entry: _OvershadowEntry | None = self._overshadow_entries.pop(id(collection), None)
+        if entry:
+            entry.removed = True
+
+    # Bring the scheduler in line with slide_collection, only applying the differences.
+    # Overshadow collections are matched by their files, so the collections of a fresh scan
+    # keep the rotation and the due tick of the ones they replace
+    def sync(self, slide_collection: SlidesCollection) -> None:
+        for weight in list(self._buckets):
+            wanted: Dict[str, NormalSlide] = {slide.file: slide
+                                              for slide in slide_collection.normal_slides.get(weight, [])}
+            for slide in list(self._buckets[weight].slides):
+                if wanted.get(slide.file) != slide:
+                    self.remove_normal_slide(weight, slide.file)
+        for weight, slides in slide_collection.normal_slides.items():
+            if not self._check_weight(weight):
+                continue
+            bucket: _WeightBucket | None = self._buckets.get(weight)
+            for slide in slides:
+                if bucket is None or slide.file not in bucket.positions:
+                    self.add_normal_slide(weight, slide)
+                    bucket = self._buckets[weight]
+
+        wanted_collections: Dict[int, OvershadowSlideCollection] = \
+            {id(collection): collection for collection in slide_collection.overshadow_slide_collections}
+        # the entries of collections that are no longer in slide_collection, by their files
+        replaced_entries: Dict[Tuple[str, ...], List[_OvershadowEntry]] = {}
+        for collection_id, entry in self._overshadow_entries.items():
+            if collection_id not in wanted_collections:
+                replaced_entries.setdefault(tuple(entry.collection.files), []).append(entry)
+        for collection in slide_collection.overshadow_slide_collections:
+            if id(collection) in self._overshadow_entries:
+                continue
+            entries: List[_OvershadowEntry] | None = replaced_entries.get(tuple(collection.files))
+            if entries:
+                entry: _OvershadowEntry = entries.pop()
+                del self._overshadow_entries[id(entry.collection)]
+                entry.collection = collection
+                self._overshadow_entries[id(collection)] = entry
+            else:
+                self.add_overshadow_collection(collection)
+        for entries in replaced_entries.values():
+            for entry in entries:
+                self.remove_overshadow_collection(entry.collection)
+
+    def _pick_normal_slide(self) -> ScheduledSlide:
+        if self._alias_table is None:
+            self._bucket_weights = list(self._buckets)
+            self._alias_table = AliasTable([weight * len(self._buckets[weight].slides)
+                                            for weight in self._bucket_weights])
+        bucket: _WeightBucket = self._buckets[self._bucket_weights[self._alias_table.sample(self.rng)]]
+        slide: NormalSlide = bucket.slides[self.rng.randrange(len(bucket.slides))]
+        return ScheduledSlide(slide.file, slide.duration or default_show_config.duration)
+
+    def _pop_overshadow_entry(self) -> _OvershadowEntry | None:
+        while self._overshadow_queue:
+            _, _, entry = heapq.heappop(self._overshadow_queue)
+            if not entry.removed:
+                if entry.collection.files:
+                    return entry
+                del self._overshadow_entries[id(entry.collection)]
+        return None
+
+    # The slide for the current tick, or None when there is nothing to show
+    def next_slide(self) -> ScheduledSlide | None:
+        self.tick += 1
+        while self._overshadow_queue and self._overshadow_queue[0][2].removed:
+            heapq.heappop(self._overshadow_queue)
+        if self._overshadow_queue and (self._overshadow_queue[0][0] <= self.tick or not self._buckets):
+            entry: _OvershadowEntry | None = self._pop_overshadow_entry()
+            if entry:
+                heapq.heappush(self._overshadow_queue,
+                               (self.tick + entry.frequency(), next(self._sequence), entry))
+                return entry.next_slide()
+        if self._buckets:
+            return self._pick_normal_slide()
+        return None
+
+    # Slides forever, ends only when the scheduler has nothing to show
+    def __iter__(self) -> Iterator[ScheduledSlide]:
+        while True:
+            slide: ScheduledSlide | None = self.next_slide()
+            if slide is None:
+                return
+            yield slide
@@ -0,0 +1,198 @@
+# Playback simulation for exposure reports: how often, and for how many seconds, every
+# slide of a SlidesCollection is shown during a time span. It follows the rules of
+# SlideScheduler: one slide per tick, an overshadow collection with frequency n is due
+# every n ticks and collections due together are shown on consecutive ticks, the other
+# ticks show a normal slide picked with probability proportional to its weight.
+# The overshadow ticks are deterministic and laid out per appearance, the normal ticks
+# are sampled with NumPy a chunk of ticks at a time. NumPy is only imported to simulate
+import csv
+import json
+import heapq
+import datetime
+import itertools
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+from config import SlidesCollection, default_show_config, default_overshadow_config
+
+SIMULATION_CHUNK_TICKS: int = 1 << 20
+
+
+# One row of the report: a normal slide, or a file of an overshadow collection
+@dataclass
+class ExposureRow:
+    file: str
+    kind: str
+    group: int
+    weight: float | None
+    duration_seconds: float
+    expected_count: float
+    sampled_count: int
+    expected_seconds: float
+    sampled_seconds: float
+
+
+@dataclass
+class ExposureReport:
+    span_seconds: float
+    ticks: int
+    normal_ticks: int
+    overshadow_ticks: int
+    rows: List[ExposureRow]
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'span_seconds': self.span_seconds,
+            'ticks': self.ticks,
+            'normal_ticks': self.normal_ticks,
+            'overshadow_ticks': self.overshadow_ticks,
+            'slides': [dict(vars(row)) for row in self.rows],
+        }
+
+    def dump_json(self, path: str) -> None:
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2)
+            file.write('\n')
+
+    def dump_csv(self, path: str) -> None:
+        with open(path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(list(ExposureRow.__dataclass_fields__))
+            for row in self.rows:
+                writer.writerow(list(vars(row).values()))
+
+
+def _seconds(duration: datetime.timedelta | None) -> float:
+    return (duration or default_show_config.duration).total_seconds()
+
+
+# The overshadow appearances of SlideScheduler, as (tick, collection index), generated
+# up to a tick at a time. Ticks start at 1 like SlideScheduler.tick
+class _OvershadowPlan:
+    def __init__(self, frequencies: List[int], always: bool):
+        self._sequence = itertools.count()
+        self._queue: List[Tuple[int, int, int]] = [(frequency, next(self._sequence), idx)
+                                                   for idx, frequency in enumerate(frequencies)]
+        heapq.heapify(self._queue)
+        self._frequencies = frequencies
+        # without normal slides, a collection is shown every tick even when it is not due
+        self._always = always
+        self._next_free_tick: int = 1
+
+    def until(self, last_tick: int) -> Tuple[List[int], List[int]]:
+        ticks: List[int] = []
+        collections: List[int] = []
+        while self._queue:
+            due, _, idx = self._queue[0]
+            tick: int = self._next_free_tick if self._always else max(due, self._next_free_tick)
+            if tick > last_tick:
+                break
+            heapq.heappop(self._queue)
+            ticks.append(tick)
+            collections.append(idx)
+            self._next_free_tick = tick + 1
+            heapq.heappush(self._queue, (tick + self._frequencies[idx], next(self._sequence), idx))
+        return ticks, collections
+
+
+# Simulate span seconds of playback of slide_collection. A slide that starts before the
+# end of the span counts as shown, its seconds are cut at the end of the span
+def simulate_exposure(slide_collection: SlidesCollection, span: datetime.timedelta, seed: int | None = None,
+                      chunk_ticks: int = SIMULATION_CHUNK_TICKS) -> ExposureReport:
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    span_seconds: float = span.total_seconds()
+
+    rows: List[ExposureRow] = []
+    normal_weights: List[float] = []
+    for weight, slides in slide_collection.normal_slides.items():
+        for slide in slides:
+            rows.append(ExposureRow(slide.file, 'normal', -1, weight, _seconds(slide.duration), 0.0, 0, 0.0, 0.0))
+            normal_weights.append(weight)
+    normal_count: int = len(rows)
+
+    # overshadow collections without files are never scheduled
+    frequencies: List[int] = []
+    group_first_row: List[int] = []
+    group_sizes: List[int] = []
+    for group, collection in enumerate(slide_collection.overshadow_slide_collections):
+        if not collection.files:
+            continue
+        frequencies.append(collection.frequency if collection.frequency > 0
+                           else default_overshadow_config.frequencies[0])
+        group_first_row.append(len(rows))
+        group_sizes.append(len(collection.files))
+        for file in collection.files:
+            rows.append(ExposureRow(file, 'overshadow', group, None, _seconds(collection.duration),
+                                    0.0, 0, 0.0, 0.0))
+
+    durations = np.array([row.duration_seconds for row in rows], dtype=np.float64)
+    sampled_counts = np.zeros(len(rows), dtype=np.int64)
+    sampled_seconds = np.zeros(len(rows), dtype=np.float64)
+    if normal_count:
+        cumulative_weights = np.cumsum(np.array(normal_weights, dtype=np.float64))
+        total_weight: float = float(cumulative_weights[-1])
+    plan: _OvershadowPlan = _OvershadowPlan(frequencies, always=normal_count == 0)
+    group_first = np.array(group_first_row, dtype=np.int64)
+    group_size = np.array(group_sizes, dtype=np.int64)
+    group_positions = np.zeros(len(frequencies), dtype=np.int64)
+
+    if not rows or span_seconds <= 0 or not durations.any():
+        return ExposureReport(span_seconds, 0, 0, 0, rows)
+    shortest_duration: float = float(durations[durations > 0].min())
+    elapsed: float = 0.0
+    ticks: int = 0
+    normal_ticks: int = 0
+    overshadow_ticks: int = 0
+    while elapsed < span_seconds:
+        # no more ticks than can fit in the rest of the span
+        size: int = min(chunk_ticks, int((span_seconds - elapsed) / shortest_duration) + 1)
+        first_tick: int = ticks + 1
+        overshadow_tick_list, overshadow_group_list = plan.until(ticks + size)
+        chunk_rows = np.empty(size, dtype=np.int64)
+        is_overshadow = np.zeros(size, dtype=bool)
+        if overshadow_tick_list:
+            offsets = np.array(overshadow_tick_list, dtype=np.int64) - first_tick
+            groups = np.array(overshadow_group_list, dtype=np.int64)
+            # collections with several files show them one at a time in rotation
+            shown = np.zeros(len(groups), dtype=np.int64)
+            for group in np.unique(groups):
+                in_group = groups == group
+                appearances: int = int(in_group.sum())
+                shown[in_group] = (group_positions[group] + np.arange(appearances)) % group_size[group]
+                group_positions[group] += appearances
+            chunk_rows[offsets] = group_first[groups] + shown
+            is_overshadow[offsets] = True
+        # without normal slides the plan fills every tick
+        normal_in_chunk: int = size - int(is_overshadow.sum())
+        if normal_in_chunk:
+            picks = np.searchsorted(cumulative_weights, rng.random(normal_in_chunk) * total_weight, side='right')
+            chunk_rows[~is_overshadow] = np.minimum(picks, normal_count - 1)
+
+        tick_durations = durations[chunk_rows]
+        ends = elapsed + np.cumsum(tick_durations)
+        starts = ends - tick_durations
+        shown_ticks: int = int(np.searchsorted(starts, span_seconds, side='left'))
+        chunk_rows = chunk_rows[:shown_ticks]
+        on_screen = np.minimum(tick_durations[:shown_ticks], span_seconds - starts[:shown_ticks])
+        sampled_counts += np.bincount(chunk_rows, minlength=len(rows))
+        sampled_seconds += np.bincount(chunk_rows, weights=on_screen, minlength=len(rows))
+        chunk_overshadow: int = int(is_overshadow[:shown_ticks].sum())
+        overshadow_ticks += chunk_overshadow
+        normal_ticks += shown_ticks - chunk_overshadow
+        ticks += shown_ticks
+        elapsed = float(ends[shown_ticks - 1]) if shown_ticks else span_seconds
+        if shown_ticks < len(ends):
+            break
+
+    # given the number of normal ticks, a normal slide is expected weight / total weight of them.
+    # The overshadow ticks do not depend on chance
+    for idx, row in enumerate(rows):
+        row.sampled_count = int(sampled_counts[idx])
+        row.sampled_seconds = float(sampled_seconds[idx])
+        if idx < normal_count:
+            row.expected_count = normal_ticks * row.weight / total_weight
+        else:
+            row.expected_count = float(row.sampled_count)
+        row.expected_seconds = row.expected_count * row.duration_seconds
+    return ExposureReport(span_seconds, ticks, normal_ticks, overshadow_ticks, rows)
@@ -0,0 +1,113 @@
+# Persistent snapshot of the slide tree, so that a rescan only re-lists and re-parses
+# the directories whose modification time changed since the previous scan. Rewriting a
+# file in place does not change the time of its directory, so the entries whose config
+# depends on their own modification time (a 4 digit @till) are looked up again
+import os
+import pickle
+import datetime
+import dataclasses
+from dataclasses import dataclass
+from typing import Dict, List, Set
+from config import FileSystemAccess, DelegatingFileSystemAccess, ScandirFileSystemAccess, DirEntryInfo, \
+    SlidesCollection, collect_slides, tokenize_file_name_for_config
+
+SNAPSHOT_VERSION: int = 1
+
+
+# The cached listing of one directory, entries keep their parsed show config
+@dataclass
+class SnapshotDirectory:
+    modification_time: datetime.datetime
+    entries: List[DirEntryInfo]
+
+
+@dataclass
+class DirectorySnapshot:
+    directories: Dict[str, SnapshotDirectory] = dataclasses.field(default_factory=dict)
+
+    # Load a snapshot file, a missing, unreadable or outdated file gives an empty snapshot
+    @classmethod
+    def load(cls, snapshot_file: str) -> 'DirectorySnapshot':
+        try:
+            with open(snapshot_file, 'rb') as file:
+                version, directories = pickle.load(file)
+        except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError, AttributeError):
+            return cls()
+        if version != SNAPSHOT_VERSION:
+            return cls()
+        return cls(directories)
+
+    # Save atomically, so that a reader never sees a partially written snapshot
+    def save(self, snapshot_file: str) -> None:
+        temp_file: str = snapshot_file + '.tmp'
+        with open(temp_file, 'wb') as file:
+            pickle.dump((SNAPSHOT_VERSION, self.directories), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, snapshot_file)
+
+
+# File system access that serves directory listings from a snapshot when the directory
+# modification time is unchanged, and records fresh listings into the snapshot otherwise
+class SnapshotFileSystemAccess(DelegatingFileSystemAccess):
+    snapshot: DirectorySnapshot
+    visited_dirs: Set[str]
+    relisted_dirs: List[str]
+    reused_dirs: List[str]
+
+    def __init__(self, fs_access: FileSystemAccess, snapshot: DirectorySnapshot):
+        super().__init__(fs_access)
+        self.snapshot = snapshot
+        self.visited_dirs = set()
+        self.relisted_dirs = []
+        self.reused_dirs = []
+
+    def list_dir(self, path: str) -> List[str]:
+        return [entry.name for entry in self.list_dir_entries(path)]
+
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        self.visited_dirs.add(path)
+        modification_time: datetime.datetime = self.fs_access.get_file_modification_time(path)
+        snapshot_dir: SnapshotDirectory | None = self.snapshot.directories.get(path)
+        if snapshot_dir and snapshot_dir.modification_time == modification_time:
+            self.reused_dirs.append(path)
+            self._refresh_dated_entries(path, snapshot_dir)
+            return snapshot_dir.entries
+        entries: List[DirEntryInfo] = self.fs_access.list_dir_entries(path)
+        self.snapshot.directories[path] = SnapshotDirectory(modification_time, entries)
+        self.relisted_dirs.append(path)
+        return entries
+
+    def _depends_on_modification_time(self, name: str) -> bool:
+        return any(token.keyword == 'till' and not token.error and len(token.value) == 4
+                   for token in tokenize_file_name_for_config(self.fs_access.get_file_main_name(name)))
+
+    # A 4 digit @till is resolved against the modification time of the entry itself
+    def _refresh_dated_entries(self, path: str, snapshot_dir: SnapshotDirectory) -> None:
+        for idx, entry in enumerate(snapshot_dir.entries):
+            if not self._depends_on_modification_time(entry.name):
+                continue
+            try:
+                modification_time: datetime.datetime = \
+                    self.fs_access.get_file_modification_time(self.fs_access.join(path, entry.name))
+            except FileNotFoundError:
+                continue
+            if modification_time != entry.modification_time:
+                snapshot_dir.entries[idx] = DirEntryInfo(entry.name, entry.is_dir, modification_time)
+
+    # Drop directories that were not reached by the last scan (deleted or renamed)
+    def prune_unvisited(self) -> None:
+        for path in list(self.snapshot.directories):
+            if path not in self.visited_dirs:
+                del self.snapshot.directories[path]
+
+
+# Collect slides like collect_slides, reusing the listings and parsed configs stored in
+# snapshot_file for unchanged directories, and write the updated snapshot back.
+# Expiry is evaluated again on every call, since it depends on the current date
+def collect_slides_incremental(slide_collection: SlidesCollection, root_dir: str, snapshot_file: str,
+                               fs_access: FileSystemAccess = ScandirFileSystemAccess()) -> int:
+    snapshot_access: SnapshotFileSystemAccess = SnapshotFileSystemAccess(
+        fs_access, DirectorySnapshot.load(snapshot_file))
+    slide_count: int = collect_slides(slide_collection, root_dir, fs_access=snapshot_access)
+    snapshot_access.prune_unvisited()
+    snapshot_access.snapshot.save(snapshot_file)
+    return slide_count
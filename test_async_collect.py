@@ -0,0 +1,82 @@
+import time
+import asyncio
+import threading
+from typing import List
+from config import SlidesCollection, DelegatingFileSystemAccess, DirEntryInfo, collect_slides
+from async_collect import AsyncFileSystemAccess, AsyncSlidesRefresher, collect_slides_async
+from benchmarks.tree_generator import generate_tree, InMemoryFileSystemAccess
+
+
+# Blocks listings until released, to keep a scan running
+class GatedFileSystemAccess(DelegatingFileSystemAccess):
+    def __init__(self, fs_access, gate: threading.Event):
+        super().__init__(fs_access)
+        self.gate = gate
+
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        self.gate.wait(5)
+        return self.fs_access.list_dir_entries(path)
+
+
+def test_collect_slides_async():
+    tree = generate_tree(5000, seed=8)
+    expected = SlidesCollection()
+    collect_slides(expected, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+
+    async def collect_with_ticker():
+        gaps = []
+        done = asyncio.Event()
+
+        async def ticker():
+            last = time.perf_counter()
+            while not done.is_set():
+                await asyncio.sleep(0.001)
+                now = time.perf_counter()
+                gaps.append(now - last)
+                last = now
+
+        ticker_task = asyncio.create_task(ticker())
+        slide_collection = SlidesCollection()
+        slide_count = await collect_slides_async(
+            slide_collection, '/mem', fs_access=AsyncFileSystemAccess(InMemoryFileSystemAccess(tree), 4))
+        done.set()
+        await ticker_task
+        return slide_collection, slide_count, gaps
+
+    slide_collection, slide_count, gaps = asyncio.run(collect_with_ticker())
+    assert slide_collection == expected
+    assert slide_count > 0
+    # the loop kept running during the scan
+    assert len(gaps) > 1
+    assert max(gaps) < 0.25
+
+
+def test_refresh_cancels_older_scan():
+    old_tree = generate_tree(300, seed=9)
+    new_tree = generate_tree(400, seed=10)
+    gate = threading.Event()
+    swapped = []
+
+    async def refresh_twice():
+        refresher = AsyncSlidesRefresher(
+            '/mem', AsyncFileSystemAccess(GatedFileSystemAccess(InMemoryFileSystemAccess(old_tree), gate)),
+            on_swap=swapped.append)
+        first_task = refresher.refresh()
+        await asyncio.sleep(0.01)
+        refresher.fs_access = AsyncFileSystemAccess(InMemoryFileSystemAccess(new_tree))
+        refresher.refresh()
+        gate.set()
+        slide_collection = await refresher.wait()
+        return first_task, slide_collection
+
+    first_task, slide_collection = asyncio.run(refresh_twice())
+    assert first_task.cancelled()
+    expected = SlidesCollection()
+    collect_slides(expected, '/mem', fs_access=InMemoryFileSystemAccess(new_tree))
+    assert swapped == [slide_collection]
+    assert slide_collection == expected
+
+
+if __name__ == '__main__':
+    test_collect_slides_async()
+    test_refresh_cancels_older_scan()
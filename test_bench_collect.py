@@ -0,0 +1,28 @@
+from config import collect_slides, SlidesCollection
+from benchmarks.tree_generator import generate_tree, count_nodes, InMemoryFileSystemAccess
+from benchmarks.bench_collect import run_suite, compare_with_baseline
+
+
+def test_generated_tree():
+    tree = generate_tree(500, seed=1)
+    assert generate_tree(500, seed=1) == tree
+    slide_collection = SlidesCollection()
+    collect_slides(slide_collection, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+    assert slide_collection.normal_slides
+    assert slide_collection.overshadow_slide_collections
+    assert count_nodes(tree) > 500
+
+
+def test_suite_and_baseline_comparison():
+    results = run_suite([300], ['memory', 'real'], seed=2)
+    assert set(results) == {'memory/300', 'real/300'}
+    assert results['memory/300']['slides'] == results['real/300']['slides']
+    assert results['memory/300']['fs_access_calls']['get_current_date'] == 1
+    assert compare_with_baseline(results, results, 0.2) == []
+    slower = {key: dict(result, wall_seconds=result['wall_seconds'] * 2) for key, result in results.items()}
+    assert len(compare_with_baseline(slower, results, 0.2)) == 2
+
+
+if __name__ == '__main__':
+    test_generated_tree()
+    test_suite_and_baseline_comparison()
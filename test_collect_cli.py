@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import tempfile
+import subprocess
+from collect_cli import main, scan_root
+
+
+def make_root(root: str, files: dict) -> None:
+    for dir_name, names in files.items():
+        os.makedirs(os.path.join(root, dir_name), exist_ok=True)
+        for name in names:
+            with open(os.path.join(root, dir_name, name), 'wb'):
+                pass
+
+
+def test_scan_roots_report():
+    with tempfile.TemporaryDirectory() as base:
+        first, second = os.path.join(base, 'venue1'), os.path.join(base, 'venue2')
+        make_root(first, {'dir1@wg2': ['slide1.jpg', 'slide2.jpg'], 'dir2@wg3': ['slide3.jpg'],
+                          'old@till01012020': ['slide4.jpg']})
+        make_root(second, {'dir1': ['slide1.jpg', 'notes.txt']})
+        report_file = os.path.join(base, 'report.json')
+        missing = os.path.join(base, 'missing')
+        assert main([first, second, missing, '--workers', '2', '--output', report_file]) == 0
+        assert main([first, second, missing, '--workers', '1', '--fail-on-error', '--output', report_file]) == 1
+        with open(report_file) as file:
+            results = json.load(file)['roots']
+
+    assert [result['root_dir'] for result in results] == [first, second, missing]
+    assert results[0]['counts']['normal_slides_by_weight'] == {'2.0': 2, '3.0': 1}
+    assert results[0]['counts']['slides'] == 3
+    assert results[0]['counts']['expired_slides'] == 1
+    assert results[0]['expired_slides'] == ['old@till01012020/slide4.jpg']
+    assert results[1]['messages'] == [{'severity': 'ERROR', 'file': 'dir1/notes.txt',
+                                       'message': 'File suffix .txt is not an image suffix'}]
+    assert 'error' in results[2]
+
+
+def test_headless_imports():
+    with tempfile.TemporaryDirectory() as root:
+        make_root(root, {'dir1': ['slide1.jpg']})
+        script = ('import sys, collect_cli\n'
+                  f'collect_cli.scan_root({root!r})\n'
+                  "print(sorted(name for name in ('kivy', 'PIL', 'numpy', 'asyncio', 'concurrent.futures')\n"
+                  '             if name in sys.modules))\n')
+        output = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+    assert output.strip() == '[]'
+
+
+if __name__ == '__main__':
+    test_scan_roots_report()
+    test_headless_imports()
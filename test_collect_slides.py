@@ -1,7 +1,10 @@
+import os
+import tempfile
 from typing import List
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from config import collect_slides, SlidesCollection, NormalSlide, FileSystemAccess, OvershadowSlideCollection
+from config import collect_slides, SlidesCollection, NormalSlide, FileSystemAccess, OvershadowSlideCollection, \
+    NormalFileSystemAccess, ScandirFileSystemAccess, LayeredShowConfig, ShowConfig, ChooseSlideConfig
 
 
 @dataclass
@@ -245,7 +248,54 @@ def test_overshadow_slides():
         slide_collection.overshadow_slide_collections, 'dir3@single6/slide7.jpg', 6, 2)
 
 
+def test_scandir_file_system_access():
+    with tempfile.TemporaryDirectory() as root:
+        for dir_name, files in [('dir1@wg2@dur5', ['slide1.jpg', 'slide2.jpg', 'notes.txt']),
+                                ('dir2@single6', ['slide3.jpg', 'slide4.jpg'])]:
+            os.makedirs(os.path.join(root, dir_name))
+            for file in files:
+                with open(os.path.join(root, dir_name, file), 'wb'):
+                    pass
+
+        normal_access = NormalFileSystemAccess()
+        scandir_access = ScandirFileSystemAccess()
+        assert sorted(scandir_access.list_dir_entries(root), key=lambda entry: entry.name) == \
+            sorted(normal_access.list_dir_entries(root), key=lambda entry: entry.name)
+
+        normal_collection = SlidesCollection()
+        collect_slides(normal_collection, root, fs_access=normal_access)
+        scandir_collection = SlidesCollection()
+        collect_slides(scandir_collection, root, fs_access=scandir_access)
+
+    assert sorted(slide.file for slide in scandir_collection.normal_slides[2.0]) == \
+        sorted(slide.file for slide in normal_collection.normal_slides[2.0])
+    assert len(scandir_collection.normal_slides[2.0]) == 3
+    assert len(scandir_collection.overshadow_slide_collections) == 1
+    assert len(scandir_collection.messages) == 1
+
+
+def test_layered_show_config():
+    base = LayeredShowConfig(None, timedelta(seconds=7))
+    # nothing to override gives the same layer
+    assert base.override(ShowConfig()) is base
+    layer = base.override(ShowConfig(specialized_config=ChooseSlideConfig(2.0)))
+    assert layer == ShowConfig(None, timedelta(seconds=7), None, ChooseSlideConfig(2.0))
+    assert base.specialized_config is None
+    try:
+        layer.duration = timedelta(seconds=1)
+        assert False
+    except AttributeError:
+        pass
+    # defaults are filled once per layer, without touching the parsed config
+    unfilled = LayeredShowConfig(specialized_config=ChooseSlideConfig())
+    assert unfilled.with_defaults() is unfilled.with_defaults()
+    assert unfilled.with_defaults().specialized_config == ChooseSlideConfig(1.0)
+    assert unfilled.specialized_config == ChooseSlideConfig()
+
+
 if __name__ == '__main__':
     test_normal_slides1()
     test_expired_slides()
     test_overshadow_slides()
+    test_scandir_file_system_access()
+    test_layered_show_config()
@@ -0,0 +1,53 @@
+import datetime
+from config import collect_slides, SlidesCollection, NormalSlide
+from compact_collection import CompactSlidesCollection, CompactSlideList, CompactFileList, PathTable
+from expiry import ExpiryIndex
+from benchmarks.tree_generator import generate_tree, InMemoryFileSystemAccess, generated_tree_date
+
+
+def test_compact_containers():
+    table = PathTable()
+    slides = CompactSlideList(table, [NormalSlide('a/b/slide1.jpg', datetime.timedelta(seconds=5)),
+                                      NormalSlide('slide2.jpg', datetime.timedelta(seconds=7))])
+    slides.append(NormalSlide('a/b/slide3.jpg', datetime.timedelta(seconds=5)))
+    assert slides == [NormalSlide('a/b/slide1.jpg', datetime.timedelta(seconds=5)),
+                      NormalSlide('slide2.jpg', datetime.timedelta(seconds=7)),
+                      NormalSlide('a/b/slide3.jpg', datetime.timedelta(seconds=5))]
+    assert list(slides.files()) == ['a/b/slide1.jpg', 'slide2.jpg', 'a/b/slide3.jpg']
+    slides[0] = slides.pop()
+    assert [slide.file for slide in slides] == ['a/b/slide3.jpg', 'slide2.jpg']
+    assert table.dir_count == 2
+
+    files = CompactFileList(table, ['a/b/slide1.jpg', 'c/slide4.jpg'])
+    assert 'c/slide4.jpg' in files
+    assert 'c/slide5.jpg' not in files and 'd/slide4.jpg' not in files
+    files.remove('a/b/slide1.jpg')
+    assert files == ['c/slide4.jpg']
+
+
+def test_compact_collection_same_view():
+    tree = generate_tree(2000, seed=4)
+    plain = SlidesCollection()
+    collect_slides(plain, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+    compact = CompactSlidesCollection()
+    collect_slides(compact, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+
+    assert compact == plain
+    assert list(compact.normal_slides) == list(plain.normal_slides)
+    assert isinstance(next(iter(compact.normal_slides.values())), CompactSlideList)
+    assert all(isinstance(collection.files, CompactFileList)
+               for collection in compact.overshadow_slide_collections)
+
+    # existing callers that change the collection keep working
+    removed_dir = plain.overshadow_slide_collections[0].files[0].rpartition('/')[0]
+    plain.remove_slides_under(removed_dir)
+    compact.remove_slides_under(removed_dir)
+    assert compact == plain
+    later_date = generated_tree_date.date() + datetime.timedelta(days=20)
+    assert ExpiryIndex(compact).expire(later_date) == ExpiryIndex(plain).expire(later_date)
+    assert compact == plain
+
+
+if __name__ == '__main__':
+    test_compact_containers()
+    test_compact_collection_same_view()
@@ -0,0 +1,113 @@
+import random
+from datetime import timedelta
+import pytest
+from config import SlidesCollection, NormalSlide
+from prefetch import DecodedImage
+from scheduler import SlideScheduler
+
+np = pytest.importorskip('numpy')
+from compositor import CROSSFADE, SLIDE, TransitionCompositor, slide_transitions
+
+
+def solid_image(file: str, width: int, height: int, value: int) -> DecodedImage:
+    return DecodedImage(file, width, height, 'rgba', bytes([value]) * (width * height * 4))
+
+
+def random_image(file: str, width: int, height: int, seed: int) -> DecodedImage:
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 4), dtype=np.uint8)
+    return DecodedImage(file, width, height, 'rgba', pixels.tobytes())
+
+
+def test_crossfade_and_slide():
+    compositor = TransitionCompositor(64, 32, duration=1.0, frame_budget=10.0, max_frames=3)
+    first, second = random_image('a.jpg', 64, 32, 1), random_image('b.jpg', 64, 32, 2)
+    transition = compositor.composite(first, second, CROSSFADE)
+    assert len(transition.frames) == 3
+    assert transition.frame_interval == 0.25
+    from_pixels = np.frombuffer(first.pixels, dtype=np.uint8).reshape(32, 64, 4).astype(np.float64)
+    to_pixels = np.frombuffer(second.pixels, dtype=np.uint8).reshape(32, 64, 4).astype(np.float64)
+    for idx, frame in enumerate(transition.frames):
+        alpha = ((idx + 1) * 128 // 4) / 128
+        expected = from_pixels + (to_pixels - from_pixels) * alpha
+        assert np.abs(frame - expected).max() <= 1.0
+
+    transition = compositor.composite(first, second, SLIDE)
+    middle = transition.frames[1]
+    assert (middle[:, :32] == from_pixels[:, 32:]).all()
+    assert (middle[:, 32:] == to_pixels[:, :32]).all()
+    assert bytes(next(transition.decoded_frames('b.jpg')).pixels) == transition.frames[0].tobytes()
+
+
+def test_fit_to_display():
+    compositor = TransitionCompositor(8, 8, max_frames=1, min_frames=1)
+    target = np.empty((8, 8, 4), dtype=np.uint8)
+    compositor.fit(solid_image('small.jpg', 4, 2, 200), target)
+    assert (target[3:5, 2:6] == 200).all()
+    assert (target[0, 0] == [0, 0, 0, 255]).all()
+    compositor.fit(random_image('large.jpg', 12, 10, 3), target)
+    large = np.frombuffer(random_image('large.jpg', 12, 10, 3).pixels, dtype=np.uint8).reshape(10, 12, 4)
+    assert (target == large[1:9, 2:10]).all()
+
+
+def test_frame_budget():
+    now = [0.0]
+    compositor = TransitionCompositor(16, 16, frame_budget=0.01, max_frames=20, min_frames=2, clock=lambda: now[0])
+    image = solid_image('a.jpg', 16, 16, 10)
+    buffers = [id(frame) for frame in compositor.composite(image, image).frames]
+
+    # every frame takes 0.02 s to composite, twice the budget: half the frames fit
+    def slow_clock():
+        now[0] += 0.02 * compositor.frame_count
+        return now[0]
+    compositor.clock = slow_clock
+    compositor.composite(image, image)
+    assert compositor.frame_count == 10
+    compositor.composite(image, image)
+    assert compositor.frame_count == 10
+    compositor.min_frames = 12
+    compositor.composite(image, image)
+    assert compositor.frame_count == 12
+    # the frames are the same buffers every time
+    assert [id(frame) for frame in compositor.composite(image, image).frames] == buffers[:12]
+
+    compositor.clock = lambda: now[0]
+    compositor.composite(image, image)
+    assert compositor.frame_count == 20
+
+
+def test_slide_transitions():
+    slide_collection = SlidesCollection()
+    slide_collection.normal_slides[1.0] = [NormalSlide('a.jpg', timedelta(seconds=5)),
+                                           NormalSlide('b.jpg', timedelta(seconds=5))]
+    images = {'a.jpg': solid_image('a.jpg', 4, 4, 0), 'b.jpg': solid_image('b.jpg', 4, 4, 255)}
+    compositor = TransitionCompositor(4, 4, frame_budget=10.0, max_frames=4)
+    scheduler = SlideScheduler(slide_collection, random.Random(1))
+    slides = [next(iter(scheduler)) for _ in range(6)]
+    shown = []
+    # the frames are only valid until the next transition
+    for (slide, transition), previous in zip(slide_transitions(slides, images.__getitem__, compositor), slides):
+        shown.append(slide.file)
+        first_frame = transition.frames[0]
+        if previous.file == slide.file:
+            assert (first_frame == images[slide.file].pixels[0]).all()
+        else:
+            assert 0 < first_frame[0, 0, 0] < 255
+    assert shown == [slide.file for slide in slides[1:]]
+
+
+def test_invalid_frame_counts():
+    for min_frames, max_frames in [(0, 30), (5, 4), (2, 0)]:
+        try:
+            TransitionCompositor(8, 6, min_frames=min_frames, max_frames=max_frames)
+            assert False
+        except ValueError:
+            pass
+    assert TransitionCompositor(8, 6, min_frames=1, max_frames=1).frame_count == 1
+
+
+if __name__ == '__main__':
+    test_crossfade_and_slide()
+    test_fit_to_display()
+    test_frame_budget()
+    test_slide_transitions()
+    test_invalid_frame_counts()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import pytest
+from decode_worker import DecoderClient, DecodeWorkerError
+from benchmarks.bench_decode_worker import FRAME_HEADER, run_harness, synthetic_decode, synthetic_file
+
+
+def test_frames_through_shared_memory():
+    result = run_harness(60, 64, 48, slot_count=2)
+    assert result['corrupted_frames'] == []
+    assert result['frames_per_second'] > 0
+
+
+def test_slot_ownership_and_errors():
+    with DecoderClient(2, 32 * 32 * 4, synthetic_decode) as decoder:
+        first = decoder.get(synthetic_file(1, 32, 32), timeout=30)
+        second = decoder.get(synthetic_file(2, 32, 32), timeout=30)
+        assert {first.slot, second.slot} == {0, 1}
+        # both slots are held by the display, the worker waits for one of them
+        decoder.prefetch([synthetic_file(3, 32, 32)])
+        try:
+            decoder.get(synthetic_file(3, 32, 32), timeout=0.5)
+            assert False
+        except TimeoutError:
+            pass
+        assert FRAME_HEADER.unpack_from(first.pixels, 0) == (1, 32, 32)
+        decoder.release(first)
+        third = decoder.get(synthetic_file(3, 32, 32), timeout=30)
+        assert third.slot == first.slot
+        assert FRAME_HEADER.unpack_from(third.pixels, 0) == (3, 32, 32)
+        assert third.pixels[-1] == 3
+
+        # a frame larger than a slot and a failing decode are reported, the worker goes on
+        decoder.release(second)
+        for file in [synthetic_file(4, 64, 64), 'not a frame']:
+            try:
+                decoder.get(file, timeout=30)
+                assert False
+            except DecodeWorkerError:
+                pass
+        assert decoder.get(synthetic_file(5, 32, 32), timeout=30).width == 32
+
+
+def test_changing_schedule():
+    files = [synthetic_file(index, 32, 32) for index in range(8)]
+    with DecoderClient(2, 32 * 32 * 4, synthetic_decode) as decoder:
+        # the upcoming slides changed, the frames nobody fetched are evicted oldest first
+        decoder.prefetch(files[0:2])
+        frame = decoder.get(files[2], timeout=30)
+        assert FRAME_HEADER.unpack_from(frame.pixels, 0) == (2, 32, 32)
+        assert files[0] not in decoder._requested
+        decoder.release(frame)
+
+        # discarded and cancelled files give their slots back, ready or not
+        decoder.prefetch(files[3:5])
+        decoder.discard(files[3])
+        decoder.cancel()
+        assert not decoder._requested
+        held = [decoder.get(file, timeout=30) for file in files[5:7]]
+        assert [FRAME_HEADER.unpack_from(frame.pixels, 0)[0] for frame in held] == [5, 6]
+        for frame in held:
+            decoder.release(frame)
+        # a file requested again after being discarded is decoded once more
+        decoder.prefetch([files[7]])
+        decoder.discard(files[7])
+        assert decoder.get(files[7], timeout=30).pixels[-1] == 7
+
+
+def test_files_relative_to_root_dir():
+    Image = pytest.importorskip('PIL.Image')
+    with tempfile.TemporaryDirectory() as root_dir:
+        Image.new('RGB', (4, 3), (10, 200, 10)).save(os.path.join(root_dir, 'slide.png'))
+        with DecoderClient(1, 4 * 3 * 4, root_dir=root_dir) as decoder:
+            frame = decoder.get('slide.png', timeout=30)
+            assert (frame.file, frame.width, frame.height) == ('slide.png', 4, 3)
+            decoder.release(frame)
+
+
+if __name__ == '__main__':
+    test_frames_through_shared_memory()
+    test_slot_ownership_and_errors()
+    test_changing_schedule()
+    test_files_relative_to_root_dir()
@@ -0,0 +1,107 @@
+from datetime import datetime, date
+from config import collect_slides, SlidesCollection, NormalSlide, OvershadowSlideCollection
+from expiry import ExpiryIndex
+from test_collect_slides import FileSim, TestFileSystemAccess
+
+
+def test_expire_at_date_boundaries():
+    file_date = datetime(2022, 1, 2)
+    root = FileSim('/root/aaa/', True, file_date, [
+        FileSim('dir1@wg2', True, file_date, [
+            FileSim('slide1@till0501.jpg', False, file_date),
+            FileSim('slide2.jpg', False, file_date),
+            FileSim('slide3@till1001.jpg', False, file_date)
+        ]),
+        FileSim('dir2@till0701@single6', True, file_date, [
+            FileSim('slide4.jpg', False, file_date),
+            FileSim('slide5.jpg', False, file_date)
+        ]),
+        FileSim('dir3@all5', True, file_date, [
+            FileSim('slide6@till0501.jpg', False, file_date)
+        ])
+    ])
+    slide_collection = SlidesCollection()
+    collect_slides(slide_collection, '/root/aaa/', fs_access=TestFileSystemAccess(root, file_date))
+    assert len(slide_collection.expire_dates) == 5
+
+    expiry_index = ExpiryIndex(slide_collection)
+    assert expiry_index.next_boundary() == date(2022, 1, 6)
+    assert expiry_index.expire(date(2022, 1, 5)) == []
+
+    assert sorted(expiry_index.expire(date(2022, 1, 6))) == ['dir1@wg2/slide1@till0501.jpg',
+                                                             'dir3@all5/slide6@till0501.jpg']
+    # the same slides in the same order as a scan on that date
+    assert [slide.file for slide in slide_collection.normal_slides[2.0]] == \
+        ['dir1@wg2/slide2.jpg', 'dir1@wg2/slide3@till1001.jpg']
+    assert len(slide_collection.overshadow_slide_collections) == 1
+    scanned = SlidesCollection()
+    collect_slides(scanned, '/root/aaa/', fs_access=TestFileSystemAccess(root, file_date),
+                   current_date=date(2022, 1, 6))
+    assert slide_collection.normal_slides == scanned.normal_slides
+    assert slide_collection.overshadow_slide_collections == scanned.overshadow_slide_collections
+    assert expiry_index.next_boundary() == date(2022, 1, 8)
+
+    assert len(expiry_index.expire(date(2022, 1, 8))) == 2
+    assert slide_collection.overshadow_slide_collections == []
+
+    # a slide removed from the collection in the meantime is skipped
+    slide_collection.remove_slide('dir1@wg2/slide3@till1001.jpg')
+    assert expiry_index.next_boundary() is None
+    assert expiry_index.expire(date(2022, 2, 1)) == []
+    assert [slide.file for slide in slide_collection.normal_slides[2.0]] == ['dir1@wg2/slide2.jpg']
+    assert len(slide_collection.expired_slides) == 4
+
+
+def test_add_after_index_built():
+    slide_collection = SlidesCollection()
+    slide_collection.normal_slides[1.0] = [NormalSlide('a.jpg', None)]
+    expiry_index = ExpiryIndex(slide_collection)
+    slide_collection.normal_slides[1.0].append(NormalSlide('b.jpg', None))
+    expiry_index.add('b.jpg', datetime(2022, 3, 1))
+    assert expiry_index.expire(date(2022, 3, 2)) == ['b.jpg']
+    assert slide_collection.expired_slides == ['b.jpg']
+    assert [slide.file for slide in slide_collection.normal_slides[1.0]] == ['a.jpg']
+
+
+def test_overshadow_rotation_order_kept():
+    file_date = datetime(2022, 1, 2)
+    root = FileSim('/root/aaa/', True, file_date, [
+        FileSim(f'dir{idx}@till{till}@single{idx + 2}', True, file_date, [FileSim('slide.jpg', False, file_date)])
+        for idx, till in enumerate(['2001', '1001', '2001', '2001'])
+    ])
+    slide_collection = SlidesCollection()
+    collect_slides(slide_collection, '/root/aaa/', fs_access=TestFileSystemAccess(root, file_date))
+    expiry_index = ExpiryIndex(slide_collection)
+    assert expiry_index.expire(date(2022, 1, 11)) == ['dir1@till1001@single3/slide.jpg']
+    assert [collection.frequency for collection in slide_collection.overshadow_slide_collections] == [2, 4, 5]
+    assert expiry_index.expire(date(2022, 1, 21)) == ['dir0@till2001@single2/slide.jpg',
+                                                     'dir2@till2001@single4/slide.jpg',
+                                                     'dir3@till2001@single5/slide.jpg']
+    assert slide_collection.overshadow_slide_collections == []
+
+
+def test_many_slides_expire_on_one_boundary():
+    slide_collection = SlidesCollection()
+    slide_collection.normal_slides[1.0] = [NormalSlide(f'slide{idx}.jpg', None) for idx in range(1000)]
+    slide_collection.overshadow_slide_collections.append(OvershadowSlideCollection(['o1.jpg', 'o2.jpg'], 3, None))
+    for idx in range(0, 1000, 2):
+        slide_collection.set_expire_date(f'slide{idx}.jpg', datetime(2022, 3, 1))
+    slide_collection.set_expire_date('o1.jpg', datetime(2022, 3, 1))
+    slide_collection.set_expire_date('o2.jpg', datetime(2022, 3, 1))
+    expiry_index = ExpiryIndex(slide_collection)
+    # a slide moved to another bucket without the index is still found
+    slide_collection.normal_slides[2.0] = [slide_collection.normal_slides[1.0].pop(998)]
+
+    assert len(expiry_index.expire(date(2022, 3, 2))) == 502
+    assert [slide.file for slide in slide_collection.normal_slides[1.0]] == \
+        [f'slide{idx}.jpg' for idx in range(1, 1000, 2)]
+    assert list(slide_collection.normal_slides) == [1.0]
+    assert slide_collection.overshadow_slide_collections == []
+    assert slide_collection.expire_dates == {}
+
+
+if __name__ == '__main__':
+    test_expire_at_date_boundaries()
+    test_add_after_index_built()
+    test_overshadow_rotation_order_kept()
+    test_many_slides_expire_on_one_boundary()
@@ -0,0 +1,111 @@
+import datetime
+from config import SlidesCollection, Severity, collect_slides, default_show_config
+from indexed_collection import IndexedSlidesCollection
+from expiry import ExpiryIndex
+from benchmarks.tree_generator import generate_tree, InMemoryFileSystemAccess, generated_tree_date
+
+
+def all_slides(slide_collection: SlidesCollection) -> dict:
+    slides = {}
+    for weight, normal_slides in slide_collection.normal_slides.items():
+        for slide in normal_slides:
+            slides[slide.file] = (weight, slide.duration or default_show_config.duration)
+    for collection in slide_collection.overshadow_slide_collections:
+        for file in collection.files:
+            slides[file] = (None, collection.duration or default_show_config.duration)
+    return slides
+
+
+def test_indexed_queries():
+    tree = generate_tree(3000, seed=7)
+    indexed = IndexedSlidesCollection()
+    collect_slides(indexed, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+    plain = SlidesCollection()
+    collect_slides(plain, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+    assert indexed == plain
+
+    slides = all_slides(plain)
+    assert set(indexed.slides) == set(slides)
+    directory = tree.children[0].name
+    assert sorted(slide.file for slide in indexed.slides_under(directory)) == \
+        sorted(file for file in slides if file.startswith(directory + '/'))
+    assert sorted(slide.file for slide in indexed.find_slides(min_weight=2.0)) == \
+        sorted(file for file, (weight, _) in slides.items() if weight is not None and weight >= 2.0)
+    assert sorted(slide.file for slide in indexed.find_slides(under=directory, max_duration=datetime.timedelta(
+        seconds=10))) == sorted(file for file, (_, duration) in slides.items()
+                                if file.startswith(directory + '/') and duration <= datetime.timedelta(seconds=10))
+
+    week_start = generated_tree_date
+    week_end = week_start + datetime.timedelta(days=7)
+    expiring = sorted(file for file, expire_date in plain.expire_dates.items()
+                      if file in slides and week_start <= expire_date <= week_end)
+    assert expiring
+    assert sorted(slide.file for slide in indexed.slides_expiring(week_start, week_end)) == expiring
+
+    assert indexed.messages_with_severity(Severity.ERROR) == \
+        [message for message in plain.messages if message.severity == Severity.ERROR]
+    message_dir = plain.messages[0].file.split('/')[0]
+    assert sorted(indexed.messages_under(message_dir, Severity.ERROR), key=lambda message: message.file) == \
+        sorted((message for message in plain.messages if message.file.startswith(message_dir + '/')),
+               key=lambda message: message.file)
+    assert sorted(indexed.expired_slides_under('')) == sorted(plain.expired_slides)
+
+    # removing a directory or a file brings the indexes in line
+    indexed.remove_slides_under(directory)
+    assert indexed.slides_under(directory) == []
+    assert len(indexed.slides) == len(slides) - sum(file.startswith(directory + '/') for file in slides)
+    removed_file = next(iter(indexed.slides))
+    indexed.remove_slide(removed_file)
+    indexed.remove_slide(plain.messages[-1].file)
+    indexed.remove_files_matching(lambda file: file.endswith('7.jpg'))
+    assert removed_file not in indexed.slides
+    rebuilt = IndexedSlidesCollection()
+    collect_slides(rebuilt, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+    rebuilt.remove_slides_under(directory)
+    rebuilt.remove_files_matching(lambda file: file in (removed_file, plain.messages[-1].file) or
+                                  file.endswith('7.jpg'))
+    rebuilt.rebuild_indexes()
+    assert indexed == rebuilt
+
+    def query_results(slide_collection: IndexedSlidesCollection) -> tuple:
+        return (sorted(slide.file for slide in slide_collection.find_slides()),
+                sorted(slide.file for slide in slide_collection.slides_under('')),
+                sorted(slide.file for slide in slide_collection.find_slides(min_weight=2.0)),
+                sorted(slide.file for slide in slide_collection.find_slides(min_duration=datetime.timedelta())),
+                sorted(slide.file for slide in slide_collection.slides_expiring(None, None)),
+                sorted(slide_collection.expired_slides_under('')),
+                sorted(message.file for message in slide_collection.messages_under('')),
+                sorted(message.file for message in slide_collection.messages_with_severity(Severity.ERROR)),
+                slide_collection.slides_by_directory.count_under(''),
+                slide_collection.slides_by_weight.values_between())
+
+    assert query_results(indexed) == query_results(rebuilt)
+
+
+def test_expired_slides_leave_indexes():
+    tree = generate_tree(3000, seed=7)
+    indexed = IndexedSlidesCollection()
+    collect_slides(indexed, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+    expiry_index = ExpiryIndex(indexed)
+    boundary = expiry_index.next_boundary()
+    expired_files = expiry_index.expire(boundary)
+    assert expired_files
+    for file in expired_files:
+        assert file not in indexed.slides
+        assert file not in [slide.file for slide in indexed.find_slides(under=file.split('/')[0])]
+        assert file in indexed.expired_slides_under(file.split('/')[0])
+    assert not any(slide.file in expired_files for slide in indexed.slides_expiring(None, None))
+
+    # the indexes are those of the collection rebuilt from its contents
+    rebuilt = IndexedSlidesCollection(normal_slides=indexed.normal_slides,
+                                      overshadow_slide_collections=indexed.overshadow_slide_collections,
+                                      expired_slides=indexed.expired_slides, expire_dates=indexed.expire_dates,
+                                      messages=indexed.messages)
+    assert sorted(indexed.slides) == sorted(rebuilt.slides)
+    assert sorted(slide.file for slide in indexed.slides_expiring(None, None)) == \
+        sorted(slide.file for slide in rebuilt.slides_expiring(None, None))
+
+
+if __name__ == '__main__':
+    test_indexed_queries()
+    test_expired_slides_leave_indexes()
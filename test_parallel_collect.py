@@ -0,0 +1,67 @@
+import time
+from typing import List
+from datetime import datetime
+from config import collect_slides, SlidesCollection
+from parallel_collect import collect_slides_parallel
+from test_collect_slides import FileSim, TestFileSystemAccess
+
+
+# Simulates a network share where every call costs a round-trip
+class LatencyFileSystemAccess(TestFileSystemAccess):
+    latency: float
+
+    def __init__(self, root: FileSim, current_date: datetime, latency: float):
+        super().__init__(root, current_date)
+        self.latency = latency
+
+    def list_dir(self, path: str) -> List[str]:
+        time.sleep(self.latency)
+        return super().list_dir(path)
+
+    def is_dir(self, path: str) -> bool:
+        time.sleep(self.latency)
+        return super().is_dir(path)
+
+    def get_file_modification_time(self, path: str) -> datetime:
+        time.sleep(self.latency)
+        return super().get_file_modification_time(path)
+
+
+def make_tree(date: datetime) -> FileSim:
+    modes = ['@wg2', '@all5_7', '@single6', '@dur9', '@maxfiles2']
+    return FileSim('/root/aaa/', True, date, [
+        FileSim(f'dir{i}{modes[i % len(modes)]}', True, date, [
+            FileSim(f'sub{j}', True, date, [
+                FileSim(f'slide{k}.jpg', False, date) for k in range(3)
+            ]) for j in range(2)
+        ] + [FileSim('slide.jpg', False, date), FileSim('notes.txt', False, date)])
+        for i in range(10)
+    ])
+
+
+def test_parallel_collect_matches_sequential():
+    date = datetime(2022, 1, 2)
+    root = make_tree(date)
+
+    sequential_access = LatencyFileSystemAccess(root, date, 0.002)
+    start = time.perf_counter()
+    sequential_collection = SlidesCollection()
+    sequential_count = collect_slides(sequential_collection, '/root/aaa/', fs_access=sequential_access)
+    sequential_time = time.perf_counter() - start
+
+    parallel_access = LatencyFileSystemAccess(root, date, 0.002)
+    start = time.perf_counter()
+    parallel_collection = SlidesCollection()
+    parallel_count = collect_slides_parallel(parallel_collection, '/root/aaa/', parallel_access, max_workers=16)
+    parallel_time = time.perf_counter() - start
+
+    # same slides, in the same order
+    assert parallel_count == sequential_count
+    assert parallel_collection == sequential_collection
+    assert len(parallel_collection.overshadow_slide_collections) > 0
+    assert len(parallel_collection.messages) > 0
+    assert parallel_time < sequential_time / 2
+
+
+if __name__ == '__main__':
+    test_parallel_collect_matches_sequential()
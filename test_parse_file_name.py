@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from config import parse_file_name_for_config, expire_date_from_file_date_and_string, ShowConfig, \
+    ChooseSlideConfig, OvershadowConfig
+from benchmarks.legacy_parser import legacy_parse_file_name_for_config
+
+
+file_names = [
+    'slide', 'slide@wg2', 'dir@WG1_5@DUR7', 'dir@all8_10_12', 'dir@single6', 'dir@maxfiles3@dur10',
+    'x@till0101', 'x@till3112', 'x@till290222', 'x@till01012023', 'x@till010', 'x@till3102',
+    'x@till1313', 'x@till321299', 'x@tillabcd', 'x@durx', 'x@wg', 'x@all', 'x@all5_', 'x@single',
+    'x@wg1@wg2', 'x@all5@single3', 'x@wg2@all5', 'x@single4@wg3', 'x@unknown@dur3', 'x@@dur4',
+    'x@till0101@wg3_25@maxfiles2', 'x@single2x@wg1',
+]
+file_dates = [datetime(2022, 1, 2), datetime(2022, 12, 30, 23, 59), datetime(2024, 2, 28)]
+
+
+def parse_or_error(parse, file_name: str, file_date: datetime) -> ShowConfig | str:
+    try:
+        return parse(file_name, file_date)
+    except ValueError as error:
+        return 'error: ' + str(error)
+
+
+def test_same_result_as_legacy_parser():
+    for file_date in file_dates:
+        for file_name in file_names:
+            # parse twice, the second time comes from the caches
+            for _ in range(2):
+                assert parse_or_error(parse_file_name_for_config, file_name, file_date) == \
+                    parse_or_error(legacy_parse_file_name_for_config, file_name, file_date), file_name
+
+
+def test_parse_file_name_for_config():
+    date = datetime(2022, 1, 2)
+    assert parse_file_name_for_config('dir@wg1_5@dur7', date) == \
+        ShowConfig(None, timedelta(seconds=7), None, ChooseSlideConfig(1.5))
+    assert parse_file_name_for_config('dir@all5_7@till0501', date) == \
+        ShowConfig(datetime(2022, 1, 5), None, None, OvershadowConfig([5, 7], False))
+    # results are not shared between calls
+    first = parse_file_name_for_config('dir@single6', date)
+    first.specialized_config.frequencies.append(9)
+    assert parse_file_name_for_config('dir@single6', date).specialized_config.frequencies == [6]
+
+
+def test_expire_date_depends_on_file_date():
+    assert expire_date_from_file_date_and_string(datetime(2022, 12, 30), '0501') == datetime(2023, 1, 5)
+    assert expire_date_from_file_date_and_string(datetime(2022, 1, 2), '0501') == datetime(2022, 1, 5)
+    assert expire_date_from_file_date_and_string(datetime(2022, 1, 2), '3012') == datetime(2021, 12, 30)
+
+
+if __name__ == '__main__':
+    test_same_result_as_legacy_parser()
+    test_parse_file_name_for_config()
+    test_expire_date_depends_on_file_date()
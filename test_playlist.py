@@ -0,0 +1,110 @@
+import os
+import datetime
+import tempfile
+from config import SlidesCollection, collect_slides
+from compact_collection import CompactSlidesCollection
+from playlist import PlaylistFile, PlaylistError, compile_playlist, load_playlist
+from benchmarks.tree_generator import SimNode, generate_tree, InMemoryFileSystemAccess, generated_tree_date
+
+
+def test_compile_and_load_playlist():
+    tree = generate_tree(1500, seed=5)
+    fs_access = InMemoryFileSystemAccess(tree)
+    with tempfile.TemporaryDirectory() as playlist_dir:
+        playlist_file = os.path.join(playlist_dir, 'slides.playlist')
+        collected = compile_playlist(playlist_file, '/mem', fs_access=fs_access)
+
+        with PlaylistFile(playlist_file) as playlist:
+            assert playlist.scan_date == generated_tree_date.date()
+            assert not playlist.is_stale(fs_access)
+            normal_slides = playlist.normal_slides()
+            assert list(normal_slides) == list(collected.normal_slides)
+            for weight, slides in normal_slides.items():
+                assert slides[-1] == collected.normal_slides[weight][-1]
+                assert len(slides) == len(collected.normal_slides[weight])
+            # expiry makes the playlist stale
+            assert playlist.is_stale(fs_access, playlist.first_expiry)
+            assert playlist.is_stale(fs_access, playlist.scan_date - datetime.timedelta(days=1))
+
+        loaded = SlidesCollection()
+        assert load_playlist(loaded, playlist_file, '/mem', fs_access=fs_access)
+        assert loaded == collected
+        compact = CompactSlidesCollection()
+        assert load_playlist(compact, playlist_file, '/mem', fs_access=fs_access)
+        assert compact == collected
+
+        # a new slide changes the modification time of its directory
+        directory = tree.children[0]
+        directory.children.append(SimNode('new_slide.jpg', False, generated_tree_date))
+        directory.modification_time = generated_tree_date + datetime.timedelta(minutes=1)
+        fs_access = InMemoryFileSystemAccess(tree)
+        rescanned = SlidesCollection()
+        assert not load_playlist(rescanned, playlist_file, '/mem', fs_access=fs_access)
+        expected = SlidesCollection()
+        collect_slides(expected, '/mem', fs_access=fs_access)
+        assert rescanned == expected
+        with PlaylistFile(playlist_file) as playlist:
+            assert not playlist.is_stale(fs_access)
+
+
+# Adds a slide to a directory right after it was listed, as if it was copied in during the scan
+class ChangingFileSystemAccess(InMemoryFileSystemAccess):
+    def list_dir_entries(self, path):
+        entries = super().list_dir_entries(path)
+        node = self._node(path)
+        if node.name == 'changing':
+            node.children.append(SimNode('late_slide.jpg', False, generated_tree_date))
+            node.modification_time = generated_tree_date + datetime.timedelta(minutes=1)
+        return entries
+
+
+def test_directory_changed_during_scan():
+    tree = SimNode('mem', True, generated_tree_date, [
+        SimNode('changing', True, generated_tree_date, [SimNode('slide1.jpg', False, generated_tree_date)])])
+    fs_access = ChangingFileSystemAccess(tree)
+    with tempfile.TemporaryDirectory() as playlist_dir:
+        playlist_file = os.path.join(playlist_dir, 'slides.playlist')
+        collected = compile_playlist(playlist_file, '/mem', fs_access=fs_access)
+        assert [slide.file for slide in collected.normal_slides[1.0]] == ['changing/slide1.jpg']
+        # the stored time is that of the listed contents, the late slide is picked up next time
+        with PlaylistFile(playlist_file) as playlist:
+            assert playlist.is_stale(fs_access)
+
+
+def test_invalid_playlist():
+    with tempfile.TemporaryDirectory() as playlist_dir:
+        playlist_file = os.path.join(playlist_dir, 'slides.playlist')
+        with open(playlist_file, 'wb') as file:
+            file.write(b'not a playlist at all, just some bytes' * 4)
+        try:
+            PlaylistFile(playlist_file)
+            assert False
+        except PlaylistError:
+            pass
+        # an invalid playlist is compiled again
+        tree = generate_tree(100, seed=6)
+        slide_collection = SlidesCollection()
+        assert not load_playlist(slide_collection, playlist_file, '/mem',
+                                 fs_access=InMemoryFileSystemAccess(tree))
+        with PlaylistFile(playlist_file) as playlist:
+            assert playlist.section_count(0) > 0
+
+        # a playlist cut short is rejected and compiled again
+        with open(playlist_file, 'rb') as file:
+            content = file.read()
+        with open(playlist_file, 'wb') as file:
+            file.write(content[:len(content) // 2])
+        try:
+            PlaylistFile(playlist_file)
+            assert False
+        except PlaylistError:
+            pass
+        truncated = SlidesCollection()
+        assert not load_playlist(truncated, playlist_file, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+        assert truncated == slide_collection
+
+
+if __name__ == '__main__':
+    test_compile_and_load_playlist()
+    test_directory_changed_during_scan()
+    test_invalid_playlist()
@@ -0,0 +1,121 @@
+import os
+import time
+import tempfile
+import threading
+from datetime import timedelta
+from typing import List
+import pytest
+from prefetch import DecodedImage, FrameCache, PrefetchPipeline, prefetched_slides
+from scheduler import ScheduledSlide
+
+
+class FakeDecoder:
+    delay: float
+    decoded_files: List[str]
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.decoded_files = []
+        self._lock = threading.Lock()
+
+    def __call__(self, file: str) -> DecodedImage:
+        time.sleep(self.delay)
+        with self._lock:
+            self.decoded_files.append(file)
+        return DecodedImage(file, 10, 10, 'rgba', bytes(400))
+
+
+def test_frame_cache_byte_budget():
+    cache = FrameCache(1000)
+    for name in ['a', 'b']:
+        assert cache.put(DecodedImage(name, 10, 10, 'rgba', bytes(400))) == 0
+    cache.get('a')
+    # b is the least recently used one
+    assert cache.put(DecodedImage('c', 10, 10, 'rgba', bytes(400))) == 1
+    assert 'a' in cache and 'c' in cache and 'b' not in cache
+    assert cache.used_bytes == 800
+    # larger than the whole budget, not cached
+    assert cache.put(DecodedImage('d', 100, 100, 'rgba', bytes(4000))) == 0
+    assert 'd' not in cache and cache.used_bytes == 800
+
+
+def test_read_ahead_decodes_before_use():
+    decoder = FakeDecoder(0.01)
+    pipeline = PrefetchPipeline(decoder, byte_budget=2000, max_workers=4)
+    slides = [ScheduledSlide(f'slide{i % 8}.jpg', timedelta(seconds=5)) for i in range(16)]
+    try:
+        for slide, decoded in prefetched_slides(slides, pipeline, read_ahead=3):
+            assert decoded.file == slide.file
+            # the display takes a while with every slide
+            time.sleep(0.02)
+    finally:
+        pipeline.close()
+    # only the first slide is waited for, and the budget holds 5 frames
+    assert pipeline.stats.misses == 1
+    assert pipeline.stats.hits == 15
+    assert pipeline.stats.hit_rate > 0.9
+    assert pipeline.cache.used_bytes <= 2000
+    assert pipeline.stats.evictions > 0
+    assert 0.01 <= pipeline.stats.mean_decode_seconds <= pipeline.stats.max_decode_seconds
+
+
+def test_failed_decode_is_retried_and_skipped():
+    failing_files = {'bad.jpg'}
+    decoded_files = []
+
+    def decode(file: str) -> DecodedImage:
+        decoded_files.append(file)
+        if file in failing_files:
+            raise OSError(f'cannot identify image file {file}')
+        return DecodedImage(file, 10, 10, 'rgba', bytes(400))
+
+    pipeline = PrefetchPipeline(decode, byte_budget=2000)
+    try:
+        pipeline.prefetch(['bad.jpg'])
+        try:
+            pipeline.get('bad.jpg')
+            assert False
+        except OSError:
+            pass
+        # the failure is not kept, a later prefetch decodes the file again
+        pipeline.prefetch(['bad.jpg'])
+        try:
+            pipeline.get('bad.jpg')
+            assert False
+        except OSError:
+            pass
+        assert decoded_files.count('bad.jpg') >= 2
+        assert pipeline.stats.failed_decodes == decoded_files.count('bad.jpg')
+
+        slides = [ScheduledSlide(file, timedelta(seconds=5)) for file in ['a.jpg', 'bad.jpg', 'b.jpg', 'bad.jpg']]
+        assert [slide.file for slide, _ in prefetched_slides(slides, pipeline)] == ['a.jpg', 'b.jpg']
+        # once the file is fixed it shows again
+        failing_files.clear()
+        assert [slide.file for slide, _ in prefetched_slides(slides, pipeline)] == [slide.file for slide in slides]
+    finally:
+        pipeline.close()
+
+
+def test_files_relative_to_root_dir():
+    Image = pytest.importorskip('PIL.Image')
+    with tempfile.TemporaryDirectory() as root_dir:
+        os.makedirs(os.path.join(root_dir, 'venue'))
+        Image.new('RGB', (6, 4), (200, 10, 10)).save(os.path.join(root_dir, 'venue', 'slide.png'))
+        pipeline = PrefetchPipeline(root_dir=root_dir)
+        slides = [ScheduledSlide('venue/slide.png', timedelta(seconds=5))]
+        try:
+            # the slide is not found relative to the current directory
+            assert not os.path.exists('venue/slide.png')
+            shown = list(prefetched_slides(slides, pipeline))
+        finally:
+            pipeline.close()
+        assert [(slide.file, decoded.file, decoded.width, decoded.height) for slide, decoded in shown] == \
+            [('venue/slide.png', 'venue/slide.png', 6, 4)]
+        assert 'venue/slide.png' in pipeline.cache
+
+
+if __name__ == '__main__':
+    test_frame_cache_byte_budget()
+    test_read_ahead_decodes_before_use()
+    test_failed_decode_is_retried_and_skipped()
+    test_files_relative_to_root_dir()
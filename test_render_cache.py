@@ -0,0 +1,127 @@
+import os
+import tempfile
+from typing import List, Tuple
+from prefetch import DecodedImage
+from render_cache import RenderCache, FRAME_HEADER
+
+
+class FakeRenderer:
+    rendered: List[str]
+
+    def __init__(self):
+        self.rendered = []
+
+    def __call__(self, file: str, size: Tuple[int, int]) -> DecodedImage:
+        self.rendered.append(file)
+        with open(file, 'rb') as content:
+            pixel: bytes = content.read(4)
+        return DecodedImage(file, size[0], size[1], 'rgba', pixel * size[0] * size[1])
+
+
+def write_file(path: str, content: bytes) -> None:
+    with open(path, 'wb') as file:
+        file.write(content)
+
+
+def test_renamed_slide_hits_cache():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        slide = os.path.join(temp_dir, 'slide@wg2.jpg')
+        write_file(slide, b'RGBA')
+        renderer = FakeRenderer()
+        cache = RenderCache(os.path.join(temp_dir, 'cache'), 1024 * 1024, renderer)
+
+        first = cache.get(slide, (4, 3))
+        assert (first.width, first.height, first.pixels) == (4, 3, b'RGBA' * 12)
+        assert cache.get(slide, (4, 3)) == first
+        assert cache.stats.hashes == 1
+
+        # a rename keeps the inode, neither hashed nor rendered again
+        renamed = os.path.join(temp_dir, 'slide@wg3@till0101.jpg')
+        os.rename(slide, renamed)
+        assert cache.get(renamed, (4, 3)).pixels == first.pixels
+        assert cache.stats.hashes == 1
+        assert renderer.rendered == [slide]
+
+        # another resolution is another entry
+        cache.get(renamed, (2, 2))
+        assert len(renderer.rendered) == 2
+
+        # new content is hashed and rendered again
+        write_file(renamed, b'abcd')
+        os.utime(renamed, ns=(1, 1))
+        assert cache.get(renamed, (4, 3)).pixels == b'abcd' * 12
+        assert cache.stats.hashes == 2
+        assert (cache.stats.hits, cache.stats.misses) == (2, 3)
+
+        # the hashes survive a restart
+        cache.save_index()
+        restarted = RenderCache(os.path.join(temp_dir, 'cache'), 1024 * 1024, renderer)
+        restarted.get(renamed, (4, 3))
+        assert restarted.stats.hashes == 0 and restarted.stats.hits == 1
+
+
+def test_eviction_by_disk_budget():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        frame_size = FRAME_HEADER.size + 4 * 10 * 10
+        cache = RenderCache(os.path.join(temp_dir, 'cache'), 2 * frame_size, FakeRenderer())
+        slides = []
+        for i in range(3):
+            slides.append(os.path.join(temp_dir, f'slide{i}.jpg'))
+            write_file(slides[-1], bytes([i]) * 4)
+            cache.get(slides[-1], (10, 10))
+        assert cache.stats.evictions == 1
+        assert cache.used_bytes <= 2 * frame_size
+        assert len(os.listdir(os.path.join(temp_dir, 'cache'))) == 2
+
+        # the cache directory is not listed again, a hit makes a frame the most recently used
+        cache._cached_frames = None
+        cache.get(slides[1], (10, 10))
+        slides.append(os.path.join(temp_dir, 'slide3.jpg'))
+        write_file(slides[-1], bytes([3]) * 4)
+        cache.get(slides[-1], (10, 10))
+        assert cache.stats.evictions == 2
+        assert sorted(cache._frames) == sorted(cache._frame_file(cache.content_hash(slide), (10, 10))
+                                               for slide in slides[1:4:2])
+        # only the hashes of cached content are saved
+        cache.save_index()
+        assert sorted(cache._hashes.values()) == sorted(cache.content_hash(slide) for slide in slides[1:4:2])
+
+
+def test_damaged_frame_is_a_miss():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        slide = os.path.join(temp_dir, 'slide.jpg')
+        write_file(slide, b'RGBA')
+        renderer = FakeRenderer()
+        cache = RenderCache(os.path.join(temp_dir, 'cache'), 1024 * 1024, renderer)
+        cache.get(slide, (4, 3))
+        frame_file = cache._frame_file(cache.content_hash(slide), (4, 3))
+        write_file(frame_file, b'RGB')
+        assert cache.get(slide, (4, 3)).pixels == b'RGBA' * 12
+        assert len(renderer.rendered) == 2
+        assert cache.used_bytes == os.path.getsize(frame_file)
+        assert cache.get(slide, (4, 3)).pixels == b'RGBA' * 12
+        assert cache.stats.hits == 1
+
+        # a frame cut short in its pixels is a miss and deleted as well
+        with open(frame_file, 'r+b') as frame:
+            frame.truncate(os.path.getsize(frame_file) - 4)
+        assert cache.get(slide, (4, 3)).pixels == b'RGBA' * 12
+        assert len(renderer.rendered) == 3
+        assert cache.used_bytes == os.path.getsize(frame_file)
+
+        # evicted by another player right after it was read
+        utime = os.utime
+        os.utime = lambda path: os.remove(path) or utime(path)
+        try:
+            assert cache.get(slide, (4, 3)).pixels == b'RGBA' * 12
+        finally:
+            os.utime = utime
+        # rendered and stored again, counted once
+        assert cache.stats.misses == 4
+        assert cache.used_bytes == os.path.getsize(frame_file)
+
+
+if __name__ == '__main__':
+    test_renamed_slide_hits_cache()
+    test_eviction_by_disk_budget()
+    test_damaged_frame_is_a_miss()
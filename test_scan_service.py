@@ -0,0 +1,166 @@
+import os
+import asyncio
+import tempfile
+import datetime
+from config import SlidesCollection, collect_slides
+from scan_service import ScanService, ScanServiceClient, CollectionUpdate, collection_to_json
+from async_collect import AsyncFileSystemAccess
+from benchmarks.tree_generator import SimNode, generate_tree, InMemoryFileSystemAccess, generated_tree_date
+
+
+# Order inside a weight is not kept by updates, compare the slides of each weight as sets
+def playback_view(slide_collection: SlidesCollection):
+    data = collection_to_json(slide_collection)
+    data['normal_slides'] = {weight: sorted(map(tuple, slides)) for weight, slides in data['normal_slides']}
+    return data
+
+
+def collected(tree) -> SlidesCollection:
+    slide_collection = SlidesCollection()
+    collect_slides(slide_collection, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+    return slide_collection
+
+
+def add_slides(tree, names):
+    for name in names:
+        tree.children.append(SimNode(name, False, generated_tree_date))
+
+
+def test_subscribe_and_updates():
+    tree = generate_tree(800, seed=11)
+
+    async def run(socket_path):
+        async with ScanService(socket_path, ['/mem'], AsyncFileSystemAccess(InMemoryFileSystemAccess(tree)),
+                               batch_interval=0) as service:
+            first = await ScanServiceClient.subscribe(socket_path, '/mem')
+            second = await ScanServiceClient.subscribe(socket_path, '/mem')
+            assert first.slide_collection == collected(tree)
+            assert second.slide_collection == first.slide_collection
+            # nothing changed, nothing is sent
+            assert await service.rescan('/mem') == first.seq
+
+            add_slides(tree, ['added1.jpg', 'added2.png'])
+            seq = await service.rescan('/mem')
+            assert await first.receive_update() == seq
+            assert await second.receive_update() == seq
+            assert playback_view(first.slide_collection) == playback_view(collected(tree))
+            assert playback_view(second.slide_collection) == playback_view(collected(tree))
+            await first.close()
+            await second.close()
+
+    with tempfile.TemporaryDirectory() as socket_dir:
+        asyncio.run(run(os.path.join(socket_dir, 'scan.sock')))
+
+
+def test_slow_client_updates_are_coalesced():
+    tree = generate_tree(300, seed=12)
+
+    async def run(socket_path):
+        async with ScanService(socket_path, ['/mem'], AsyncFileSystemAccess(InMemoryFileSystemAccess(tree)),
+                               batch_interval=0.5) as service:
+            client = await ScanServiceClient.subscribe(socket_path, '/mem')
+            for idx in range(4):
+                add_slides(tree, [f'added{idx}.jpg'])
+                await service.rescan('/mem')
+            # the first update is sent at once, the other three wait for the batch interval
+            await client.receive_update()
+            assert await client.receive_update() == 4
+            subscriber = next(iter(service._roots['/mem'].subscribers))
+            assert subscriber.updates_sent == 2 and subscriber.updates_coalesced == 2
+            assert playback_view(client.slide_collection) == playback_view(collected(tree))
+            await client.close()
+
+    with tempfile.TemporaryDirectory() as socket_dir:
+        asyncio.run(run(os.path.join(socket_dir, 'scan.sock')))
+
+
+def test_unscannable_and_disallowed_roots():
+    async def run(socket_dir):
+        socket_path = os.path.join(socket_dir, 'scan.sock')
+        root_dir = os.path.join(socket_dir, 'slides')
+        os.makedirs(os.path.join(root_dir, 'show'))
+        with open(os.path.join(root_dir, 'show', 'slide1.jpg'), 'wb'):
+            pass
+        async with ScanService(socket_path, [socket_dir], rescan_interval=0.05) as service:
+            for bad_root in [os.path.join(socket_dir, 'missing'), '/etc', socket_dir + '/../etc']:
+                try:
+                    await ScanServiceClient.subscribe(socket_path, bad_root)
+                    assert False
+                except ConnectionError:
+                    pass
+            assert service._roots == {}
+
+            client = await ScanServiceClient.subscribe(socket_path, root_dir)
+            shown = await ScanServiceClient.subscribe(socket_path, os.path.join(root_dir, 'show'))
+            # a root that disappears does not stop the periodic rescans of the others
+            os.rename(os.path.join(root_dir, 'show'), os.path.join(root_dir, 'shown'))
+            assert await client.receive_update() >= 1
+            assert [slide.file for slide in client.slide_collection.normal_slides[1.0]] == ['shown/slide1.jpg']
+            os.rename(os.path.join(root_dir, 'shown'), os.path.join(root_dir, 'show'))
+            await client.receive_update()
+            assert [slide.file for slide in client.slide_collection.normal_slides[1.0]] == ['show/slide1.jpg']
+            await client.close()
+            await shown.close()
+
+    with tempfile.TemporaryDirectory() as socket_dir:
+        asyncio.run(run(socket_dir))
+
+
+# Counts the listings of the root directory, one per scan
+class CountingFileSystemAccess(InMemoryFileSystemAccess):
+    root_listings = 0
+
+    def list_dir_entries(self, path):
+        if path == '/mem':
+            self.root_listings += 1
+        return super().list_dir_entries(path)
+
+
+def test_first_scan_shared_and_scan_errors_reported():
+    tree = generate_tree(300, seed=16)
+    fs_access = CountingFileSystemAccess(tree)
+
+    async def run(socket_path):
+        async with ScanService(socket_path, ['/mem'], AsyncFileSystemAccess(fs_access), batch_interval=0) as service:
+            # clients subscribing to a new root at once wait for the same scan, however they spell it
+            clients = await asyncio.gather(*(ScanServiceClient.subscribe(socket_path, root_dir)
+                                             for root_dir in ['/mem', '/mem/', '/mem/.']))
+            assert fs_access.root_listings == 1
+            assert list(service._roots) == ['/mem']
+            assert service.collection('/mem/') is service._roots['/mem'].slide_collection
+            for client in clients:
+                assert client.slide_collection == collected(tree)
+                await client.close()
+
+            # a root whose names cannot be parsed is reported to the client
+            tree.children.append(SimNode('show@wgx', True, generated_tree_date,
+                                         [SimNode('slide1.jpg', False, generated_tree_date)]))
+            service._roots.clear()
+            try:
+                await ScanServiceClient.subscribe(socket_path, '/mem')
+                assert False
+            except ConnectionError as error:
+                assert 'ValueError' in str(error)
+            assert service._roots == {}
+
+    with tempfile.TemporaryDirectory() as socket_dir:
+        asyncio.run(run(os.path.join(socket_dir, 'scan.sock')))
+
+
+def test_update_composition():
+    old = collected(generate_tree(200, seed=13))
+    middle = collected(generate_tree(200, seed=14))
+    new = collected(generate_tree(200, seed=15))
+    first = CollectionUpdate.between(collection_to_json(old), collection_to_json(middle))
+    second = CollectionUpdate.between(collection_to_json(middle), collection_to_json(new))
+    old.expire_dates[next(iter(new.expire_dates))] = datetime.datetime(2000, 1, 1)
+    first.then(second).apply_to(old)
+    assert playback_view(old) == playback_view(new)
+
+
+if __name__ == '__main__':
+    test_subscribe_and_updates()
+    test_slow_client_updates_are_coalesced()
+    test_unscannable_and_disallowed_roots()
+    test_first_scan_shared_and_scan_errors_reported()
+    test_update_composition()
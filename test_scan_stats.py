@@ -0,0 +1,71 @@
+import os
+import json
+import tempfile
+from config import SlidesCollection, NormalFileSystemAccess, collect_slides
+from scan_stats import ScanStats, collect_slides_with_stats
+from benchmarks.tree_generator import generate_tree, InMemoryFileSystemAccess
+
+
+def test_scan_stats():
+    tree = generate_tree(400, seed=3)
+    slide_collection = SlidesCollection()
+    scan_stats = collect_slides_with_stats(slide_collection, '/mem', InMemoryFileSystemAccess(tree))
+
+    uninstrumented = SlidesCollection()
+    collect_slides(uninstrumented, '/mem', fs_access=InMemoryFileSystemAccess(tree))
+    assert slide_collection == uninstrumented
+
+    assert '' in scan_stats.directories
+    assert scan_stats.fs_calls['get_current_date'] == 1
+    assert scan_stats.fs_calls['list_dir_entries'] == len(scan_stats.directories)
+    assert scan_stats.parse_count == sum(stats.entry_count for stats in scan_stats.directories.values())
+    assert sum(scan_stats.messages.values()) == len(slide_collection.messages)
+    root_stats = scan_stats.directories['']
+    assert root_stats.self_seconds <= root_stats.elapsed_seconds
+    assert scan_stats.slowest_directories(3)[0].self_seconds >= scan_stats.slowest_directories(3)[-1].self_seconds
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_file = os.path.join(output_dir, 'stats.json')
+        scan_stats.dump_json(output_file)
+        with open(output_file) as file:
+            dumped = json.load(file)
+    assert dumped['directory_count'] == len(scan_stats.directories)
+    assert dumped['fs_calls']['list_dir_entries'] == scan_stats.fs_calls['list_dir_entries']
+
+
+def test_default_listing_calls_counted():
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, 'dir1@wg2'))
+        for name in ['slide1.jpg', 'dir1@wg2/slide2.jpg', 'dir1@wg2/slide3.jpg']:
+            with open(os.path.join(root, name), 'wb'):
+                pass
+        scan_stats = collect_slides_with_stats(SlidesCollection(), root, NormalFileSystemAccess())
+    # NormalFileSystemAccess lists a directory with a call per entry, they are all counted
+    assert scan_stats.fs_calls['list_dir_entries'] == 2
+    assert scan_stats.fs_calls['list_dir'] == 2
+    assert scan_stats.fs_calls['is_dir'] >= 4
+    assert scan_stats.fs_calls['get_file_modification_time'] >= 4
+
+
+def test_parse_errors_counted():
+    with tempfile.TemporaryDirectory() as root:
+        for name in ['slide1.jpg', 'slide2@wg.jpg', 'slide3@dur5.jpg']:
+            with open(os.path.join(root, name), 'wb'):
+                pass
+        scan_stats = ScanStats()
+        slide_collection = SlidesCollection()
+        # a parse error still aborts the scan, it is counted before that
+        try:
+            collect_slides(slide_collection, root, scan_stats=scan_stats)
+            assert False
+        except ValueError:
+            pass
+    assert 1 <= scan_stats.parse_count <= 3
+    assert scan_stats.parse_errors == 1
+    assert scan_stats.parse_seconds > 0
+
+
+if __name__ == '__main__':
+    test_scan_stats()
+    test_default_listing_calls_counted()
+    test_parse_errors_counted()
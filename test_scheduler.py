@@ -0,0 +1,124 @@
+import random
+import itertools
+from collections import Counter
+from datetime import datetime, timedelta
+from config import collect_slides, SlidesCollection, NormalSlide, OvershadowSlideCollection
+from scheduler import SlideScheduler, AliasTable
+from test_collect_slides import FileSim, TestFileSystemAccess
+
+
+def test_alias_table_distribution():
+    rng = random.Random(1)
+    table = AliasTable([1.0, 2.0, 7.0])
+    counts = Counter(table.sample(rng) for _ in range(100000))
+    assert abs(counts[0] / 100000 - 0.1) < 0.01
+    assert abs(counts[1] / 100000 - 0.2) < 0.01
+    assert abs(counts[2] / 100000 - 0.7) < 0.01
+
+
+def test_normal_slides_by_weight():
+    slide_collection = SlidesCollection()
+    slide_collection.normal_slides[1.0] = [NormalSlide('a.jpg', timedelta(seconds=5)),
+                                           NormalSlide('b.jpg', timedelta(seconds=5))]
+    slide_collection.normal_slides[3.0] = [NormalSlide('c.jpg', timedelta(seconds=7))]
+    scheduler = SlideScheduler(slide_collection, random.Random(2))
+    counts = Counter(slide.file for slide in itertools.islice(scheduler, 50000))
+    # each slide is picked in proportion to its own weight: 1:1:3
+    assert abs(counts['c.jpg'] / 50000 - 0.6) < 0.02
+    assert abs(counts['a.jpg'] / 50000 - 0.2) < 0.02
+
+
+def test_overshadow_frequency_and_rotation():
+    date = datetime(2022, 1, 2)
+    root = FileSim('/root/aaa/', True, date, [
+        FileSim('normal', True, date, [FileSim('slide1.jpg', False, date)]),
+        FileSim('dir@single4', True, date, [
+            FileSim('slide2.jpg', False, date),
+            FileSim('slide3.jpg', False, date)
+        ])
+    ])
+    slide_collection = SlidesCollection()
+    collect_slides(slide_collection, '/root/aaa/', fs_access=TestFileSystemAccess(root, date))
+    slides = list(itertools.islice(SlideScheduler(slide_collection, random.Random(3)), 12))
+    assert [slide.file for slide in slides] == [
+        'normal/slide1.jpg', 'normal/slide1.jpg', 'normal/slide1.jpg', 'dir@single4/slide2.jpg',
+        'normal/slide1.jpg', 'normal/slide1.jpg', 'normal/slide1.jpg', 'dir@single4/slide3.jpg',
+        'normal/slide1.jpg', 'normal/slide1.jpg', 'normal/slide1.jpg', 'dir@single4/slide2.jpg']
+    assert slides[3].overshadow and slides[3].duration == timedelta(seconds=5)
+
+
+def test_incremental_updates():
+    slide_collection = SlidesCollection()
+    slide_collection.normal_slides[1.0] = [NormalSlide('a.jpg', timedelta(seconds=5))]
+    overshadow = OvershadowSlideCollection(['o.jpg'], 2, timedelta(seconds=3))
+    slide_collection.overshadow_slide_collections.append(overshadow)
+    scheduler = SlideScheduler(slide_collection, random.Random(4))
+    assert [scheduler.next_slide().file for _ in range(4)] == ['a.jpg', 'o.jpg', 'a.jpg', 'o.jpg']
+
+    slide_collection.normal_slides[1.0] = [NormalSlide('b.jpg', timedelta(seconds=5))]
+    slide_collection.overshadow_slide_collections.remove(overshadow)
+    scheduler.sync(slide_collection)
+    assert {scheduler.next_slide().file for _ in range(10)} == {'b.jpg'}
+
+    scheduler.remove_normal_slide(1.0, 'b.jpg')
+    assert scheduler.next_slide() is None
+    assert list(scheduler) == []
+
+
+def test_invalid_weights():
+    for weights in ([1.0, -1.0], [1.0, float('nan')], [float('inf')], [0.0, 0.0]):
+        try:
+            AliasTable(weights)
+            assert False
+        except ValueError:
+            pass
+    # a bucket with an invalid weight is skipped, the other slides are still shown
+    slide_collection = SlidesCollection()
+    slide_collection.normal_slides[-2.0] = [NormalSlide('a.jpg', timedelta(seconds=5))]
+    slide_collection.normal_slides[float('nan')] = [NormalSlide('b.jpg', timedelta(seconds=5))]
+    scheduler = SlideScheduler(slide_collection)
+    assert scheduler.next_slide() is None
+    scheduler.add_normal_slide(0.0, NormalSlide('c.jpg', timedelta(seconds=5)))
+    slide_collection.normal_slides[1.0] = [NormalSlide('d.jpg', timedelta(seconds=5))]
+    scheduler.sync(slide_collection)
+    assert {scheduler.next_slide().file for _ in range(10)} == {'d.jpg'}
+    assert len(scheduler.errors) == 3
+
+
+def test_rescan_keeps_overshadow_rotation():
+    date = datetime(2022, 1, 2)
+    root = FileSim('/root/aaa/', True, date, [
+        FileSim('normal', True, date, [FileSim('slide1.jpg', False, date)]),
+        FileSim('dir@single2', True, date, [FileSim(f'slide{idx}.jpg', False, date) for idx in range(2, 5)])
+    ])
+    fs_access = TestFileSystemAccess(root, date)
+    slide_collection = SlidesCollection()
+    collect_slides(slide_collection, '/root/aaa/', fs_access=fs_access)
+    scheduler = SlideScheduler(slide_collection, random.Random(5))
+    shown = [scheduler.next_slide().file for _ in range(4)]
+    # every rescan gives new collection objects, the rotation goes on where it was
+    for _ in range(2):
+        rescanned = SlidesCollection()
+        collect_slides(rescanned, '/root/aaa/', fs_access=fs_access)
+        scheduler.sync(rescanned)
+        shown.extend(scheduler.next_slide().file for _ in range(2))
+    assert [file for file in shown if file.startswith('dir')] == \
+        ['dir@single2/slide2.jpg', 'dir@single2/slide3.jpg', 'dir@single2/slide4.jpg', 'dir@single2/slide2.jpg']
+    assert len(scheduler._overshadow_entries) == 1
+
+    # a collection with other files is a new one
+    root.subtree[1].subtree.pop()
+    rescanned = SlidesCollection()
+    collect_slides(rescanned, '/root/aaa/', fs_access=fs_access)
+    scheduler.sync(rescanned)
+    assert [scheduler.next_slide().file for _ in range(2)] == ['normal/slide1.jpg', 'dir@single2/slide2.jpg']
+    assert len(scheduler._overshadow_entries) == 1
+
+
+if __name__ == '__main__':
+    test_alias_table_distribution()
+    test_normal_slides_by_weight()
+    test_overshadow_frequency_and_rotation()
+    test_incremental_updates()
+    test_invalid_weights()
+    test_rescan_keeps_overshadow_rotation()
@@ -0,0 +1,90 @@
+import csv
+import json
+import os
+import random
+import tempfile
+import itertools
+from collections import Counter
+from datetime import timedelta
+import pytest
+from config import SlidesCollection, NormalSlide, OvershadowSlideCollection
+from scheduler import SlideScheduler
+
+pytest.importorskip('numpy')
+from simulator import simulate_exposure
+
+
+def make_collection() -> SlidesCollection:
+    slide_collection = SlidesCollection()
+    slide_collection.normal_slides[1.0] = [NormalSlide('a.jpg', timedelta(seconds=5)),
+                                           NormalSlide('b.jpg', timedelta(seconds=5))]
+    slide_collection.normal_slides[3.0] = [NormalSlide('c.jpg', timedelta(seconds=10))]
+    slide_collection.overshadow_slide_collections.append(
+        OvershadowSlideCollection(['o1.jpg', 'o2.jpg'], 4, timedelta(seconds=2)))
+    slide_collection.overshadow_slide_collections.append(
+        OvershadowSlideCollection(['p.jpg'], 6, timedelta(seconds=3)))
+    return slide_collection
+
+
+def test_exposure_matches_scheduler():
+    slide_collection = make_collection()
+    report = simulate_exposure(slide_collection, timedelta(days=30), seed=1)
+    rows = {row.file: row for row in report.rows}
+    assert report.ticks == report.normal_ticks + report.overshadow_ticks
+    assert sum(row.sampled_count for row in report.rows) == report.ticks
+    assert sum(row.sampled_seconds for row in report.rows) == pytest.approx(report.span_seconds)
+
+    # the overshadow ticks are exactly those of the scheduler
+    scheduler = SlideScheduler(slide_collection, random.Random(1))
+    counts = Counter(slide.file for slide in itertools.islice(scheduler, report.ticks) if slide.overshadow)
+    for file in ('o1.jpg', 'o2.jpg', 'p.jpg'):
+        assert rows[file].sampled_count == counts[file]
+        assert rows[file].expected_count == counts[file]
+
+    # normal slides in proportion to their weight: 1:1:3
+    assert rows['a.jpg'].expected_count == pytest.approx(report.normal_ticks / 5)
+    assert rows['c.jpg'].expected_count == pytest.approx(report.normal_ticks * 3 / 5)
+    for file in ('a.jpg', 'b.jpg', 'c.jpg'):
+        assert rows[file].sampled_count == pytest.approx(rows[file].expected_count, rel=0.02)
+    assert rows['c.jpg'].expected_seconds == rows['c.jpg'].expected_count * 10
+
+
+def test_span_end_clips_last_slide():
+    slide_collection = SlidesCollection()
+    slide_collection.normal_slides[1.0] = [NormalSlide('a.jpg', timedelta(seconds=4))]
+    report = simulate_exposure(slide_collection, timedelta(seconds=10), chunk_ticks=2)
+    assert report.ticks == 3
+    assert report.rows[0].sampled_count == 3
+    assert report.rows[0].sampled_seconds == 10.0
+
+
+def test_only_overshadow_slides():
+    slide_collection = SlidesCollection()
+    slide_collection.overshadow_slide_collections.append(
+        OvershadowSlideCollection(['o1.jpg', 'o2.jpg', 'o3.jpg'], 10, timedelta(seconds=1)))
+    report = simulate_exposure(slide_collection, timedelta(seconds=30))
+    # shown every tick when there is nothing else, in rotation
+    assert report.overshadow_ticks == 30
+    assert [row.sampled_count for row in report.rows] == [10, 10, 10]
+
+
+def test_report_export():
+    report = simulate_exposure(make_collection(), timedelta(hours=1), seed=2)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        report.dump_json(os.path.join(temp_dir, 'report.json'))
+        report.dump_csv(os.path.join(temp_dir, 'report.csv'))
+        with open(os.path.join(temp_dir, 'report.json')) as file:
+            data = json.load(file)
+        with open(os.path.join(temp_dir, 'report.csv'), newline='') as file:
+            csv_rows = list(csv.DictReader(file))
+    assert data['ticks'] == report.ticks
+    assert [row['file'] for row in data['slides']] == ['a.jpg', 'b.jpg', 'c.jpg', 'o1.jpg', 'o2.jpg', 'p.jpg']
+    assert len(csv_rows) == 6
+    assert int(csv_rows[3]['sampled_count']) == report.rows[3].sampled_count
+
+
+if __name__ == '__main__':
+    test_exposure_matches_scheduler()
+    test_span_end_clips_last_slide()
+    test_only_overshadow_slides()
+    test_report_export()
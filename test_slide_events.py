@@ -0,0 +1,64 @@
+from datetime import datetime
+from config import SlidesCollection, Severity, SlideFound, MessageFound, OvershadowDirectoryStarted, \
+    OvershadowDirectoryFinished, collect_slides, iter_slide_events
+from scan_stats import ScanStats, InstrumentedFileSystemAccess
+from test_collect_slides import FileSim, TestFileSystemAccess
+from benchmarks.tree_generator import generate_tree, InMemoryFileSystemAccess
+
+
+def make_tree(date: datetime) -> FileSim:
+    return FileSim('/root/aaa/', True, date, [
+        FileSim('slide0.jpg', False, date),
+        FileSim('dir1@wg2@maxfiles1', True, date, [
+            FileSim('slide1.jpg', False, date),
+            FileSim('slide2.jpg', False, date)
+        ]),
+        FileSim('dir2@all4_9', True, date, [
+            FileSim('slide3.jpg', False, date),
+            FileSim('slide4.jpg', False, date)
+        ]),
+        FileSim('dir3@single6', True, date, [
+            FileSim('slide5.jpg', False, date),
+            FileSim('slide6.jpg', False, date)
+        ])
+    ])
+
+
+def test_slide_events():
+    date = datetime(2022, 1, 2)
+    fs_access = TestFileSystemAccess(make_tree(date), date)
+    events = list(iter_slide_events('/root/aaa/', fs_access=fs_access))
+
+    assert isinstance(events[0], SlideFound) and events[0].weight == 1.0
+    assert sorted(event.file.rpartition('/')[2] for event in events if isinstance(event, SlideFound)) == \
+        [f'slide{idx}.jpg' for idx in range(7)]
+    # max_slides is resolved when the directory is done
+    assert any(isinstance(event, MessageFound) and event.severity == Severity.ERROR and
+               event.file == '/dir1@wg2@maxfiles1' for event in events)
+    finished = [event for event in events if isinstance(event, OvershadowDirectoryFinished)]
+    assert [(event.one_at_a_time, event.slide_count, event.frequency) for event in finished] == \
+        [(False, 2, 9), (True, 2, 6)]
+
+    streamed = SlidesCollection()
+    assert streamed.consume(iter_slide_events('/root/aaa/', fs_access=fs_access)) == 7
+    collected = SlidesCollection()
+    assert collect_slides(collected, '/root/aaa/', fs_access=fs_access) == 7
+    assert streamed == collected
+
+
+def test_first_slide_before_scan_is_done():
+    tree = generate_tree(3000, seed=7)
+    scan_stats = ScanStats()
+    fs_access = InstrumentedFileSystemAccess(InMemoryFileSystemAccess(tree), scan_stats)
+    events = iter_slide_events('/mem', fs_access=fs_access)
+    first_slide = next(event for event in events if isinstance(event, SlideFound))
+    assert first_slide.file
+    listed_before_first_slide = scan_stats.fs_calls['list_dir_entries']
+    for _ in events:
+        pass
+    assert listed_before_first_slide < scan_stats.fs_calls['list_dir_entries']
+
+
+if __name__ == '__main__':
+    test_slide_events()
+    test_first_slide_before_scan_is_done()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+from typing import List
+from datetime import datetime, timedelta
+from config import collect_slides, SlidesCollection
+from snapshot import collect_slides_incremental, DirectorySnapshot
+from test_collect_slides import FileSim, TestFileSystemAccess
+
+
+class CountingFileSystemAccess(TestFileSystemAccess):
+    listed_dirs: List[str]
+
+    def __init__(self, root: FileSim, current_date: datetime):
+        super().__init__(root, current_date)
+        self.listed_dirs = []
+
+    def list_dir(self, path: str) -> List[str]:
+        self.listed_dirs.append(path)
+        return super().list_dir(path)
+
+
+def make_tree(date: datetime) -> FileSim:
+    return FileSim('/root/aaa/', True, date, [
+        FileSim('dir1@wg2@dur5', True, date, [
+            FileSim('slide1.jpg', False, date),
+            FileSim('slide2.jpg', False, date)
+        ]),
+        FileSim('dir2@single6', True, date, [
+            FileSim('slide3.jpg', False, date),
+            FileSim('slide4.jpg', False, date)
+        ]),
+        FileSim('dir3@till0501', True, date, [
+            FileSim('slide5.jpg', False, date)
+        ])
+    ])
+
+
+def test_incremental_rescan():
+    date = datetime(2022, 1, 2)
+    root = make_tree(date)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        snapshot_file = os.path.join(temp_dir, 'snapshot.pickle')
+
+        fs_access = CountingFileSystemAccess(root, date)
+        first_collection = SlidesCollection()
+        collect_slides_incremental(first_collection, '/root/aaa/', snapshot_file, fs_access)
+        assert len(fs_access.listed_dirs) == 4
+        assert len(DirectorySnapshot.load(snapshot_file).directories) == 4
+
+        # nothing changed, nothing is listed again
+        fs_access = CountingFileSystemAccess(root, date)
+        second_collection = SlidesCollection()
+        collect_slides_incremental(second_collection, '/root/aaa/', snapshot_file, fs_access)
+        assert fs_access.listed_dirs == []
+        assert second_collection == first_collection
+
+        # add a slide to dir1, only dir1 is listed again
+        changed_date = date + timedelta(hours=1)
+        root.subtree[0].subtree.append(FileSim('slide9.jpg', False, changed_date))
+        root.subtree[0].date_time = changed_date
+        fs_access = CountingFileSystemAccess(root, date + timedelta(days=5))
+        third_collection = SlidesCollection()
+        collect_slides_incremental(third_collection, '/root/aaa/', snapshot_file, fs_access)
+        assert fs_access.listed_dirs == ['/root/aaa/dir1@wg2@dur5']
+
+    # the result matches a full scan, including expiry evaluated against the new date
+    full_collection = SlidesCollection()
+    collect_slides(full_collection, '/root/aaa/',
+                   fs_access=TestFileSystemAccess(root, date + timedelta(days=5)))
+    assert third_collection == full_collection
+    assert len(third_collection.normal_slides[2.0]) == 3
+    assert third_collection.expired_slides == ['dir3@till0501/slide5.jpg']
+
+
+def test_rewritten_file_with_day_month_till():
+    date = datetime(2022, 1, 2)
+    root = make_tree(date)
+    root.subtree[1].subtree.append(FileSim('slide6@till0301.jpg', False, date))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        snapshot_file = os.path.join(temp_dir, 'snapshot.pickle')
+        collect_slides_incremental(SlidesCollection(), '/root/aaa/', snapshot_file,
+                                   CountingFileSystemAccess(root, date))
+
+        # the file is rewritten a year later, the time of its directory stays the same
+        root.subtree[1].subtree[-1].date_time = datetime(2023, 1, 2)
+        current_date = datetime(2023, 1, 5)
+        fs_access = CountingFileSystemAccess(root, current_date)
+        collection = SlidesCollection()
+        collect_slides_incremental(collection, '/root/aaa/', snapshot_file, fs_access)
+        assert fs_access.listed_dirs == []
+
+        full_collection = SlidesCollection()
+        collect_slides(full_collection, '/root/aaa/', fs_access=TestFileSystemAccess(root, current_date))
+        assert collection == full_collection
+        assert 'dir2@single6/slide6@till0301.jpg' not in collection.expired_slides
+
+        # the refreshed time is saved with the snapshot
+        entries = DirectorySnapshot.load(snapshot_file).directories['/root/aaa/dir2@single6'].entries
+        assert entries[-1].modification_time == datetime(2023, 1, 2)
+
+
+def test_snapshot_load_missing_file():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        assert DirectorySnapshot.load(os.path.join(temp_dir, 'missing')).directories == {}
+
+
+if __name__ == '__main__':
+    test_incremental_rescan()
+    test_rewritten_file_with_day_month_till()
+    test_snapshot_load_missing_file()
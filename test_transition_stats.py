@@ -0,0 +1,77 @@
+import os
+import json
+import tempfile
+from datetime import timedelta
+from prefetch import DecodedImage, PrefetchPipeline
+from scheduler import ScheduledSlide
+from transition_stats import RollingHistogram, TransitionStats, load_slide_texture
+
+
+def test_rolling_histogram():
+    histogram = RollingHistogram([1.0, 2.0, 4.0], window=4)
+    for value in [0.5, 1.5, 1.5, 3.0]:
+        histogram.add(value)
+    assert histogram.counts == [1, 2, 1, 0]
+    assert histogram.quantile(0.5) == 2.0
+    assert histogram.mean == 1.625
+    # the oldest value leaves the window
+    histogram.add(10.0)
+    assert histogram.counts == [0, 2, 1, 1]
+    assert len(histogram) == 4
+    assert histogram.quantile(1.0) == 10.0
+
+
+def test_transition_stats():
+    now = [0.0]
+    transition_stats = TransitionStats(late_threshold=0.05, clock=lambda: now[0])
+    uploads = []
+
+    def upload(decoded: DecodedImage):
+        now[0] += 0.12 if decoded.file == 'slow.jpg' else 0.02
+        uploads.append(decoded.file)
+        return decoded.file
+
+    pipeline = PrefetchPipeline(lambda file: DecodedImage(file, 2, 2, 'rgba', bytes(16)),
+                                transition_stats=transition_stats)
+    try:
+        slides = [ScheduledSlide('a.jpg', timedelta(seconds=5)), ScheduledSlide('b.jpg', timedelta(seconds=5)),
+                  ScheduledSlide('slow.jpg', timedelta(seconds=5)), ScheduledSlide('c.jpg', timedelta(seconds=5))]
+        for slide, due_time in zip(slides, [0.0, 5.0, 10.0, 15.0]):
+            now[0] = due_time
+            assert load_slide_texture(slide, pipeline, transition_stats, upload) == slide.file
+            transition_stats.slide_shown()
+        # d is due but c stays on screen until e is shown
+        transition_stats.slide_due(ScheduledSlide('d.jpg', timedelta(seconds=5)), 20.0)
+        transition_stats.slide_due(ScheduledSlide('e.jpg', timedelta(seconds=5)), 25.0)
+        transition_stats.slide_shown(25.0)
+    finally:
+        pipeline.close()
+
+    assert uploads == ['a.jpg', 'b.jpg', 'slow.jpg', 'c.jpg']
+    assert transition_stats.transitions == 5
+    assert transition_stats.late_transitions == 1
+    assert transition_stats.dropped_transitions == 1
+    assert len(transition_stats.histograms['decode']) == 4
+    assert len(transition_stats.histograms['upload']) == 4
+    assert abs(transition_stats.histograms['latency'].max - 0.12) < 1e-9
+    assert transition_stats.histograms['latency'].quantile(0.5) == 0.032
+    # a was on screen 5 s as scheduled, b 0.1 s longer and slow 0.1 s shorter, c almost 10 s instead of 5
+    drift = transition_stats.histograms['drift']
+    assert len(drift) == 4
+    assert abs(drift.max - 4.98) < 1e-9
+    assert transition_stats.slowest_slides(1)[0].file == 'slow.jpg'
+    assert transition_stats.slides['slow.jpg'].max_upload_seconds > 0.0
+
+    with tempfile.TemporaryDirectory() as output_dir:
+        output_file = os.path.join(output_dir, 'transitions.json')
+        transition_stats.dump_json(output_file)
+        with open(output_file) as file:
+            data = json.load(file)
+    assert data['late_transitions'] == 1
+    assert data['histograms']['latency']['count'] == 5
+    assert data['slowest_slides'][0]['file'] == 'slow.jpg'
+
+
+if __name__ == '__main__':
+    test_rolling_histogram()
+    test_transition_stats()
@@ -0,0 +1,126 @@
+import os
+import zlib
+import struct
+import tempfile
+import pytest
+from config import collect_slides, SlidesCollection, NormalFileSystemAccess
+from validation import SlideValidator, validate_slides, validate_image_file, sniff_image_type
+
+
+def png_chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack('>I', len(data)) + chunk_type + data + struct.pack('>I', zlib.crc32(chunk_type + data))
+
+
+# A 1x1 RGB PNG and a 1x1 baseline JPEG, valid for Pillow as well as for the end marker check
+png_image: bytes = b'\x89PNG\r\n\x1a\n' + png_chunk(b'IHDR', struct.pack('>IIBBBBB', 1, 1, 8, 2, 0, 0, 0)) + \
+    png_chunk(b'IDAT', zlib.compress(b'\x00\xc8\x28\x28')) + png_chunk(b'IEND', b'')
+jpeg_image: bytes = bytes.fromhex(
+    'ffd8ffe000104a46494600010100000100010000ffdb004300100b0c0e0c0a100e0d0e1211101318281a181616183123'
+    '251d283a333d3c3933383740485c4e404457453738506d51575f626768673e4d71797064785c656763ffdb0043011112'
+    '121815182f1a1a2f63423842636363636363636363636363636363636363636363636363636363636363636363636363'
+    '6363636363636363636363636363ffc00011080001000103012200021101031101ffc400150001010000000000000000'
+    '0000000000000005ffc40014100100000000000000000000000000000000ffc400150101010000000000000000000000'
+    '0000000406ffc40014110100000000000000000000000000000000ffda000c03010002110311003f0096004a67ffd9')
+
+
+def write_file(path: str, content: bytes) -> None:
+    with open(path, 'wb') as file:
+        file.write(content)
+
+
+def test_sniff_image_type():
+    assert sniff_image_type(png_image[:16]) == 'png'
+    assert sniff_image_type(jpeg_image[:16]) == 'jpeg'
+    assert sniff_image_type(b'<html>') is None
+
+
+def test_validate_collected_slides():
+    with tempfile.TemporaryDirectory() as temp_dir:
+        root_dir = os.path.join(temp_dir, 'slides')
+        os.makedirs(os.path.join(root_dir, 'dir1@wg2'))
+        os.makedirs(os.path.join(root_dir, 'dir2@single6'))
+        write_file(os.path.join(root_dir, 'dir1@wg2', 'good.jpg'), jpeg_image)
+        write_file(os.path.join(root_dir, 'dir1@wg2', 'mislabeled.jpg'), png_image)
+        write_file(os.path.join(root_dir, 'dir2@single6', 'good.png'), png_image)
+        write_file(os.path.join(root_dir, 'dir2@single6', 'empty.png'), b'')
+        cache_file = os.path.join(temp_dir, 'verdicts.pickle')
+
+        slide_collection = SlidesCollection()
+        collect_slides(slide_collection, root_dir, fs_access=NormalFileSystemAccess())
+        validator = SlideValidator(cache_file, max_workers=2)
+        try:
+            assert validate_slides(slide_collection, root_dir, validator) == 2
+        finally:
+            validator.close()
+        assert sorted((message.file, message.error) for message in slide_collection.messages) == [
+            ('dir1@wg2/mislabeled.jpg', 'File content is png, not jpeg as its suffix says'),
+            ('dir2@single6/empty.png', 'File content is not a recognized image format')]
+        assert [slide.file for slide in slide_collection.normal_slides[2.0]] == ['dir1@wg2/good.jpg']
+        assert slide_collection.overshadow_slide_collections[0].files == ['dir2@single6/good.png']
+
+        # unchanged files are not checked again, a fixed file is
+        write_file(os.path.join(root_dir, 'dir2@single6', 'empty.png'), png_image)
+        slide_collection = SlidesCollection()
+        collect_slides(slide_collection, root_dir, fs_access=NormalFileSystemAccess())
+        validator = SlideValidator(cache_file, max_workers=2)
+        try:
+            validation_run = validator.start(slide_collection, root_dir)
+            validation_run.apply()
+        finally:
+            validator.close()
+        assert (validation_run.cached_count, validation_run.validated_count) == (3, 1)
+        assert [message.file for message in slide_collection.messages] == ['dir1@wg2/mislabeled.jpg']
+
+
+class CountingSlidesCollection(SlidesCollection):
+    remove_calls: int = 0
+
+    def remove_files_matching(self, predicate) -> None:
+        self.remove_calls += 1
+        super().remove_files_matching(predicate)
+
+
+def test_invalid_slides_removed_in_one_pass():
+    with tempfile.TemporaryDirectory() as root_dir:
+        for idx in range(40):
+            write_file(os.path.join(root_dir, f'slide{idx}.png'), png_image if idx % 4 == 0 else b'')
+        slide_collection = CountingSlidesCollection()
+        collect_slides(slide_collection, root_dir, fs_access=NormalFileSystemAccess())
+        validator = SlideValidator(max_workers=2)
+        try:
+            assert validate_slides(slide_collection, root_dir, validator) == 30
+        finally:
+            validator.close()
+        assert slide_collection.remove_calls == 1
+        assert sorted(slide.file for slide in slide_collection.normal_slides[1.0]) == \
+            sorted(f'slide{idx}.png' for idx in range(0, 40, 4))
+        assert len(slide_collection.messages) == 30
+
+
+def test_truncated_image():
+    with tempfile.TemporaryDirectory() as root_dir:
+        path = os.path.join(root_dir, 'truncated.jpg')
+        write_file(path, jpeg_image[:-2])
+        assert validate_image_file(path) is not None
+
+
+def test_corrupt_image_with_pillow():
+    Image = pytest.importorskip('PIL.Image')
+    with tempfile.TemporaryDirectory() as root_dir:
+        for name, content in [('good.png', png_image), ('good.jpg', jpeg_image)]:
+            write_file(os.path.join(root_dir, name), content)
+            with Image.open(os.path.join(root_dir, name)) as image:
+                assert image.size == (1, 1)
+            assert validate_image_file(os.path.join(root_dir, name)) is None
+        # the chunks end as they should but the pixel data is damaged, only decoding finds it
+        path = os.path.join(root_dir, 'corrupt.png')
+        write_file(path, png_image.replace(zlib.compress(b'\x00\xc8\x28\x28'), b'x' * 12))
+        assert validate_image_file(path) is not None
+
+
+if __name__ == '__main__':
+    test_sniff_image_type()
+    test_validate_collected_slides()
+    test_invalid_slides_removed_in_one_pass()
+    test_truncated_image()
+    test_corrupt_image_with_pillow()
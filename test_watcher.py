@@ -0,0 +1,198 @@
+import os
+import sys
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+import pytest
+from config import collect_slides, SlidesCollection, NormalFileSystemAccess
+from watcher import PollingWatcher, InotifyWatcher, SlidesCollectionUpdater, SlideEvent, SlideEventKind
+from test_collect_slides import FileSim, TestFileSystemAccess
+
+
+# Collections built by applying events keep their own ordering, compare them sorted
+def normalized(slide_collection: SlidesCollection) -> tuple:
+    return ({weight: sorted((slide.file, slide.duration) for slide in slides)
+             for weight, slides in slide_collection.normal_slides.items()},
+            sorted((sorted(collection.files), collection.frequency, collection.duration)
+                   for collection in slide_collection.overshadow_slide_collections),
+            sorted(slide_collection.expired_slides),
+            sorted((message.file, message.error) for message in slide_collection.messages))
+
+
+def assert_matches_full_scan(slide_collection: SlidesCollection, fs_access: TestFileSystemAccess) -> None:
+    full_collection = SlidesCollection()
+    collect_slides(full_collection, '/root/aaa/', fs_access=fs_access)
+    assert normalized(slide_collection) == normalized(full_collection)
+
+
+def test_polling_watcher_updates_collection():
+    date = datetime(2022, 1, 2)
+    dir1 = FileSim('dir1@wg2@dur5', True, date, [
+        FileSim('slide1.jpg', False, date),
+        FileSim('slide2.jpg', False, date)
+    ])
+    dir2 = FileSim('dir2@all5_7', True, date, [
+        FileSim('slide3.jpg', False, date)
+    ])
+    dir3 = FileSim('dir3@single6', True, date, [
+        FileSim('slide4.jpg', False, date)
+    ])
+    root = FileSim('/root/aaa/', True, date, [dir1, dir2, dir3])
+    fs_access = TestFileSystemAccess(root, date)
+
+    slide_collection = SlidesCollection()
+    collect_slides(slide_collection, '/root/aaa/', fs_access=fs_access)
+    watcher = PollingWatcher('/root/aaa/', fs_access)
+    updater = SlidesCollectionUpdater(slide_collection, '/root/aaa/', fs_access)
+    assert watcher.poll() == []
+
+    # rename a slide to change its expiry, only that entry is re-parsed
+    dir1.subtree[0].name = 'slide1@till0101.jpg'
+    events = watcher.poll()
+    assert events == [SlideEvent(SlideEventKind.RENAMED, 'dir1@wg2@dur5/slide1@till0101.jpg', False,
+                                 'dir1@wg2@dur5/slide1.jpg')]
+    for event in events:
+        updater.apply(event)
+    assert slide_collection.expired_slides == ['dir1@wg2@dur5/slide1@till0101.jpg']
+    assert_matches_full_scan(slide_collection, fs_access)
+
+    # a second slide in an all directory changes the frequency of the first one
+    dir2.subtree.append(FileSim('slide5.jpg', False, date + timedelta(hours=1)))
+    dir3.subtree.append(FileSim('slide6.jpg', False, date + timedelta(hours=1)))
+    for event in watcher.poll():
+        updater.apply(event)
+    assert_matches_full_scan(slide_collection, fs_access)
+    assert {collection.frequency for collection in slide_collection.overshadow_slide_collections} == {7, 6}
+
+    # renaming a directory moves all of its slides to the new weight
+    dir1.name = 'dir1@wg3@dur5'
+    root.subtree.remove(dir3)
+    events = watcher.poll()
+    assert [event.kind for event in events] == [SlideEventKind.RENAMED, SlideEventKind.REMOVED]
+    for event in events:
+        updater.apply(event)
+    assert_matches_full_scan(slide_collection, fs_access)
+    assert list(slide_collection.normal_slides) == [3.0]
+
+    # a file rewritten in place only changes its modification time, its expiry depends on it
+    dir1.subtree[0].date_time = datetime(2022, 12, 31)
+    events = watcher.poll()
+    assert events == [SlideEvent(SlideEventKind.ADDED, 'dir1@wg3@dur5/slide1@till0101.jpg', False)]
+    for event in events:
+        updater.apply(event)
+    assert_matches_full_scan(slide_collection, fs_access)
+    assert slide_collection.expired_slides == []
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is only available on Linux')
+def test_inotify_watcher_events():
+    with tempfile.TemporaryDirectory() as root_dir:
+        os.makedirs(os.path.join(root_dir, 'dir1@wg2'))
+        with open(os.path.join(root_dir, 'dir1@wg2', 'slide1.jpg'), 'wb'):
+            pass
+        slide_collection = SlidesCollection()
+        fs_access = NormalFileSystemAccess()
+        collect_slides(slide_collection, root_dir, fs_access=fs_access)
+        watcher = InotifyWatcher(root_dir)
+        updater = SlidesCollectionUpdater(slide_collection, root_dir, fs_access)
+        try:
+            os.rename(os.path.join(root_dir, 'dir1@wg2', 'slide1.jpg'),
+                      os.path.join(root_dir, 'dir1@wg2', 'slide1@wg4.jpg'))
+            os.makedirs(os.path.join(root_dir, 'dir2@wg3'))
+            events = watcher.poll(1.0)
+        finally:
+            watcher.close()
+        assert events == [
+            SlideEvent(SlideEventKind.RENAMED, 'dir1@wg2/slide1@wg4.jpg', False, 'dir1@wg2/slide1.jpg'),
+            SlideEvent(SlideEventKind.ADDED, 'dir2@wg3', True)]
+        for event in events:
+            updater.apply(event)
+        assert [slide.file for slide in slide_collection.normal_slides[2.0]] == ['dir1@wg2/slide1@wg4.jpg']
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is only available on Linux')
+def test_inotify_watcher_vanished_paths():
+    with tempfile.TemporaryDirectory() as root_dir:
+        os.makedirs(os.path.join(root_dir, 'dir1@wg2', 'sub'))
+        for name in ['a.jpg', 'sub/c.jpg']:
+            with open(os.path.join(root_dir, 'dir1@wg2', name), 'wb'):
+                pass
+        slide_collection = SlidesCollection()
+        fs_access = NormalFileSystemAccess()
+        collect_slides(slide_collection, root_dir, fs_access=fs_access)
+        watcher = InotifyWatcher(root_dir)
+        updater = SlidesCollectionUpdater(slide_collection, root_dir, fs_access)
+        try:
+            # written to a temporary file and renamed, the temporary file is gone when its event is applied
+            with open(os.path.join(root_dir, 'dir1@wg2', 'b.jpg.tmp'), 'wb') as file:
+                file.write(b'pixels')
+            os.rename(os.path.join(root_dir, 'dir1@wg2', 'b.jpg.tmp'), os.path.join(root_dir, 'dir1@wg2', 'b.jpg'))
+            events = watcher.poll(1.0)
+            assert events == [
+                SlideEvent(SlideEventKind.ADDED, 'dir1@wg2/b.jpg.tmp', False),
+                SlideEvent(SlideEventKind.RENAMED, 'dir1@wg2/b.jpg', False, 'dir1@wg2/b.jpg.tmp')]
+            for event in events:
+                updater.apply(event)
+            assert sorted(slide.file for slide in slide_collection.normal_slides[2.0]) == \
+                ['dir1@wg2/a.jpg', 'dir1@wg2/b.jpg', 'dir1@wg2/sub/c.jpg']
+
+            # overwritten in place, the file is collected again
+            with open(os.path.join(root_dir, 'dir1@wg2', 'a.jpg'), 'wb') as file:
+                file.write(b'new pixels')
+            assert watcher.poll(1.0) == [SlideEvent(SlideEventKind.ADDED, 'dir1@wg2/a.jpg', False)]
+
+            # a removed tree reports its children before the directories themselves
+            shutil.rmtree(os.path.join(root_dir, 'dir1@wg2'))
+            events = watcher.poll(1.0)
+        finally:
+            watcher.close()
+        assert events[-1] == SlideEvent(SlideEventKind.REMOVED, 'dir1@wg2', True)
+        for event in events:
+            updater.apply(event)
+        assert not any(slide_collection.normal_slides.values())
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is only available on Linux')
+def test_inotify_watcher_overflow():
+    with open('/proc/sys/fs/inotify/max_queued_events') as file:
+        max_queued_events = int(file.read())
+    with tempfile.TemporaryDirectory() as root_dir:
+        os.makedirs(os.path.join(root_dir, 'dir1@wg2'))
+        slide_collection = SlidesCollection()
+        fs_access = NormalFileSystemAccess()
+        watcher = InotifyWatcher(root_dir)
+        updater = SlidesCollectionUpdater(slide_collection, root_dir, fs_access)
+        try:
+            # more events than the kernel queues, the lost ones are made up by a rescan
+            for idx in range(max_queued_events // 2 + 100):
+                with open(os.path.join(root_dir, 'dir1@wg2', f'slide{idx}.jpg'), 'wb'):
+                    pass
+            os.makedirs(os.path.join(root_dir, 'dir2@wg3'))
+            events = watcher.poll(1.0)
+            assert events == [SlideEvent(SlideEventKind.RESCAN, '', True)]
+            assert 'dir2@wg3' in watcher._watch_paths.values()
+            for event in events:
+                updater.apply(event)
+            full_collection = SlidesCollection()
+            collect_slides(full_collection, root_dir, fs_access=fs_access)
+            assert normalized(slide_collection) == normalized(full_collection)
+
+            # a directory that cannot be listed any more is skipped, the others are still watched
+            os.makedirs(os.path.join(root_dir, 'dir3', 'sub'))
+            scandir = os.scandir
+            os.scandir = lambda path: scandir(path) if not path.endswith('dir3') else scandir('/nonexistent/dir3')
+            try:
+                events = watcher.poll(1.0)
+            finally:
+                os.scandir = scandir
+            assert SlideEvent(SlideEventKind.ADDED, 'dir3', True) in events
+            assert 'dir3/sub' not in watcher._watch_paths.values()
+        finally:
+            watcher.close()
+
+
+if __name__ == '__main__':
+    test_polling_watcher_updates_collection()
+    test_inotify_watcher_events()
+    test_inotify_watcher_vanished_paths()
+    test_inotify_watcher_overflow()
@@ -0,0 +1,151 @@
+import os
+import datetime
+import tempfile
+import threading
+import email.utils
+import urllib.parse
+from xml.sax.saxutils import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import SlidesCollection, ScandirFileSystemAccess, collect_slides
+from parallel_collect import collect_slides_parallel
+from webdav_access import WebDavFileSystemAccess
+
+
+# Minimal WebDAV server over a local directory, PROPFIND only, served under prefix
+class PropfindHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    root: str = ''
+    prefix: str = '/dav'
+    requests: list = []
+    clients: set = set()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _response(self, href: str, path: str) -> str:
+        stat = os.stat(path)
+        collection = '<d:collection/>' if os.path.isdir(path) else ''
+        return (f'<d:response><d:href>{escape(urllib.parse.quote(href))}</d:href><d:propstat><d:prop>'
+                f'<d:resourcetype>{collection}</d:resourcetype>'
+                f'<d:getlastmodified>{email.utils.formatdate(stat.st_mtime, usegmt=True)}</d:getlastmodified>'
+                '</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat></d:response>')
+
+    def do_PROPFIND(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        type(self).requests.append((self.command, self.path))
+        type(self).clients.add(self.client_address)
+        href = urllib.parse.unquote(self.path)
+        path = os.path.join(self.root, href[len(self.prefix + '/'):])
+        if not href.startswith(self.prefix + '/') and href != self.prefix or not os.path.exists(path):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        responses = [self._response(href, path)]
+        if os.path.isdir(path) and self.headers.get('Depth') == '1':
+            for name in sorted(os.listdir(path)):
+                responses.append(self._response(href.rstrip('/') + '/' + name, os.path.join(path, name)))
+        body = ('<?xml version="1.0" encoding="utf-8"?><d:multistatus xmlns:d="DAV:">' + ''.join(responses) +
+                '</d:multistatus>').encode()
+        self.send_response(207)
+        self.send_header('Content-Type', 'application/xml; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def make_tree(root: str) -> None:
+    for dir_name, names in {'dir1@wg2': ['slide1.jpg', 'slide 2.jpg'], 'dir1@wg2/sub@dur7': ['slide3.png'],
+                            'dir2@single4': ['slide4.jpg', 'slide5.jpg'], 'dir3': ['notes.txt'],
+                            'old@till01012020': ['slide6.jpg']}.items():
+        os.makedirs(os.path.join(root, dir_name), exist_ok=True)
+        for name in names:
+            with open(os.path.join(root, dir_name, name), 'wb'):
+                pass
+
+
+def start_server(root: str, prefix: str = '/dav') -> ThreadingHTTPServer:
+    handler = type('Handler', (PropfindHandler,), {'root': root, 'prefix': prefix, 'requests': [], 'clients': set()})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_collect_over_webdav():
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root)
+        server = start_server(root)
+        handler = server.RequestHandlerClass
+        clock = [0.0]
+        fs_access = WebDavFileSystemAccess(f'http://127.0.0.1:{server.server_address[1]}/dav/', max_connections=2,
+                                           cache_ttl=30.0, clock=lambda: clock[0])
+        try:
+            expected = SlidesCollection()
+            collect_slides(expected, root, fs_access=ScandirFileSystemAccess(),
+                           current_date=datetime.date(2024, 1, 1))
+            remote = SlidesCollection()
+            collect_slides(remote, '/', fs_access=fs_access, current_date=datetime.date(2024, 1, 1))
+            assert remote == expected
+            # one listing per directory, all over a single kept-alive connection
+            assert len(handler.requests) == 6
+            assert len(handler.clients) == 1
+
+            # types and modification times come from the cached listings
+            assert fs_access.is_dir('/dir1@wg2/sub@dur7')
+            assert not fs_access.is_dir('/dir1@wg2/slide 2.jpg')
+            assert not fs_access.is_dir('/missing')
+            mtime = datetime.datetime.fromtimestamp(int(os.path.getmtime(os.path.join(root, 'dir3', 'notes.txt'))))
+            assert fs_access.get_file_modification_time('/dir3/notes.txt') == mtime
+            assert len(handler.requests) == 6
+
+            # a second scan within the TTL does not ask the server, after the TTL it does
+            collect_slides(SlidesCollection(), '/', fs_access=fs_access, current_date=datetime.date(2024, 1, 1))
+            assert len(handler.requests) == 6
+            clock[0] = 31.0
+            with open(os.path.join(root, 'dir3', 'slide7.jpg'), 'wb'):
+                pass
+            rescanned = SlidesCollection()
+            collect_slides_parallel(rescanned, '/', fs_access=fs_access, max_workers=4)
+            assert len(handler.requests) == 12
+            assert len(handler.clients) <= 2
+            assert 'dir3/slide7.jpg' in [slide.file for slide in rescanned.normal_slides[1.0]]
+
+            fs_access.invalidate()
+            try:
+                fs_access.list_dir('/missing')
+                assert False
+            except FileNotFoundError:
+                pass
+            assert fs_access.is_dir('/')
+        finally:
+            fs_access.close()
+            server.shutdown()
+            server.server_close()
+
+
+def test_base_url_with_encoded_path():
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root)
+        prefix = '/slide shows/été'
+        server = start_server(root, prefix)
+        handler = server.RequestHandlerClass
+        fs_access = WebDavFileSystemAccess(
+            f'http://127.0.0.1:{server.server_address[1]}{urllib.parse.quote(prefix)}/')
+        try:
+            expected = SlidesCollection()
+            collect_slides(expected, root, fs_access=ScandirFileSystemAccess(),
+                           current_date=datetime.date(2024, 1, 1))
+            remote = SlidesCollection()
+            collect_slides(remote, '/', fs_access=fs_access, current_date=datetime.date(2024, 1, 1))
+            assert remote == expected
+            # the request paths are quoted exactly once
+            assert all(urllib.parse.unquote(path).startswith(prefix + '/') for _, path in handler.requests)
+        finally:
+            fs_access.close()
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == '__main__':
+    test_collect_over_webdav()
+    test_base_url_with_encoded_path()
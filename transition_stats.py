@@ -0,0 +1,211 @@
+# Instrumentation of slide switching in the display: decode and texture upload times, the
+# latency from a slide being due to it being on screen, and how far the time a slide was
+# actually shown drifts from its scheduled duration. Samples go into histograms over the
+# last window transitions, which can be queried while the display runs and dumped to a file.
+# The display calls slide_due when a slide is due, record_upload once its texture is made
+# and slide_shown once it is on screen; load_slide_texture does the first two
+import json
+import time
+import bisect
+import threading
+import contextlib
+import collections
+from dataclasses import dataclass
+from typing import Callable, Deque, Dict, Iterator, List
+from prefetch import DecodedImage, PrefetchPipeline, texture_from_decoded
+from scheduler import ScheduledSlide
+
+# upper bounds of the buckets in seconds, 1 ms to about 16 s, and a bucket above
+LATENCY_BUCKETS: List[float] = [0.001 * 2 ** exponent for exponent in range(15)]
+# actual minus scheduled duration, a slide shown too short or too long
+DRIFT_BUCKETS: List[float] = [-bound for bound in reversed(LATENCY_BUCKETS)] + [0.0] + LATENCY_BUCKETS
+
+
+# Histogram of the last window values. A value goes into the first bucket whose upper
+# bound is not below it, values above the last bound into an extra bucket
+class RollingHistogram:
+    bounds: List[float]
+    window: int
+    counts: List[int]
+    _values: Deque[float]
+
+    def __init__(self, bounds: List[float], window: int = 1000):
+        self.bounds = bounds
+        self.window = window
+        self.counts = [0] * (len(bounds) + 1)
+        self._values = collections.deque()
+        self._sum: float = 0.0
+
+    def add(self, value: float) -> None:
+        if len(self._values) == self.window:
+            oldest: float = self._values.popleft()
+            self.counts[bisect.bisect_left(self.bounds, oldest)] -= 1
+            self._sum -= oldest
+        self._values.append(value)
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self._sum += value
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def mean(self) -> float:
+        return self._sum / len(self._values) if self._values else 0.0
+
+    @property
+    def max(self) -> float:
+        return max(self._values, default=0.0)
+
+    # Upper bound of the bucket holding the q quantile, the largest value for the extra bucket
+    def quantile(self, q: float) -> float:
+        if not self._values:
+            return 0.0
+        rank: float = q * len(self._values)
+        seen: int = 0
+        for idx, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return self.bounds[idx] if idx < len(self.bounds) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'count': len(self),
+            'mean': self.mean,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'bounds': self.bounds,
+            'counts': list(self.counts),
+        }
+
+
+# Worst times seen for one slide file
+@dataclass
+class SlideTiming:
+    file: str
+    transitions: int = 0
+    max_decode_seconds: float = 0.0
+    max_upload_seconds: float = 0.0
+    max_latency_seconds: float = 0.0
+
+
+class TransitionStats:
+    late_threshold: float
+    histograms: Dict[str, RollingHistogram]
+    slides: Dict[str, SlideTiming]
+    transitions: int
+    late_transitions: int
+    dropped_transitions: int
+
+    # a transition is late when the slide is on screen more than late_threshold seconds after it was due
+    def __init__(self, window: int = 1000, late_threshold: float = 0.1,
+                 clock: Callable[[], float] = time.perf_counter):
+        self.late_threshold = late_threshold
+        self.clock = clock
+        self.histograms = {
+            'decode': RollingHistogram(LATENCY_BUCKETS, window),
+            'upload': RollingHistogram(LATENCY_BUCKETS, window),
+            'latency': RollingHistogram(LATENCY_BUCKETS, window),
+            'drift': RollingHistogram(DRIFT_BUCKETS, window),
+        }
+        self.slides = {}
+        self.transitions = 0
+        self.late_transitions = 0
+        self.dropped_transitions = 0
+        # decodes are recorded from the decoder threads
+        self._lock = threading.Lock()
+        self._due_slide: ScheduledSlide | None = None
+        self._due_time: float = 0.0
+        self._shown_slide: ScheduledSlide | None = None
+        self._shown_time: float = 0.0
+
+    def _timing(self, file: str) -> SlideTiming:
+        timing: SlideTiming | None = self.slides.get(file)
+        if timing is None:
+            timing = self.slides[file] = SlideTiming(file)
+        return timing
+
+    def record_decode(self, file: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms['decode'].add(seconds)
+            timing: SlideTiming = self._timing(file)
+            timing.max_decode_seconds = max(timing.max_decode_seconds, seconds)
+
+    def record_upload(self, file: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms['upload'].add(seconds)
+            timing: SlideTiming = self._timing(file)
+            timing.max_upload_seconds = max(timing.max_upload_seconds, seconds)
+
+    # A slide is due. The slide due before it is dropped when it never made it to the screen
+    def slide_due(self, slide: ScheduledSlide, due_time: float | None = None) -> None:
+        with self._lock:
+            if self._due_slide is not None:
+                self.dropped_transitions += 1
+            self._due_slide = slide
+            self._due_time = self.clock() if due_time is None else due_time
+
+    # The slide due last is on screen, which ends the time on screen of the one before it
+    def slide_shown(self, shown_time: float | None = None) -> None:
+        if shown_time is None:
+            shown_time = self.clock()
+        with self._lock:
+            slide: ScheduledSlide | None = self._due_slide
+            if slide is None:
+                return
+            self._due_slide = None
+            latency: float = shown_time - self._due_time
+            self.transitions += 1
+            if latency > self.late_threshold:
+                self.late_transitions += 1
+            self.histograms['latency'].add(latency)
+            timing: SlideTiming = self._timing(slide.file)
+            timing.transitions += 1
+            timing.max_latency_seconds = max(timing.max_latency_seconds, latency)
+            if self._shown_slide is not None:
+                shown_seconds: float = shown_time - self._shown_time
+                self.histograms['drift'].add(shown_seconds - self._shown_slide.duration.total_seconds())
+            self._shown_slide = slide
+            self._shown_time = shown_time
+
+    @contextlib.contextmanager
+    def timed_upload(self, file: str) -> Iterator[None]:
+        start: float = self.clock()
+        yield
+        self.record_upload(file, self.clock() - start)
+
+    # The slides that took the longest from due to on screen
+    def slowest_slides(self, count: int = 10) -> List[SlideTiming]:
+        with self._lock:
+            return sorted(self.slides.values(), key=lambda timing: timing.max_latency_seconds, reverse=True)[:count]
+
+    def to_dict(self) -> Dict[str, object]:
+        slowest_slides: List[SlideTiming] = self.slowest_slides()
+        with self._lock:
+            return {
+                'transitions': self.transitions,
+                'late_transitions': self.late_transitions,
+                'dropped_transitions': self.dropped_transitions,
+                'late_threshold': self.late_threshold,
+                'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+                'slowest_slides': [vars(timing).copy() for timing in slowest_slides],
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    def dump_json(self, path: str) -> None:
+        with open(path, 'w') as file:
+            file.write(self.to_json() + '\n')
+
+
+# Mark slide as due and make its texture from the prefetched pixels, the caller calls
+# transition_stats.slide_shown once the texture is on screen. Must run on the Kivy main thread
+def load_slide_texture(slide: ScheduledSlide, pipeline: PrefetchPipeline, transition_stats: TransitionStats,
+                       upload: Callable[[DecodedImage], object] = texture_from_decoded):
+    transition_stats.slide_due(slide)
+    decoded: DecodedImage = pipeline.get(slide.file)
+    with transition_stats.timed_upload(slide.file):
+        return upload(decoded)
@@ -0,0 +1,207 @@
+# Content validation of collected slides: sniff the file header and test-decode every
+# image in a process pool, so truncated uploads and mislabeled files are reported by
+# the scan instead of stalling the player. Verdicts are cached per (path, size, mtime)
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Set, Tuple
+from config import SlidesCollection
+
+VERDICT_CACHE_VERSION: int = 1
+VALIDATION_BATCH_SIZE: int = 256
+
+# (path, size, mtime in ns) of a validated file
+VerdictKey = Tuple[str, int, int]
+
+image_signatures: List[Tuple[bytes, str]] = [
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'BM', 'bmp'),
+    (b'II*\x00', 'tiff'),
+    (b'MM\x00*', 'tiff'),
+]
+
+suffix_image_types: Dict[str, str] = {
+    '.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.gif': 'gif', '.bmp': 'bmp',
+    '.tiff': 'tiff', '.tif': 'tiff',
+}
+
+
+def sniff_image_type(header: bytes) -> str | None:
+    for signature, image_type in image_signatures:
+        if header.startswith(signature):
+            return image_type
+    return None
+
+
+# Check that the file ends the way its format requires, used when Pillow is not installed
+def _check_image_end(file: str, image_type: str) -> str | None:
+    with open(file, 'rb') as content:
+        content.seek(0, os.SEEK_END)
+        content.seek(max(content.tell() - 32, 0))
+        tail: bytes = content.read()
+    if image_type == 'jpeg' and b'\xff\xd9' not in tail:
+        return "Image is truncated, JPEG end marker is missing"
+    if image_type == 'png' and b'IEND' not in tail:
+        return "Image is truncated, PNG end chunk is missing"
+    if image_type == 'gif' and not tail.endswith(b'\x3b'):
+        return "Image is truncated, GIF trailer is missing"
+    return None
+
+
+# Validate one image file, returns the error message or None when the file is fine
+def validate_image_file(file: str) -> str | None:
+    try:
+        with open(file, 'rb') as content:
+            header: bytes = content.read(16)
+        image_type: str | None = sniff_image_type(header)
+        if image_type is None:
+            return "File content is not a recognized image format"
+        expected_type: str | None = suffix_image_types.get(os.path.splitext(file)[1].lower())
+        if expected_type and expected_type != image_type:
+            return f"File content is {image_type}, not {expected_type} as its suffix says"
+        try:
+            from PIL import Image
+        except ImportError:
+            return _check_image_end(file, image_type)
+        with Image.open(file) as image:
+            image.load()
+        return None
+    except Exception as error:
+        return f"Image cannot be decoded: {error}"
+
+
+def validate_image_files(files: List[str]) -> List[str | None]:
+    return [validate_image_file(file) for file in files]
+
+
+# Verdicts of earlier validations, optionally persisted between scans
+class VerdictCache:
+    cache_file: str | None
+    verdicts: Dict[VerdictKey, str | None]
+
+    def __init__(self, cache_file: str | None = None):
+        self.cache_file = cache_file
+        self.verdicts = {}
+        if cache_file:
+            try:
+                with open(cache_file, 'rb') as file:
+                    version, verdicts = pickle.load(file)
+                if version == VERDICT_CACHE_VERSION:
+                    self.verdicts = verdicts
+            except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+                pass
+
+    def save(self) -> None:
+        if not self.cache_file:
+            return
+        temp_file: str = self.cache_file + '.tmp'
+        with open(temp_file, 'wb') as file:
+            pickle.dump((VERDICT_CACHE_VERSION, self.verdicts), file, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_file, self.cache_file)
+
+
+# One validation of a collection running in the background. The collection is only
+# modified by apply(), so the caller decides on which thread that happens
+class ValidationRun:
+    slide_collection: SlidesCollection
+    root_dir: str
+    verdict_cache: VerdictCache
+    failures: List[Tuple[str, str]]
+    validated_count: int
+    cached_count: int
+
+    def __init__(self, slide_collection: SlidesCollection, root_dir: str, verdict_cache: VerdictCache,
+                 executor: ProcessPoolExecutor):
+        self.slide_collection = slide_collection
+        self.root_dir = root_dir
+        self.verdict_cache = verdict_cache
+        self.failures = []
+        self.validated_count = 0
+        self.cached_count = 0
+        self._executor = executor
+        self._error: BaseException | None = None
+        self._files: List[str] = [slide.file for slides in slide_collection.normal_slides.values()
+                                  for slide in slides] + \
+            [file for collection in slide_collection.overshadow_slide_collections for file in collection.files]
+        self._thread = threading.Thread(target=self._run, name='validate_slides', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            pending: List[Tuple[str, VerdictKey]] = []
+            for file in self._files:
+                full_path: str = os.path.join(self.root_dir, file)
+                try:
+                    stat_result: os.stat_result = os.stat(full_path)
+                except OSError as error:
+                    self.failures.append((file, f"Image cannot be read: {error}"))
+                    continue
+                key: VerdictKey = (full_path, stat_result.st_size, stat_result.st_mtime_ns)
+                if key in self.verdict_cache.verdicts:
+                    self.cached_count += 1
+                    verdict: str | None = self.verdict_cache.verdicts[key]
+                    if verdict:
+                        self.failures.append((file, verdict))
+                else:
+                    pending.append((file, key))
+
+            batches = [pending[start:start + VALIDATION_BATCH_SIZE]
+                       for start in range(0, len(pending), VALIDATION_BATCH_SIZE)]
+            futures = [self._executor.submit(validate_image_files, [key[0] for _, key in batch])
+                       for batch in batches]
+            for batch, future in zip(batches, futures):
+                for (file, key), verdict in zip(batch, future.result()):
+                    self.verdict_cache.verdicts[key] = verdict
+                    self.validated_count += 1
+                    if verdict:
+                        self.failures.append((file, verdict))
+        except BaseException as error:
+            self._error = error
+
+    def done(self) -> bool:
+        return not self._thread.is_alive()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        self._thread.join(timeout)
+        return self.done()
+
+    # Report the failures as errors of the collection, invalid slides are removed
+    # from it unless remove_invalid is False. Waits for the validation to finish
+    def apply(self, remove_invalid: bool = True) -> None:
+        self.wait()
+        if self._error:
+            raise self._error
+        if remove_invalid and self.failures:
+            # a single pass over the collection, however many slides failed
+            failed: Set[str] = {file for file, _ in self.failures}
+            self.slide_collection.remove_files_matching(failed.__contains__)
+        for file, error in self.failures:
+            self.slide_collection.add_error(file, error)
+
+
+class SlideValidator:
+    verdict_cache: VerdictCache
+
+    def __init__(self, cache_file: str | None = None, max_workers: int | None = None):
+        self.verdict_cache = VerdictCache(cache_file)
+        self._executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    # Start validating the slides of a collected SlidesCollection, returns immediately
+    def start(self, slide_collection: SlidesCollection, root_dir: str) -> ValidationRun:
+        return ValidationRun(slide_collection, root_dir, self.verdict_cache, self._executor)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self.verdict_cache.save()
+
+
+# Validate the slides of a collection and wait for the result
+def validate_slides(slide_collection: SlidesCollection, root_dir: str, validator: SlideValidator,
+                    remove_invalid: bool = True) -> int:
+    validation_run: ValidationRun = validator.start(slide_collection, root_dir)
+    validation_run.apply(remove_invalid)
+    return len(validation_run.failures)
@@ -0,0 +1,416 @@
+# Watch mode: turn file system changes under the root directory into slide events and
+# apply them in place to a live SlidesCollection, instead of rescanning the whole tree
+import os
+import sys
+import enum
+import time
+import errno
+import logging
+import select
+import struct
+import ctypes
+import ctypes.util
+import datetime
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple, Callable
+from abc import ABC, abstractmethod
+from config import FileSystemAccess, NormalFileSystemAccess, ScandirFileSystemAccess, DirEntryInfo, \
+    LayeredShowConfig, OvershadowConfig, SlidesCollection, parse_file_name_for_config, collect_dir_entry, \
+    collect_slides, remove_leading_slash
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class SlideEventKind(enum.Enum):
+    ADDED = 0
+    REMOVED = 1
+    RENAMED = 2
+    RESCAN = 3
+
+
+# A change of a file or directory, paths are relative to the root directory.
+# For RENAMED, file is the new path and old_file the previous one. RESCAN is reported
+# when changes were lost, file is then the root directory '' and the whole tree is collected again
+@dataclass
+class SlideEvent:
+    kind: SlideEventKind
+    file: str
+    is_dir: bool
+    old_file: str | None = None
+
+
+def parent_of(relative_path: str) -> Tuple[str, str]:
+    separator_idx: int = relative_path.rfind('/')
+    if separator_idx < 0:
+        return '', relative_path
+    return relative_path[:separator_idx], relative_path[separator_idx + 1:]
+
+
+def is_under(relative_path: str, relative_dir: str) -> bool:
+    return relative_path.startswith(relative_dir + '/')
+
+
+class Watcher(ABC):
+    # Wait up to timeout seconds for changes and return the resulting events
+    @abstractmethod
+    def poll(self, timeout: float = 0.0) -> List[SlideEvent]:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+# Watcher that lists the whole tree through a FileSystemAccess on every poll and
+# compares it with the previous listing. Works on any FileSystemAccess. A file whose
+# modification time changed was rewritten in place and is reported as added again
+class PollingWatcher(Watcher):
+    root_dir: str
+    fs_access: FileSystemAccess
+    _state: Dict[str, DirEntryInfo]
+
+    def __init__(self, root_dir: str, fs_access: FileSystemAccess):
+        self.root_dir = root_dir
+        self.fs_access = fs_access
+        self._state = self._list_tree()
+
+    def _list_tree(self) -> Dict[str, DirEntryInfo]:
+        state: Dict[str, DirEntryInfo] = {}
+        pending_dirs: List[str] = ['']
+        while pending_dirs:
+            relative_dir: str = pending_dirs.pop()
+            for entry in self.fs_access.list_dir_entries(self.fs_access.join(self.root_dir, relative_dir)):
+                relative_file_name: str = remove_leading_slash(self.fs_access.join(relative_dir, entry.name))
+                state[relative_file_name] = entry
+                if entry.is_dir:
+                    pending_dirs.append(relative_file_name)
+        return state
+
+    def poll(self, timeout: float = 0.0) -> List[SlideEvent]:
+        if timeout > 0:
+            time.sleep(timeout)
+        old_state: Dict[str, DirEntryInfo] = self._state
+        new_state: Dict[str, DirEntryInfo] = self._list_tree()
+        self._state = new_state
+
+        # only report the topmost added or removed path, directories are handled as a whole
+        removed: List[str] = _topmost([path for path in old_state if path not in new_state], old_state)
+        added: List[str] = _topmost([path for path in new_state if path not in old_state], new_state)
+
+        events: List[SlideEvent] = []
+        # a removed and an added entry in the same directory with the same type and
+        # modification time are taken as a rename
+        for old_path in removed:
+            old_entry: DirEntryInfo = old_state[old_path]
+            for new_path in added:
+                new_entry: DirEntryInfo = new_state[new_path]
+                if parent_of(new_path)[0] == parent_of(old_path)[0] and \
+                        new_entry.is_dir == old_entry.is_dir and \
+                        new_entry.modification_time == old_entry.modification_time:
+                    events.append(SlideEvent(SlideEventKind.RENAMED, new_path, new_entry.is_dir, old_path))
+                    added.remove(new_path)
+                    break
+            else:
+                events.append(SlideEvent(SlideEventKind.REMOVED, old_path, old_entry.is_dir))
+        for new_path in added:
+            events.append(SlideEvent(SlideEventKind.ADDED, new_path, new_state[new_path].is_dir))
+        for path, new_entry in new_state.items():
+            old_entry: DirEntryInfo | None = old_state.get(path)
+            if old_entry is not None and not new_entry.is_dir and not old_entry.is_dir and \
+                    new_entry.modification_time != old_entry.modification_time:
+                events.append(SlideEvent(SlideEventKind.ADDED, path, False))
+        return events
+
+
+def _topmost(paths: List[str], state: Dict[str, DirEntryInfo]) -> List[str]:
+    dirs: List[str] = [path for path in paths if state[path].is_dir]
+    return sorted(path for path in paths if not any(is_under(path, dir_path) for dir_path in dirs))
+
+
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_FROM: int = 0x00000040
+IN_MOVED_TO: int = 0x00000080
+IN_CREATE: int = 0x00000100
+IN_DELETE: int = 0x00000200
+IN_DELETE_SELF: int = 0x00000400
+IN_Q_OVERFLOW: int = 0x00004000
+IN_IGNORED: int = 0x00008000
+IN_ISDIR: int = 0x40000000
+IN_ONLYDIR: int = 0x01000000
+INOTIFY_WATCH_MASK: int = IN_CLOSE_WRITE | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE_SELF | IN_ONLYDIR
+INOTIFY_EVENT_HEADER = struct.Struct('iIII')
+
+
+# Watcher based on Linux inotify, with one watch per directory of the tree
+class InotifyWatcher(Watcher):
+    root_dir: str
+    _fd: int
+    _watch_paths: Dict[int, str]
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            error: int = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+        self._watch_paths = {}
+        self._add_watches('')
+
+    # Watch relative_dir and its subdirectories. A subdirectory that is gone or cannot be
+    # read is skipped, only the root directory must be watched
+    def _add_watches(self, relative_dir: str) -> None:
+        full_path: str = os.path.join(self.root_dir, relative_dir)
+        try:
+            watch_descriptor: int = self._libc.inotify_add_watch(self._fd, os.fsencode(full_path),
+                                                                 INOTIFY_WATCH_MASK)
+            if watch_descriptor < 0:
+                error: int = ctypes.get_errno()
+                if error in (errno.ENOENT, errno.ENOTDIR):
+                    return
+                raise OSError(error, os.strerror(error), full_path)
+            self._watch_paths[watch_descriptor] = relative_dir
+            with os.scandir(full_path) as dir_iterator:
+                subdirs: List[str] = [relative_dir + '/' + entry.name if relative_dir else entry.name
+                                      for entry in dir_iterator if entry.is_dir(follow_symlinks=False)]
+        except OSError:
+            if not relative_dir:
+                raise
+            logger.warning("Cannot watch %s", full_path, exc_info=True)
+            return
+        for subdir in subdirs:
+            self._add_watches(subdir)
+
+    def _move_watches(self, old_dir: str, new_dir: str | None) -> None:
+        for watch_descriptor, relative_dir in list(self._watch_paths.items()):
+            if relative_dir == old_dir or is_under(relative_dir, old_dir):
+                if new_dir is None:
+                    self._libc.inotify_rm_watch(self._fd, watch_descriptor)
+                    del self._watch_paths[watch_descriptor]
+                else:
+                    self._watch_paths[watch_descriptor] = new_dir + relative_dir[len(old_dir):]
+
+    def _read_raw_events(self, timeout: float) -> List[Tuple[int, int, int, str]]:
+        raw_events: List[Tuple[int, int, int, str]] = []
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        while readable:
+            try:
+                buffer: bytes = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            offset: int = 0
+            while offset < len(buffer):
+                watch_descriptor, mask, cookie, length = INOTIFY_EVENT_HEADER.unpack_from(buffer, offset)
+                offset += INOTIFY_EVENT_HEADER.size
+                name: str = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                raw_events.append((watch_descriptor, mask, cookie, name))
+            readable, _, _ = select.select([self._fd], [], [], 0)
+        return raw_events
+
+    def poll(self, timeout: float = 0.0) -> List[SlideEvent]:
+        events: List[SlideEvent] = []
+        moved_from: Dict[int, SlideEvent] = {}
+        # files created in this batch, closing them after writing is no further change
+        created_files: Set[str] = set()
+        overflowed: bool = False
+        for watch_descriptor, mask, cookie, name in self._read_raw_events(timeout):
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+                continue
+            if mask & IN_IGNORED:
+                self._watch_paths.pop(watch_descriptor, None)
+                continue
+            relative_dir: str | None = self._watch_paths.get(watch_descriptor)
+            if relative_dir is None or not name:
+                continue
+            relative_path: str = relative_dir + '/' + name if relative_dir else name
+            is_dir: bool = bool(mask & IN_ISDIR)
+            if mask & IN_CREATE:
+                if is_dir:
+                    self._add_watches(relative_path)
+                else:
+                    created_files.add(relative_path)
+                events.append(SlideEvent(SlideEventKind.ADDED, relative_path, is_dir))
+            elif mask & IN_CLOSE_WRITE:
+                # a file overwritten in place is collected again
+                if relative_path not in created_files:
+                    created_files.add(relative_path)
+                    events.append(SlideEvent(SlideEventKind.ADDED, relative_path, False))
+            elif mask & IN_DELETE:
+                events.append(SlideEvent(SlideEventKind.REMOVED, relative_path, is_dir))
+            elif mask & IN_MOVED_FROM:
+                event: SlideEvent = SlideEvent(SlideEventKind.REMOVED, relative_path, is_dir)
+                moved_from[cookie] = event
+                events.append(event)
+            elif mask & IN_MOVED_TO:
+                from_event: SlideEvent | None = moved_from.pop(cookie, None)
+                if from_event:
+                    from_event.kind = SlideEventKind.RENAMED
+                    from_event.old_file = from_event.file
+                    from_event.file = relative_path
+                    if is_dir:
+                        self._move_watches(from_event.old_file, relative_path)
+                else:
+                    if is_dir:
+                        self._add_watches(relative_path)
+                    events.append(SlideEvent(SlideEventKind.ADDED, relative_path, is_dir))
+        # directories moved out of the tree are no longer watched
+        for event in moved_from.values():
+            if event.is_dir:
+                self._move_watches(event.file, None)
+        if overflowed:
+            # the kernel dropped events, directories created meanwhile are not watched yet
+            self._add_watches('')
+            return [SlideEvent(SlideEventKind.RESCAN, '', True)]
+        return events
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+# Use inotify for the local file system on Linux, and polling otherwise
+def create_watcher(root_dir: str, fs_access: FileSystemAccess) -> Watcher:
+    if sys.platform.startswith('linux') and isinstance(fs_access, NormalFileSystemAccess):
+        try:
+            return InotifyWatcher(root_dir)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(root_dir, fs_access)
+
+
+# Applies slide events to a live SlidesCollection. Changes inside a plain directory only
+# touch the changed entry, the inherited configuration of its directory is cached. Changes
+# inside an overshadow directory recollect that directory, since its frequencies and
+# grouping depend on all of its slides. max_slides is only checked by a full scan.
+# Events are applied after the fact, so a path may be gone by then, such as the temporary
+# file of a write and rename or the children of a removed tree: a vanished path is removed
+class SlidesCollectionUpdater:
+    slide_collection: SlidesCollection
+    root_dir: str
+    fs_access: FileSystemAccess
+    _dir_configs: Dict[str, Tuple[LayeredShowConfig, str | None]]
+
+    def __init__(self, slide_collection: SlidesCollection, root_dir: str, fs_access: FileSystemAccess):
+        self.slide_collection = slide_collection
+        self.root_dir = root_dir
+        self.fs_access = fs_access
+        self._dir_configs = {}
+
+    # The effective config of a directory, and the overshadow directory it belongs to if any.
+    # None when the directory no longer exists
+    def _dir_config(self, relative_dir: str) -> Tuple[LayeredShowConfig, str | None] | None:
+        if relative_dir == '':
+            return LayeredShowConfig(), None
+        if relative_dir not in self._dir_configs:
+            parent_dir, name = parent_of(relative_dir)
+            parent_dir_config: Tuple[LayeredShowConfig, str | None] | None = self._dir_config(parent_dir)
+            if parent_dir_config is None:
+                return None
+            parent_config, overshadow_dir = parent_dir_config
+            try:
+                modification_time: datetime.datetime = \
+                    self.fs_access.get_file_modification_time(self._full_path(relative_dir))
+            except FileNotFoundError:
+                return None
+            config: LayeredShowConfig = parent_config.override(parse_file_name_for_config(
+                self.fs_access.get_file_main_name(name), modification_time))
+            if overshadow_dir is None and isinstance(config.specialized_config, OvershadowConfig):
+                overshadow_dir = relative_dir
+            self._dir_configs[relative_dir] = (config, overshadow_dir)
+        return self._dir_configs[relative_dir]
+
+    def _full_path(self, relative_path: str) -> str:
+        return self.fs_access.join(self.root_dir, relative_path)
+
+    def _forget_dir_configs(self, relative_dir: str) -> None:
+        for cached_dir in list(self._dir_configs):
+            if cached_dir == relative_dir or is_under(cached_dir, relative_dir):
+                del self._dir_configs[cached_dir]
+
+    def _remove_collected(self, relative_path: str, is_dir: bool) -> None:
+        if is_dir:
+            self.slide_collection.remove_slides_under(relative_path)
+        else:
+            self.slide_collection.remove_slide(relative_path)
+
+    def _collect(self, relative_path: str, is_dir: bool) -> None:
+        parent_dir, name = parent_of(relative_path)
+        parent_dir_config: Tuple[LayeredShowConfig, str | None] | None = self._dir_config(parent_dir)
+        if parent_dir_config is None:
+            return
+        try:
+            entry: DirEntryInfo = DirEntryInfo(
+                name, is_dir, self.fs_access.get_file_modification_time(self._full_path(relative_path)))
+            collect_dir_entry(self.slide_collection, self.root_dir, parent_dir, entry,
+                              parent_dir_config[0], self.fs_access)
+        except FileNotFoundError:
+            # gone before or while it was collected, its removal event follows
+            self._remove_collected(relative_path, is_dir)
+
+    def _recollect_overshadow_dir(self, overshadow_dir: str) -> None:
+        self.slide_collection.remove_slides_under(overshadow_dir)
+        if self.fs_access.is_dir(self._full_path(overshadow_dir)):
+            self._collect(overshadow_dir, True)
+
+    def _remove(self, relative_path: str, is_dir: bool) -> None:
+        if is_dir:
+            self._forget_dir_configs(relative_path)
+        parent_dir_config: Tuple[LayeredShowConfig, str | None] | None = \
+            self._dir_config(parent_of(relative_path)[0])
+        if parent_dir_config is not None and parent_dir_config[1] is not None:
+            self._recollect_overshadow_dir(parent_dir_config[1])
+        else:
+            # in a plain directory, or in a removed one whose own removal event follows
+            self._remove_collected(relative_path, is_dir)
+
+    def _add(self, relative_path: str, is_dir: bool) -> None:
+        parent_dir_config: Tuple[LayeredShowConfig, str | None] | None = \
+            self._dir_config(parent_of(relative_path)[0])
+        if parent_dir_config is not None and parent_dir_config[1] is not None:
+            self._recollect_overshadow_dir(parent_dir_config[1])
+        else:
+            self._remove_collected(relative_path, is_dir)
+            self._collect(relative_path, is_dir)
+
+    def _rescan(self) -> None:
+        self._dir_configs = {}
+        self.slide_collection.remove_files_matching(lambda file: True)
+        collect_slides(self.slide_collection, self.root_dir, fs_access=self.fs_access)
+
+    def apply(self, event: SlideEvent) -> None:
+        if event.kind == SlideEventKind.RESCAN:
+            self._rescan()
+        elif event.kind == SlideEventKind.RENAMED:
+            self._remove(event.old_file, event.is_dir)
+            self._add(event.file, event.is_dir)
+        elif event.kind == SlideEventKind.REMOVED:
+            self._remove(event.file, event.is_dir)
+        else:
+            self._add(event.file, event.is_dir)
+
+
+# Keep slide_collection up to date with root_dir until stop_event is set.
+# on_events is called after each batch of events has been applied. An event that fails
+# to apply is logged and skipped, the next change in its directory or a full scan fixes it
+def watch(slide_collection: SlidesCollection, root_dir: str,
+          fs_access: FileSystemAccess = ScandirFileSystemAccess(), interval: float = 1.0,
+          stop_event: threading.Event | None = None,
+          on_events: Callable[[List[SlideEvent]], None] | None = None) -> None:
+    stop_event = stop_event or threading.Event()
+    watcher: Watcher = create_watcher(root_dir, fs_access)
+    updater: SlidesCollectionUpdater = SlidesCollectionUpdater(slide_collection, root_dir, fs_access)
+    try:
+        while not stop_event.is_set():
+            events: List[SlideEvent] = watcher.poll(interval)
+            for event in events:
+                try:
+                    updater.apply(event)
+                except Exception:
+                    logger.exception("Failed to apply %s", event)
+            if events and on_events:
+                on_events(events)
+    finally:
+        watcher.close()
@@ -0,0 +1,201 @@
+# File system access to slides on a WebDAV share. One PROPFIND with Depth 1 returns a
+# whole directory listing with the type and modification time of every entry, so a scan
+# costs one round trip per directory. Listings are cached for cache_ttl seconds and
+# answer is_dir and get_file_modification_time of their entries without asking the
+# server again; requests go over a pool of kept-alive connections, so the access can be
+# shared by the threads of collect_slides_parallel.
+#   fs_access = WebDavFileSystemAccess('https://dav.example.com', auth=('user', 'secret'))
+#   collect_slides(slide_collection, '/slides/venue1', fs_access=fs_access)
+import time
+import queue
+import base64
+import datetime
+import posixpath
+import threading
+import contextlib
+import http.client
+import email.utils
+import urllib.parse
+import xml.etree.ElementTree as ElementTree
+from typing import Callable, Dict, Iterator, List, Tuple
+from config import FileSystemAccess, DirEntryInfo
+
+DAV_NAMESPACE: str = '{DAV:}'
+
+PROPFIND_BODY: bytes = (b'<?xml version="1.0" encoding="utf-8"?>'
+                        b'<propfind xmlns="DAV:"><prop><resourcetype/><getlastmodified/></prop></propfind>')
+
+
+# Kept-alive HTTP connections to one server, at most max_connections open at a time.
+# A connection that fails is closed instead of going back to the pool
+class HttpConnectionPool:
+    scheme: str
+    host: str
+    port: int | None
+    timeout: float
+
+    def __init__(self, scheme: str, host: str, port: int | None = None, max_connections: int = 4,
+                 timeout: float = 30.0):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self.created_connections: int = 0
+
+    def _create_connection(self) -> http.client.HTTPConnection:
+        self.created_connections += 1
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[http.client.HTTPConnection]:
+        with self._slots:
+            try:
+                conn: http.client.HTTPConnection = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._create_connection()
+            try:
+                yield conn
+            except BaseException:
+                conn.close()
+                raise
+            self._idle.put(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class WebDavFileSystemAccess(FileSystemAccess):
+    base_path: str
+    cache_ttl: float
+    pool: HttpConnectionPool
+
+    def __init__(self, base_url: str, auth: Tuple[str, str] | None = None, max_connections: int = 4,
+                 cache_ttl: float = 60.0, timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        url: urllib.parse.SplitResult = urllib.parse.urlsplit(base_url)
+        # decoded like the paths of the hrefs it is compared with, quoted once per request
+        self.base_path = urllib.parse.unquote(url.path).rstrip('/')
+        self.cache_ttl = cache_ttl
+        self.clock = clock
+        self.pool = HttpConnectionPool(url.scheme, url.hostname, url.port, max_connections, timeout)
+        self._headers: Dict[str, str] = {'Content-Type': 'application/xml; charset=utf-8'}
+        if auth:
+            credentials: str = base64.b64encode(f'{auth[0]}:{auth[1]}'.encode()).decode('ascii')
+            self._headers['Authorization'] = f'Basic {credentials}'
+        # directory path -> (time fetched, entries by name)
+        self._listings: Dict[str, Tuple[float, Dict[str, DirEntryInfo]]] = {}
+        self._lock = threading.Lock()
+        self.request_count: int = 0
+
+    @staticmethod
+    def _normalize(path: str) -> str:
+        return posixpath.normpath('/' + path.lstrip('/'))
+
+    # PROPFIND path with the given depth, the responses as (path, is_dir, modification time)
+    def _propfind(self, path: str, depth: int) -> List[Tuple[str, bool, datetime.datetime]]:
+        request_path: str = urllib.parse.quote(self.base_path + path + ('/' if depth and path != '/' else ''))
+        headers: Dict[str, str] = dict(self._headers, Depth=str(depth))
+        with self._lock:
+            self.request_count += 1
+        # a kept-alive connection may have been closed by the server, retry once on a new one
+        for attempt in range(2):
+            try:
+                with self.pool.connection() as conn:
+                    conn.request('PROPFIND', request_path, PROPFIND_BODY, headers)
+                    response: http.client.HTTPResponse = conn.getresponse()
+                    body: bytes = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if attempt:
+                    raise
+        if response.status == 404:
+            raise FileNotFoundError(f"{path} not found on the WebDAV share")
+        if response.status != 207:
+            raise OSError(f"PROPFIND {path} failed: {response.status} {response.reason}")
+
+        results: List[Tuple[str, bool, datetime.datetime]] = []
+        for element in ElementTree.fromstring(body).iter(f'{DAV_NAMESPACE}response'):
+            href: str = urllib.parse.unquote(urllib.parse.urlsplit(element.findtext(f'{DAV_NAMESPACE}href')).path)
+            if href != self.base_path and not href.startswith(self.base_path + '/'):
+                continue
+            resource_type = element.find(f'.//{DAV_NAMESPACE}resourcetype')
+            is_dir: bool = resource_type is not None and \
+                resource_type.find(f'{DAV_NAMESPACE}collection') is not None
+            last_modified: str | None = element.findtext(f'.//{DAV_NAMESPACE}getlastmodified')
+            # getlastmodified is in GMT, convert it to local time like datetime.fromtimestamp
+            modification_time: datetime.datetime = \
+                email.utils.parsedate_to_datetime(last_modified).astimezone().replace(tzinfo=None) \
+                if last_modified else datetime.datetime.min
+            results.append((self._normalize(href[len(self.base_path):]), is_dir, modification_time))
+        return results
+
+    # The cached listing of a directory, fetched again when older than cache_ttl
+    def _listing(self, path: str) -> Dict[str, DirEntryInfo]:
+        path = self._normalize(path)
+        now: float = self.clock()
+        with self._lock:
+            cached: Tuple[float, Dict[str, DirEntryInfo]] | None = self._listings.get(path)
+        if cached is not None and now - cached[0] < self.cache_ttl:
+            return cached[1]
+        entries: Dict[str, DirEntryInfo] = {}
+        for entry_path, is_dir, modification_time in self._propfind(path, 1):
+            if entry_path != path:
+                name: str = posixpath.basename(entry_path)
+                entries[name] = DirEntryInfo(name, is_dir, modification_time)
+        with self._lock:
+            self._listings[path] = (now, entries)
+        return entries
+
+    # The entry of path in the listing of its parent, the root is asked for by itself
+    def _entry(self, path: str) -> DirEntryInfo:
+        path = self._normalize(path)
+        if path == '/':
+            _, is_dir, modification_time = self._propfind(path, 0)[0]
+            return DirEntryInfo('', is_dir, modification_time)
+        entry: DirEntryInfo | None = self._listing(posixpath.dirname(path)).get(posixpath.basename(path))
+        if entry is None:
+            raise FileNotFoundError(f"{path} not found on the WebDAV share")
+        return entry
+
+    # Forget all cached listings, the next scan fetches everything again
+    def invalidate(self) -> None:
+        with self._lock:
+            self._listings.clear()
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def list_dir_entries(self, path: str) -> List[DirEntryInfo]:
+        return list(self._listing(path).values())
+
+    def list_dir(self, path: str) -> List[str]:
+        return list(self._listing(path))
+
+    def is_dir(self, path: str) -> bool:
+        try:
+            return self._entry(path).is_dir
+        except FileNotFoundError:
+            return False
+
+    def get_file_modification_time(self, path: str) -> datetime.datetime:
+        return self._entry(path).modification_time
+
+    def get_file_suffix(self, path: str) -> str:
+        return posixpath.splitext(path)[1]
+
+    def get_file_main_name(self, path: str) -> str:
+        return posixpath.splitext(path)[0]
+
+    def get_current_date(self) -> datetime.date:
+        return datetime.date.today()
+
+    def join(self, path1: str, path2: str) -> str:
+        return posixpath.join(path1, path2)